@@ -78,16 +78,26 @@ def inject_auth_css():
 
 
 import streamlit as st
-from layout.sidebar import render_sidebar
+from layout.sidebar import render_sidebar, render_quota_status
 from layout.upload_area import render_upload_area
 from layout.tabs_single import render_single_tabs
 from layout.tabs_comparison import render_comparison_tabs
 from dotenv import load_dotenv
 from auth import login, signup, view_users, view_logs
 from tour import render_guided_tour
+from layout.admin_llm import render_llm_status, render_quota_admin
+from layout.fragments import begin_script_run
+from utils.llm_context import set_llm_user
+from utils.cancellation import LLMCancelledError, new_session_id, session_runs
+from utils.llm_config import get_llm_config
+from utils.ollama_backend import ollama_backend
 
 load_dotenv()
 
+# Load the local model in the background so the first fallback call is warm.
+if get_llm_config()["ollama"]["warm_up"]:
+    ollama_backend.warm_up()
+
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
     st.session_state.username = ""
@@ -106,6 +116,7 @@ if not st.session_state.logged_in:
 
 
 st.set_page_config(page_title="Dynamic Impact Tool", layout="wide")
+set_llm_user(st.session_state.username)
 
 if "has_seen_tour" not in st.session_state:
     st.session_state.has_seen_tour = False
@@ -126,6 +137,12 @@ for key, default in {
     if key not in st.session_state:
         st.session_state[key] = default
 
+# LLM work started by earlier runs of this session is cancelled when the user
+# switched dataset, and drops to background priority otherwise.
+if "llm_session_id" not in st.session_state:
+    st.session_state.llm_session_id = new_session_id()
+begin_script_run()
+
 page = st.query_params.get("page", ["Dashboard"])[0].title()
 
 if st.session_state.role == "admin":
@@ -141,6 +158,7 @@ except ValueError:
 navigation = st.sidebar.radio("Navigation", nav_options, index=nav_index)
 
 st.sidebar.success(f"Logged in as {st.session_state.username} ({st.session_state.role})")
+render_quota_status()
 
 st.markdown("""
 <style>
@@ -158,6 +176,8 @@ if navigation == "Guided Tour":
 if navigation == "Admin Panel" and st.session_state.role == "admin":
     st.title("Admin Panel")
     view_users()
+    render_llm_status()
+    render_quota_admin()
 
 elif navigation == "Audit Logs" and st.session_state.role == "admin":
     st.title("Audit Logs")
@@ -168,14 +188,19 @@ elif navigation == "Dashboard":
     render_sidebar()
     render_upload_area()
 
-    if st.session_state["mode"] == "single":
-        render_single_tabs()
-    elif st.session_state["mode"] == "comparison":
-        render_comparison_tabs()
+    try:
+        if st.session_state["mode"] == "single":
+            render_single_tabs()
+        elif st.session_state["mode"] == "comparison":
+            render_comparison_tabs()
+    except LLMCancelledError:
+        # The user moved on while an LLM call was running; render the new state.
+        st.rerun()
 
 with st.sidebar:
     st.markdown("---")
     if st.button("Logout"):
+        session_runs.cancel_session(st.session_state.get("llm_session_id"), "logged out")
         st.session_state.clear()
         st.success("You have been logged out.")
         st.rerun()
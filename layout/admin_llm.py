@@ -0,0 +1,110 @@
+# layout/admin_llm.py
+import streamlit as st
+import pandas as pd
+from utils.model_router import model_router
+from utils.llm_priority import priority_gate
+from utils.ollama_backend import ollama_backend
+from utils.groq_keys import groq_keys
+from utils.quota import quota_manager
+from auth import get_users
+
+
+def render_llm_status():
+    st.subheader("LLM Backends")
+
+    queues = priority_gate.snapshot()
+    st.dataframe(pd.DataFrame([
+        {
+            "priority": name,
+            "running": q["running"],
+            "queued": q["queued"],
+            "max_concurrent": q["max_concurrent"],
+            "p95_wait_s": round(q["p95_wait_s"], 2) if q["p95_wait_s"] is not None else None,
+        }
+        for name, q in queues.items()
+    ]), use_container_width=True)
+
+    keys = groq_keys.snapshot()
+    if keys:
+        st.caption("Groq API keys")
+        st.dataframe(pd.DataFrame(keys), use_container_width=True)
+
+    ollama = ollama_backend.snapshot()
+    if ollama:
+        st.caption("Local Ollama models")
+        st.dataframe(pd.DataFrame([{"model": model, **status} for model, status in ollama.items()]),
+                     use_container_width=True)
+
+    snapshot = model_router.snapshot()
+    if not snapshot:
+        st.info("No LLM calls have been made in this process yet.")
+        return
+
+    rows = []
+    for backend, stats in snapshot.items():
+        circuit = stats["circuit"]
+        rows.append({
+            "backend": backend,
+            "circuit": circuit["state"],
+            "retry_in_s": round(circuit["retry_in_s"], 1) if circuit["retry_in_s"] is not None else None,
+            "consecutive_failures": circuit["consecutive_failures"],
+            "healthy": stats["healthy"],
+            "samples": stats["samples"],
+            "p50_s": round(stats["p50"], 2) if stats["p50"] is not None else None,
+            "p95_s": round(stats["p95"], 2) if stats["p95"] is not None else None,
+            "error_rate": f"{stats['error_rate']:.0%}",
+            "last_error": circuit["last_error"],
+        })
+    st.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+    if st.button("Reset circuit breakers"):
+        model_router.reset_breakers()
+        st.rerun()
+
+
+def render_quota_admin():
+    st.subheader("LLM Quotas")
+
+    # Set before the rerun that follows a save, so it shows on the next run.
+    flash = st.session_state.pop("quota_admin_flash", None)
+    if flash:
+        st.success(flash)
+
+    rows = quota_manager.snapshot()
+    if rows:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True)
+    else:
+        st.info("No user has made an LLM call today.")
+
+    users = sorted({u["username"] for u in get_users()} | {r["user"] for r in rows})
+    if not users:
+        return
+
+    # Outside the form so that picking a user reruns and loads their limits;
+    # the inputs are keyed by user so they never carry another user's values.
+    user = st.selectbox("User", users, key="quota_admin_user")
+    defaults = quota_manager.limits_for(user)
+    with st.form("quota_override"):
+        unlimited = st.checkbox("Unlimited daily tokens", value=defaults["daily_tokens"] is None,
+                                key=f"quota_unlimited_{user}")
+        daily_tokens = st.number_input("Daily token quota", min_value=0, step=10000,
+                                       value=int(defaults["daily_tokens"] or quota_manager.config["daily_tokens"]),
+                                       key=f"quota_daily_tokens_{user}")
+        max_concurrent = st.number_input("Concurrent LLM calls", min_value=1, max_value=16,
+                                         value=int(defaults["max_concurrent"] or quota_manager.config["max_concurrent"]),
+                                         key=f"quota_max_concurrent_{user}")
+        col_save, col_clear = st.columns(2)
+        save = col_save.form_submit_button("Save override")
+        clear = col_clear.form_submit_button("Reset to default")
+
+    if save:
+        quota_manager.set_override(user, None if unlimited else int(daily_tokens), int(max_concurrent))
+        st.session_state["quota_admin_flash"] = f"Quota override saved for {user}."
+        st.rerun()
+    if clear:
+        quota_manager.clear_override(user)
+        # Show the defaults again rather than the override just removed.
+        for field in ("unlimited", "daily_tokens", "max_concurrent"):
+            st.session_state.pop(f"quota_{field}_{user}", None)
+        st.session_state["quota_admin_flash"] = f"{user} is back on the default quota."
+        st.rerun()
@@ -0,0 +1,90 @@
+# layout/chat_view.py
+import threading
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from layout.fragments import rerun_panel
+
+PAGE_SIZE = 20
+_CHART_CACHE_SIZE = 256
+
+_charts = OrderedDict()
+_charts_lock = threading.Lock()
+
+
+def new_message(**fields) -> dict:
+    """A chat message with a stable id, used to cache its rendered chart."""
+    return {"id": uuid.uuid4().hex, **fields}
+
+
+def _chart(msg_id, chart):
+    """The chart object for a message, built from its data once and then reused."""
+    with _charts_lock:
+        if msg_id in _charts:
+            _charts.move_to_end(msg_id)
+            return _charts[msg_id]
+    chart_type, x_col, y_col = chart["type"], chart.get("x"), chart.get("y")
+    chart_df = pd.DataFrame(chart["data"])
+    if chart_type in ("bar", "line"):
+        built = chart_df.set_index(x_col)[y_col]
+    elif chart_type == "pie":
+        built = px.pie(chart_df, names=x_col, values=y_col, title="Pie Chart")
+    else:
+        built = None
+    with _charts_lock:
+        _charts[msg_id] = built
+        while len(_charts) > _CHART_CACHE_SIZE:
+            _charts.popitem(last=False)
+    return built
+
+
+def _bubble(role, label, text):
+    st.markdown(
+        f"""
+        <div class="chat-row {role}">
+            <div class="chat-label">{label}</div>
+            <div class="chat-bubble">{text}</div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+
+def render_chat_history(history, key):
+    """
+    Render the last PAGE_SIZE messages of history, with a button that shows
+    PAGE_SIZE more. key separates the page state of different chat panels.
+    """
+    visible_key = f"{key}_visible"
+    visible = st.session_state.get(visible_key, PAGE_SIZE)
+    hidden = max(0, len(history) - visible)
+    if hidden:
+        if st.button(f"Load older messages ({hidden} hidden)", key=f"{key}_load_older"):
+            st.session_state[visible_key] = visible + PAGE_SIZE
+            rerun_panel()
+
+    for msg in history[hidden:]:
+        # Messages saved before ids existed get one on first render.
+        msg_id = msg.setdefault("id", uuid.uuid4().hex)
+        if "user" in msg:
+            _bubble("user", "User", msg["user"])
+        if "assistant" in msg:
+            reply = msg["assistant"]
+            _bubble("assistant", "AI", reply.get("response", reply) if isinstance(reply, dict) else reply)
+            if isinstance(reply, dict) and "chart" in reply:
+                try:
+                    chart = _chart(msg_id, reply["chart"])
+                except Exception as e:
+                    st.warning(f"Chart rendering failed: {e}")
+                    continue
+                chart_type = reply["chart"]["type"]
+                if chart_type == "bar":
+                    st.bar_chart(chart)
+                elif chart_type == "line":
+                    st.line_chart(chart)
+                elif chart_type == "pie":
+                    st.plotly_chart(chart, use_container_width=True, key=f"{key}_chart_{msg_id}")
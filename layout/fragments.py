@@ -0,0 +1,83 @@
+# layout/fragments.py
+import functools
+import inspect
+
+import streamlit as st
+
+from utils.cancellation import LLMCancelledError, session_runs, streamlit_rerun_probe
+from utils.llm_context import set_cancel_token, set_llm_user
+
+# st.fragment (Streamlit >= 1.37), or its experimental predecessor.
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+_SCOPED_RERUN = "scope" in inspect.signature(st.rerun).parameters
+
+
+def run_state() -> tuple:
+    """The state key of a script run: work from older runs is cancelled when it changes."""
+    return (st.session_state.username, st.session_state.current_session, st.session_state.current_compare)
+
+
+def begin_script_run():
+    """
+    Bind the LLM calls of this script run to its user and to a fresh
+    cancellation token. app.py calls this for full runs and panel() for
+    panel-only reruns, which may start in a fresh context.
+    """
+    set_llm_user(st.session_state.username)
+    token = session_runs.begin_run(st.session_state.llm_session_id, run_state(), probe=streamlit_rerun_probe())
+    set_cancel_token(token)
+    return token
+
+
+def _fragment_rerun() -> bool:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return bool(getattr(get_script_run_ctx(), "fragment_ids_this_run", None))
+    except Exception:
+        return False
+
+
+def panel(func):
+    """
+    Make a dashboard panel an independently rerunning fragment: interacting
+    with a widget inside it reruns only the panel, not app.py. A panel whose
+    LLM work was cancelled (the session moved on) asks for a full rerun, as
+    app.py does for whole-page runs. On Streamlit versions without fragments
+    the panel runs inline.
+    """
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        if _fragment_rerun():
+            # app.py does not run before a panel-only rerun.
+            begin_script_run()
+        try:
+            return func(*args, **kwargs)
+        except LLMCancelledError:
+            st.rerun()
+
+    return _fragment(run) if _fragment else run
+
+
+def rerun_when(ready, every_s):
+    """
+    Check ready() every every_s seconds from a small fragment and rerun the
+    page once it returns True. Call it only while something is pending; the
+    poller is gone after the rerun. Without fragments it does nothing and the
+    next interaction picks the result up.
+    """
+    if not _fragment:
+        return
+
+    @_fragment(run_every=every_s)
+    def poll():
+        if ready():
+            st.rerun()
+
+    poll()
+
+
+def rerun_panel():
+    """Rerun just the current panel (or the whole page where fragments are unavailable)."""
+    if _fragment and _SCOPED_RERUN:
+        st.rerun(scope="fragment")
+    st.rerun()
@@ -1,5 +1,7 @@
 # layout/sidebar.py
 import streamlit as st
+from utils.quota import quota_manager
+from utils.llm_config import get_llm_config
 
 def render_sidebar():
     st.sidebar.title("Choose your Analysis")
@@ -45,9 +47,28 @@ def render_sidebar():
 
         st.sidebar.markdown("---")
 
+        st.sidebar.toggle(
+            "Compute answers on the full dataset", key="planner_mode",
+            value=get_llm_config()["planner"]["enabled"],
+            help="Chat and insight answers are computed with an exact aggregation over every row "
+                 "instead of being read off a sample.",
+        )
+
         if st.sidebar.button("Clear All Sessions"):
             st.session_state["dataset_sessions"] = {}
             st.session_state["compare_sessions"] = {}
             st.session_state["current_session"] = None
             st.session_state["current_compare"] = None
             st.rerun()
+
+
+def render_quota_status():
+    user = st.session_state.get("username") or "anonymous"
+    limits = quota_manager.limits_for(user)
+    remaining = quota_manager.remaining(user)
+    if remaining is None:
+        st.sidebar.caption("LLM budget: unlimited")
+        return
+    limit = limits["daily_tokens"]
+    st.sidebar.progress(remaining / limit if limit else 0.0,
+                        text=f"LLM budget: {remaining:,} of {limit:,} tokens left today")
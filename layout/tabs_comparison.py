@@ -2,10 +2,12 @@ import streamlit as st
 from utils.visualizer import visualize_comparison_overlay, visualize_comparison_side_by_side
 from utils.insight_suggester import generate_insights
 from utils.chat_handler import handle_user_query_dynamic
+from utils.conversation_memory import fold_async
+from layout.chat_view import new_message, render_chat_history
+from layout.fragments import panel, rerun_panel, rerun_when
 from utils.error_handler import safe_llm_call
 import pandas as pd
-from utils.column_selector import get_important_columns
-from utils.llm_selector import get_llm
+from utils.column_selector import cached_important_columns
 import re
 import json
 # from mongo_db.mongo_handler import save_chat, load_user_chats
@@ -16,8 +18,8 @@ from utils.insight_suggester import generate_insights
 from utils.chat_handler import handle_user_query_dynamic
 from utils.error_handler import safe_llm_call
 import pandas as pd
-from utils.column_selector import get_important_columns
-from utils.llm_selector import get_llm
+from utils.insight_categories import category_refiner, llm_comparison_categories, local_comparison_categories
+from utils.llm_config import get_llm_config
 from utils.pdf_exporter_comparision import generate_pdf_report_comparison
 import matplotlib.pylab as plt
 import hashlib
@@ -156,89 +158,134 @@ def render_comparison_tabs():
     compare_key = st.session_state["current_compare"]
     compare_session = st.session_state["compare_sessions"][compare_key]
 
-    df1 = compare_session["df1"]
-    df2 = compare_session["df2"]
-
     st.success(f"Currently Comparing: {compare_key}")
 
     tab1, tab2, tab3 = st.tabs(["Dataset Previews", "Comparison Insights", "Visualizations"])
 
     with tab1:
-        st.header("Dataset Previews")
-
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown("#### Dataset 1")
-            st.dataframe(df1.head(), use_container_width=True)
-        with col2:
-            st.markdown("#### Dataset 2")
-            st.dataframe(df2.head(), use_container_width=True)
-
-        st.subheader("AI + User Column Selector")
-
-        ai_cols1 = get_important_columns(df1.to_csv(index=False), "groq")
-        ai_cols1 = [col.strip().lower() for col in ai_cols1]
-
-        matched_in_df2 = [col for col in ai_cols1 if col in df2.columns]
-        missing_in_df2 = list(set(ai_cols1) - set(matched_in_df2))
-        st.info(f"Missing in Dataset 2: {', '.join(missing_in_df2) if missing_in_df2 else 'None'}")
-
-        col1, col2 = st.columns(2)
-        with col1:
-            user_cols1 = st.multiselect("Select Additional Columns from Dataset 1", df1.columns.tolist(), default=ai_cols1, key="manual_cols_1")
-            final_cols1 = list(set(ai_cols1 + user_cols1))
-            st.success(f"Selected Columns in Dataset 1: {final_cols1}")
-        with col2:
-            final_cols2 = [col for col in final_cols1 if col in df2.columns]
-            st.success(f"Matched Columns in Dataset 2: {final_cols2}")
-            if not final_cols2:
-                st.warning("No common columns between selected Dataset 1 columns and Dataset 2.")
-
-        df1 = df1[final_cols1] if final_cols1 else df1
-        df2 = df2[final_cols2] if final_cols2 else df2
-
-        compare_session["final_cols1"] = final_cols1
-        compare_session["final_cols2"] = final_cols2
-
-        
-        common_cols = list(set(df1.columns).intersection(set(df2.columns)))
-
-        if not common_cols:
-            st.warning("No common columns found between both datasets.")
-            st.stop()
-      
+        _data_panel(compare_session)
+
+    if not _common_columns(compare_session):
+        st.stop()
 
     with tab3:
-        st.header("Comparison Visualizations")
-        x_axis = st.selectbox("Select X-Axis for Comparison", common_cols, key="compare_x_axis")
-        y_axis = st.selectbox("Select Y-Axis for Comparison", common_cols, key="compare_y_axis")
-        chart_type = st.selectbox("Chart Type", ["bar", "line", "scatter"], key="compare_chart")
-        layout = st.radio("Layout", ["Overlay", "Side-by-Side"], horizontal=True, key="compare_layout")
+        _visualization_panel(compare_session)
+    with tab2:
+        _insights_panel(compare_session)
+        if category_refiner.pending(_refine_key()):
+            # Swap in the LLM's categories as soon as they arrive.
+            rerun_when(lambda key=_refine_key(): not category_refiner.pending(key),
+                       get_llm_config()["category_refinement"]["poll_s"])
 
-        if x_axis and y_axis:
-            try:
-                if layout == "Overlay":
-                    fig, explanation = visualize_comparison_overlay(df1, df2, x_axis, y_axis, "Dataset 1", "Dataset 2", chart_type)
-                    st.plotly_chart(fig, use_container_width=True)
-                    compare_session["visualization_history"].append(f"{chart_type} chart: {x_axis} vs {y_axis} (Overlay)")
-                    st.caption(explanation)
-                else:
-                    fig1, fig2 = visualize_comparison_side_by_side(df1, df2, x_axis, y_axis, chart_type)
-                    col1, col2 = st.columns(2)
-                    col1.plotly_chart(fig1, use_container_width=True)
-                    col2.plotly_chart(fig2, use_container_width=True)
-                    compare_session["visualization_history"].append(f"{chart_type} chart: {x_axis} vs {y_axis} (Side-by-Side)")
-            except Exception as e:
-                st.error(f"Comparison visualization failed: {e}")
+    st.markdown("---")
+    with st.expander("Chat About This Comparison", expanded=True):
+        _chat_panel(compare_session)
+
+    _export_panel(compare_session)
+
+
+def _refine_key():
+    return (st.session_state.llm_session_id, "comparison", st.session_state.current_compare)
+
+
+def _selected_frames(compare_session):
+    """Both datasets narrowed to the columns chosen in the previews tab."""
+    df1, df2 = compare_session["df1"], compare_session["df2"]
+    final_cols1, final_cols2 = compare_session.get("final_cols1"), compare_session.get("final_cols2")
+    return (df1[final_cols1] if final_cols1 else df1), (df2[final_cols2] if final_cols2 else df2)
 
-    with tab2:
-     st.header("Comparison Insights")
 
-     merged_df = pd.concat([df1.assign(dataset="Dataset 1"), df2.assign(dataset="Dataset 2")])
+def _common_columns(compare_session):
+    df1, df2 = _selected_frames(compare_session)
+    return list(set(df1.columns).intersection(set(df2.columns)))
 
-     col_left, col_right = st.columns([7, 3], gap="large")
 
-     with col_left:
+# Each panel below is a fragment: its widgets rerun only that panel.
+
+@panel
+def _data_panel(compare_session):
+    df1 = compare_session["df1"]
+    df2 = compare_session["df2"]
+
+    st.header("Dataset Previews")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### Dataset 1")
+        st.dataframe(df1.head(), use_container_width=True)
+    with col2:
+        st.markdown("#### Dataset 2")
+        st.dataframe(df2.head(), use_container_width=True)
+
+    st.subheader("AI + User Column Selector")
+
+    ai_cols1 = cached_important_columns(compare_session, df1, "important_columns1")
+    ai_cols1 = [col.strip().lower() for col in ai_cols1]
+
+    matched_in_df2 = [col for col in ai_cols1 if col in df2.columns]
+    missing_in_df2 = list(set(ai_cols1) - set(matched_in_df2))
+    st.info(f"Missing in Dataset 2: {', '.join(missing_in_df2) if missing_in_df2 else 'None'}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        user_cols1 = st.multiselect("Select Additional Columns from Dataset 1", df1.columns.tolist(), default=ai_cols1, key="manual_cols_1")
+        final_cols1 = list(set(ai_cols1 + user_cols1))
+        st.success(f"Selected Columns in Dataset 1: {final_cols1}")
+    with col2:
+        final_cols2 = [col for col in final_cols1 if col in df2.columns]
+        st.success(f"Matched Columns in Dataset 2: {final_cols2}")
+        if not final_cols2:
+            st.warning("No common columns between selected Dataset 1 columns and Dataset 2.")
+
+    previous = compare_session.get("final_cols1")
+    compare_session["final_cols1"] = final_cols1
+    compare_session["final_cols2"] = final_cols2
+
+    if not _common_columns(compare_session):
+        st.warning("No common columns found between both datasets.")
+
+    # The other panels work on the selected columns, so a new selection reruns the page.
+    if previous is not None and set(previous) != set(final_cols1):
+        st.rerun()
+
+
+@panel
+def _visualization_panel(compare_session):
+    st.header("Comparison Visualizations")
+    df1, df2 = _selected_frames(compare_session)
+    common_cols = _common_columns(compare_session)
+    x_axis = st.selectbox("Select X-Axis for Comparison", common_cols, key="compare_x_axis")
+    y_axis = st.selectbox("Select Y-Axis for Comparison", common_cols, key="compare_y_axis")
+    chart_type = st.selectbox("Chart Type", ["bar", "line", "scatter"], key="compare_chart")
+    layout = st.radio("Layout", ["Overlay", "Side-by-Side"], horizontal=True, key="compare_layout")
+
+    if x_axis and y_axis:
+        try:
+            if layout == "Overlay":
+                fig, explanation = visualize_comparison_overlay(df1, df2, x_axis, y_axis, "Dataset 1", "Dataset 2", chart_type)
+                st.plotly_chart(fig, use_container_width=True)
+                compare_session["visualization_history"].append(f"{chart_type} chart: {x_axis} vs {y_axis} (Overlay)")
+                st.caption(explanation)
+            else:
+                fig1, fig2 = visualize_comparison_side_by_side(df1, df2, x_axis, y_axis, chart_type)
+                col1, col2 = st.columns(2)
+                col1.plotly_chart(fig1, use_container_width=True)
+                col2.plotly_chart(fig2, use_container_width=True)
+                compare_session["visualization_history"].append(f"{chart_type} chart: {x_axis} vs {y_axis} (Side-by-Side)")
+        except Exception as e:
+            st.error(f"Comparison visualization failed: {e}")
+
+
+@panel
+def _insights_panel(compare_session):
+    st.header("Comparison Insights")
+
+    df1, df2 = _selected_frames(compare_session)
+    merged_df = pd.concat([df1.assign(dataset="Dataset 1"), df2.assign(dataset="Dataset 2")])
+
+    col_left, col_right = st.columns([7, 3], gap="large")
+
+    with col_left:
         st.markdown("### Generated Comparison Insights")
         if compare_session["insights"]:
             for insight in compare_session["insights"][::-1]:
@@ -291,63 +338,30 @@ def render_comparison_tabs():
         else:
             st.info("Please select a comparison insight question from the right to view the results.")
 
-     with col_right:
+    with col_right:
         st.markdown("### Comparison Insight Categories")
 
         if not compare_session.get("insight_categories"):
-            try:
-                preview = merged_df.to_csv(index=False)[:10000]
-                llm = get_llm("groq")
-
-                prompt = f"""
-                You are provided with the following combined dataset preview:
-                {preview}
-
-                The dataset contains records from two sources:
-                - Dataset 1
-                - Dataset 2
-
-                Please generate 5-6 analytical comparison insight categories.
-                For each category, provide 4-6 detailed comparison-based analytical questions that compare Dataset 1 and Dataset 2.
-
-                Example questions:
-                - How do the average values of column X compare between Dataset 1 and Dataset 2?
-                - Which dataset has higher variability in column Y?
-                - Is there a noticeable difference in trends for column Z across datasets?
-
-                IMPORTANT:
-                Return strictly in the following JSON format:
-                [
-                    {{
-                        "title": "Category Name",
-                        "questions": ["Question 1", "Question 2", "Question 3"]
-                    }},
-                    ...
-                ]
-
-                Do not include any introduction, explanation, or extra text. Only return the JSON array.
-                """
-
-                response = llm(prompt)
-                if hasattr(response, "content"):
-                    response = response.content
-
-                json_string = re.search(r"\[.*\]", response, re.DOTALL).group(0)
-                categories = json.loads(json_string)
-                compare_session["insight_categories"] = categories
-                st.toast("Comparison insight categories loaded successfully.")
-                st.rerun()
-
-            except Exception as e:
-                st.error(f"Comparison insight suggestion failed: {e}")
-                compare_session["insight_categories"] = []
+            # Instant suggestions from the shared columns; the LLM's replace them once ready.
+            compare_session["insight_categories"] = local_comparison_categories(df1, df2)
+            compare_session["insight_categories_source"] = "local"
+
+        if compare_session.get("insight_categories_source") == "local":
+            refine_key = _refine_key()
+            refined = category_refiner.refine(refine_key, llm_comparison_categories, df1, df2)
+            if refined:
+                compare_session["insight_categories"] = refined
+                compare_session["insight_categories_source"] = "llm"
+            elif category_refiner.pending(refine_key):
+                st.caption("Refining suggestions for this comparison...")
 
         for idx, category in enumerate(compare_session.get("insight_categories", [])):
             with st.expander(f"{category['title']}", expanded=False):
                 for question in category.get("questions", []):
                     if st.button(f"{question}", key=f"compare_insight_{idx}_{question}"):
                         try:
-                            result = generate_insights(merged_df, question, "groq")
+                            result = generate_insights(merged_df, question, "groq",
+                                                       planner=st.session_state.get("planner_mode"))
 
 
                             if "[Insert graph here]" in result:
@@ -374,118 +388,95 @@ def render_comparison_tabs():
                                 })
                             st.session_state["comparison_insight_results"] = compare_session["insights"]
 
-                            st.rerun()
+                            rerun_panel()
                         except Exception as e:
                             st.error(f"Comparison insight generation failed: {e}")
 
-    st.markdown("---")
-    with st.expander("Chat About This Comparison", expanded=True):
-        st.markdown(
-            """
-            <style>
-            .chat-container {
-                max-height: 420px;
-                overflow-y: auto;
-                padding: 1rem;
-                display: flex;
-                flex-direction: column;
-                gap: 1rem;
-                background-color: rgba(240, 240, 240, 0.05);
-                border-radius: 12px;
-            }
 
-            .chat-row {
-                display: flex;
-                flex-direction: column;
-                max-width: 85%;
-            }
+@panel
+def _chat_panel(compare_session):
+    df1, df2 = _selected_frames(compare_session)
+    merged_df = pd.concat([df1.assign(dataset="Dataset 1"), df2.assign(dataset="Dataset 2")])
 
-            .chat-row.user {
-                align-self: flex-end;
-                text-align: right;
-            }
+    st.markdown(
+        """
+        <style>
+        .chat-container {
+            max-height: 420px;
+            overflow-y: auto;
+            padding: 1rem;
+            display: flex;
+            flex-direction: column;
+            gap: 1rem;
+            background-color: rgba(240, 240, 240, 0.05);
+            border-radius: 12px;
+        }
 
-            .chat-row.assistant {
-                align-self: flex-start;
-                text-align: left;
-            }
+        .chat-row {
+            display: flex;
+            flex-direction: column;
+            max-width: 85%;
+        }
 
-            .chat-label {
-                font-weight: bold;
-                font-size: 0.85rem;
-                margin-bottom: 0.25rem;
-                color: #bbb;
-            }
+        .chat-row.user {
+            align-self: flex-end;
+            text-align: right;
+        }
 
-            .chat-bubble {
-                padding: 0.75rem 1rem;
-                border-radius: 12px;
-                background-color: rgba(255, 255, 255, 0.06);
-                color: white;
-                word-wrap: break-word;
-            }
+        .chat-row.assistant {
+            align-self: flex-start;
+            text-align: left;
+        }
 
-            .chat-row.user .chat-bubble {
-                background-color: rgba(180, 220, 255, 0.1);
-            }
-            </style>
-            """,
-            unsafe_allow_html=True,
-        )
-
-        if "compare_chat_history" not in st.session_state:
-            st.session_state.compare_chat_history =  []
-
-
-        with st.container():
-            for msg in st.session_state.compare_chat_history:
-                if "user" in msg:
-                    st.markdown(
-                        f"""
-                        <div class="chat-row user">
-                            <div class="chat-label">User</div>
-                            <div class="chat-bubble">{msg["user"]}</div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True,
-                    )
-                if "assistant" in msg:
-                    response = msg["assistant"].get("response", msg["assistant"])
-                    st.markdown(
-                        f"""
-                        <div class="chat-row assistant">
-                            <div class="chat-label">AI</div>
-                            <div class="chat-bubble">{response}</div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True,
-                    )
-
-                    if "chart" in msg["assistant"]:
-                        chart_type = msg["assistant"]["chart"]["type"]
-                        data = msg["assistant"]["chart"]["data"]
-                        x_col = msg["assistant"]["chart"].get("x")
-                        y_col = msg["assistant"]["chart"].get("y")
-                        chart_df = pd.DataFrame(data)
-
-                        if chart_type == "bar":
-                            st.bar_chart(chart_df.set_index(x_col)[y_col])
-                        elif chart_type == "line":
-                            st.line_chart(chart_df.set_index(x_col)[y_col])
-                        elif chart_type == "pie":
-                            fig = px.pie(chart_df, names=x_col, values=y_col, title="Pie Chart")
-                            st.plotly_chart(fig, use_container_width=True)
-            st.markdown("</div>", unsafe_allow_html=True)
-
-        compare_prompt = st.chat_input("Ask a question about this comparison...", key="comparison_chat_input")
-        if compare_prompt:
-            st.session_state.compare_chat_history.append({"user": compare_prompt})
-            with st.spinner("Thinking..."):
-                result = safe_llm_call(handle_user_query_dynamic, compare_prompt, merged_df, "groq", default={"response": "No response."})
-            st.session_state.compare_chat_history[-1]["assistant"] = result
-
-            # save_chat(st.session_state.username + "_comparison", compare_prompt, result)
-            st.rerun()
+        .chat-label {
+            font-weight: bold;
+            font-size: 0.85rem;
+            margin-bottom: 0.25rem;
+            color: #bbb;
+        }
+
+        .chat-bubble {
+            padding: 0.75rem 1rem;
+            border-radius: 12px;
+            background-color: rgba(255, 255, 255, 0.06);
+            color: white;
+            word-wrap: break-word;
+        }
+
+        .chat-row.user .chat-bubble {
+            background-color: rgba(180, 220, 255, 0.1);
+        }
+        </style>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    # History and memory belong to the comparison session, not the browser session.
+    chat_history = compare_session.setdefault("chat_history", [])
+    chat_memory = compare_session.setdefault("chat_memory", {})
+
+
+    with st.container():
+        render_chat_history(chat_history, key=f"chat_compare_{st.session_state.current_compare}")
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    compare_prompt = st.chat_input("Ask a question about this comparison...", key="comparison_chat_input")
+    if compare_prompt:
+        chat_history.append(new_message(user=compare_prompt))
+        with st.spinner("Thinking..."):
+            result = safe_llm_call(handle_user_query_dynamic, compare_prompt, merged_df, "groq", default={"response": "No response."},
+                                   planner=st.session_state.get("planner_mode"),
+                                   history=chat_history[:-1], memory=chat_memory)
+        chat_history[-1]["assistant"] = result
+        fold_async(chat_history, chat_memory)
+
+        # save_chat(st.session_state.username + "_comparison", compare_prompt, result)
+        rerun_panel()
+
+
+@panel
+def _export_panel(compare_session):
+    compare_key = st.session_state["current_compare"]
 
     col1, col2 = st.columns(2)
 
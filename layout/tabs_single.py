@@ -3,12 +3,17 @@ import os
 import pandas as pd
 import re
 import json
-from utils.column_selector import get_important_columns
+from utils.column_selector import cached_important_columns
 from utils.visualizer import guess_and_generate_chart
 from utils.visualizer import visualize_from_llm_response
-from utils.insight_suggester import generate_insights, generate_insight_suggestions
-from utils.llm_selector import get_llm
+from utils.insight_suggester import generate_insights, generate_insights_batch, generate_insight_suggestions
+from utils.insight_prefetcher import insight_prefetcher, rank_questions
+from utils.llm_config import get_llm_config
+from utils.insight_categories import category_refiner, llm_insight_categories, local_insight_categories
 from utils.chat_handler import handle_user_query_dynamic
+from utils.conversation_memory import fold_async
+from layout.chat_view import new_message, render_chat_history
+from layout.fragments import panel, rerun_panel, rerun_when
 from utils.error_handler import safe_llm_call
 from utils.pdf_exporter import generate_pdf_report, export_to_pptx
 import plotly.express as px
@@ -113,234 +118,253 @@ def render_single_tabs():
     tab1, tab2, tab3  = st.tabs(["Data Preview", "Insights", "Visualizations"])
 
     with tab1:
-        st.header("Dataset Summary & Column Selection")
+        _data_panel(session, df)
+    with tab2:
+        _insights_panel(session, df)
+        if category_refiner.pending(_refine_key()):
+            # Swap in the LLM's categories as soon as they arrive.
+            rerun_when(lambda key=_refine_key(): not category_refiner.pending(key),
+                       get_llm_config()["category_refinement"]["poll_s"])
+    with tab3:
+        _visualization_panel(session, df)
 
-        st.write(f"Total Rows: {df.shape[0]}")
-        st.write(f"Total Columns: {df.shape[1]}")
+    st.markdown("---")
+    with st.expander("Talk with your Dataset.", expanded=True):
+        _chat_panel(session, df)
 
-        st.subheader("Dataset Preview")
-        sample_rows = st.slider("Preview Rows Limit", 0, 100, 10, key="sample_rows_single")
-        st.dataframe(df.head(sample_rows), use_container_width=True)
+    st.markdown("---")
+    _export_panel(session)
 
-        st.subheader("Column Selection")
-        important_cols = get_important_columns(df.to_csv(index=False))
-        user_selected_cols = st.multiselect("Select Additional Columns", df.columns.tolist(), default=important_cols)
 
-        final_cols = list(set(important_cols + user_selected_cols))
-        session["column_selection"] = final_cols
+def _refine_key():
+    return (st.session_state.llm_session_id, "single", st.session_state.current_session)
 
-        st.write(f"Selected Columns: {final_cols}")
-        st.dataframe(df[final_cols].head(), use_container_width=True)
-    
-    with tab2:
-        st.header("Insights")
-
-        col_left, col_right = st.columns([7, 3], gap="large")
-
-        with col_left:
-            st.markdown("### Generated Insights")
-            if session["selected_insight_results"]:
-                for idx, insight in enumerate(session["selected_insight_results"][::-1]):
-                    with st.container(border=True):
-                        st.markdown(f"**{insight['question']}**")
-                        st.markdown(insight["result"])
-                        fig = guess_and_generate_chart(df, insight["result"])
-                        if fig:
-                            st.plotly_chart(fig, use_container_width=True, key=f"insight_chart_{idx}")
-                        st.markdown("---")
-            else:
-                st.info("Please select an insight question from the right to view the results.")
 
-        with col_right:
-            with st.container():
-             if "open_category_index_single" not in st.session_state:
-                st.session_state["open_category_index_single"] = None
-            
-             if not session["insight_categories"]:
-                try:
-                    preview = df
-                    llm = get_llm("groq")
-
-                    prompt = f"""
-                    You are provided with a dataset preview and some representative sample rows.
-                    {preview}
-
-                    Please generate 5-6 analytical insight categories with 4-6 detailed questions each.
-                    Return strictly in JSON format:
-                    [
-                        {{"title": "Category Name", "questions": ["Question 1", "Question 2", "Question 3"]}},
-                        ...
-                    ]
-                    """
-
-                    response = llm(prompt)
-                    if hasattr(response, "content"):
-                        response = response.content
-
-                    json_string = re.search(r"\[.*\]", response, re.DOTALL).group(0)
-                    categories = json.loads(json_string)
-                    session["insight_categories"] = categories
-                    st.toast("Categories loaded successfully.")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Insight suggestion failed: {e}")
-                    session["insight_categories"] = []
-
-             for idx, category in enumerate(session["insight_categories"]):
-                expanded = st.session_state["open_category_index_single"] == idx
-                with st.expander(f"{category['title']}", expanded=expanded):
-                    for question in category["questions"]:
-                        if st.button(f"{question}", key=f"insight_{idx}_{question}"):
-                            try:
-                                result = generate_insights(df, question, "groq")
-                                session["selected_insight_results"].append({"question": question, "result": result})
-
-                                # 🔄 Sync with st.session_state so PDF export picks it up
-                                st.session_state["selected_insight_results"] = session["selected_insight_results"]
-
-                                st.session_state["open_category_index_single"] = idx
-                                st.rerun()
-                            except Exception as e:
-                                 st.error(f"Insight generation failed: {e}")
-             st.markdown("</div>", unsafe_allow_html=True)
-    with tab3:
-        st.header("Visualizations")
-
-        if not session.get("column_selection"):
-            st.warning("Please select columns in Tab 1 to visualize.")
-            st.stop()
-
-        x_axis = st.selectbox("Select X-Axis", session["column_selection"], key="single_visual_x")
-        y_axis = st.selectbox("Select Y-Axis", session["column_selection"], key="single_visual_y")
-        chart_type = st.selectbox("Chart Type", ["bar", "line", "scatter", "box", "violin", "area", "pie"], key="single_visual_chart")
-
-        if x_axis and y_axis:
-            try:
-                llm_response = {"chart_type": chart_type, "x": x_axis, "y": y_axis, "group_by": None}
-                fig, explanation = visualize_from_llm_response(df, f"{x_axis} vs {y_axis}", llm_response)
-                if fig:
-                    st.plotly_chart(fig, use_container_width=True)
-                    session["visualization_history"].append(f"{chart_type} chart: {x_axis} vs {y_axis}")
-                    st.caption(explanation)
-            except Exception as e:
-                st.error(f"Visualization failed: {e}")
+# Each panel below is a fragment: its widgets rerun only that panel.
 
-    st.markdown("---")
-    with st.expander("Talk with your Dataset.", expanded=True):
-        st.markdown(
-            """
-            <style>
-            .chat-container {
-                max-height: 420px;
-                overflow-y: auto;
-                padding: 1rem;
-                display: flex;
-                flex-direction: column;
-                gap: 1rem;
-                background-color: rgba(240, 240, 240, 0.05);
-                border-radius: 12px;
-            }
+@panel
+def _data_panel(session, df):
+    st.header("Dataset Summary & Column Selection")
 
-            .chat-row {
-                display: flex;
-                flex-direction: column;
-                max-width: 85%;
-            }
+    st.write(f"Total Rows: {df.shape[0]}")
+    st.write(f"Total Columns: {df.shape[1]}")
 
-            .chat-row.user {
-                align-self: flex-end;
-                text-align: right;
-            }
+    st.subheader("Dataset Preview")
+    sample_rows = st.slider("Preview Rows Limit", 0, 100, 10, key="sample_rows_single")
+    st.dataframe(df.head(sample_rows), use_container_width=True)
 
-            .chat-row.assistant {
-                align-self: flex-start;
-                text-align: left;
-            }
+    st.subheader("Column Selection")
+    important_cols = cached_important_columns(session, df)
+    user_selected_cols = st.multiselect("Select Additional Columns", df.columns.tolist(), default=important_cols)
 
-            .chat-label {
-                font-weight: bold;
-                font-size: 0.85rem;
-                margin-bottom: 0.25rem;
-                color: #bbb;
-            }
+    final_cols = list(set(important_cols + user_selected_cols))
+    previous = session.get("column_selection")
+    session["column_selection"] = final_cols
 
-            .chat-bubble {
-                padding: 0.75rem 1rem;
-                border-radius: 12px;
-                background-color: rgba(255, 255, 255, 0.06);
-                color: white;
-                word-wrap: break-word;
-            }
+    st.write(f"Selected Columns: {final_cols}")
+    st.dataframe(df[final_cols].head(), use_container_width=True)
+
+    # The visualization panel offers the selected columns, so a new selection reruns the page.
+    if previous is not None and set(previous) != set(final_cols):
+        st.rerun()
 
-            .chat-row.user .chat-bubble {
-                background-color: rgba(180, 220, 255, 0.1);
-            }
-            </style>
-            """,
-            unsafe_allow_html=True,
-        )
 
-        if "chat_history" not in st.session_state:
-            st.session_state.chat_history =  []
+@panel
+def _insights_panel(session, df):
+    st.header("Insights")
 
+    col_left, col_right = st.columns([7, 3], gap="large")
+
+    with col_left:
+        st.markdown("### Generated Insights")
+        if session["selected_insight_results"]:
+            for idx, insight in enumerate(session["selected_insight_results"][::-1]):
+                with st.container(border=True):
+                    st.markdown(f"**{insight['question']}**")
+                    st.markdown(insight["result"])
+                    fig = guess_and_generate_chart(df, insight["result"])
+                    if fig:
+                        st.plotly_chart(fig, use_container_width=True, key=f"insight_chart_{idx}")
+                    st.markdown("---")
+        else:
+            st.info("Please select an insight question from the right to view the results.")
+
+    with col_right:
         with st.container():
-            for msg in st.session_state.chat_history:
-                if "user" in msg:
-                    st.markdown(
-                        f"""
-                        <div class="chat-row user">
-                            <div class="chat-label">User</div>
-                            <div class="chat-bubble">{msg["user"]}</div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True,
-                    )
-                if "assistant" in msg:
-                    response = msg["assistant"].get("response", msg["assistant"])
-                    st.markdown(
-                        f"""
-                        <div class="chat-row assistant">
-                            <div class="chat-label">AI</div>
-                            <div class="chat-bubble">{response}</div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True,
-                    )
-                    
-                    if "chart" in msg["assistant"]:
-                        chart_type = msg["assistant"]["chart"]["type"]
-                        data = msg["assistant"]["chart"]["data"]
-                        x_col = msg["assistant"]["chart"].get("x")
-                        y_col = msg["assistant"]["chart"].get("y")
-                        chart_df = pd.DataFrame(data)
-
-                        if chart_type == "bar":
-                            st.bar_chart(chart_df.set_index(x_col)[y_col])
-                        elif chart_type == "line":
-                            st.line_chart(chart_df.set_index(x_col)[y_col])
-                        elif chart_type == "pie":
-                            fig = px.pie(chart_df, names=x_col, values=y_col, title="Pie Chart")
-                            st.plotly_chart(fig, use_container_width=True)
-            st.markdown("</div>", unsafe_allow_html=True)
-
-        user_prompt = st.chat_input("Ask a question about your dataset...")
-        if user_prompt:
-            st.session_state.chat_history.append({"user": user_prompt})
-            # save_chat(st.session_state.username, "user", user_prompt)
-
-            with st.spinner("Thinking..."):
-                result = safe_llm_call(handle_user_query_dynamic, user_prompt, df, "groq", default={"response": "No response."})
-
-            st.session_state.chat_history.append({"assistant": result})
-            # save_chat(st.session_state.username, "ai", result["response"])
-
-            st.rerun()
+         if "open_category_index_single" not in st.session_state:
+            st.session_state["open_category_index_single"] = None
+        
+         if not session["insight_categories"]:
+            # Instant suggestions from the column profile; the LLM's replace them once ready.
+            session["insight_categories"] = local_insight_categories(df)
+            session["insight_categories_source"] = "local"
+
+         if session.get("insight_categories_source") == "local":
+            refine_key = _refine_key()
+            refined = category_refiner.refine(refine_key, llm_insight_categories, df)
+            if refined:
+                session["insight_categories"] = refined
+                session["insight_categories_source"] = "llm"
+            elif category_refiner.pending(refine_key):
+                st.caption("Refining suggestions for this dataset...")
+
+         if session["insight_categories"]:
+            prefetch = st.toggle("Prefetch answers in background", key="prefetch_insights",
+                                 value=get_llm_config()["prefetch"]["enabled"])
+            if prefetch:
+                clicked = [r["question"] for r in session["selected_insight_results"]]
+                ranked = rank_questions(session["insight_categories"],
+                                        st.session_state["open_category_index_single"], clicked)
+                insight_prefetcher.start(st.session_state.llm_session_id, df, ranked,
+                                         planner=st.session_state.get("planner_mode"))
+                ready, total = insight_prefetcher.progress(st.session_state.llm_session_id, df)
+                if total:
+                    st.caption(f"{ready} of {total} answers ready")
+            else:
+                insight_prefetcher.stop(st.session_state.llm_session_id)
+
+         for idx, category in enumerate(session["insight_categories"]):
+            expanded = st.session_state["open_category_index_single"] == idx
+            with st.expander(f"{category['title']}", expanded=expanded):
+                if len(category["questions"]) > 1 and st.button("Answer all in this category",
+                                                                key=f"insight_batch_{idx}"):
+                    try:
+                        answered = {r["question"] for r in session["selected_insight_results"]}
+                        results = generate_insights_batch(
+                            df, [q for q in category["questions"] if q not in answered], "groq",
+                            planner=st.session_state.get("planner_mode"))
+                        for question, result in results.items():
+                            session["selected_insight_results"].append({"question": question, "result": result})
+                        st.session_state["selected_insight_results"] = session["selected_insight_results"]
+                        st.session_state["open_category_index_single"] = idx
+                        rerun_panel()
+                    except Exception as e:
+                        st.error(f"Insight generation failed: {e}")
+                for question in category["questions"]:
+                    if st.button(f"{question}", key=f"insight_{idx}_{question}"):
+                        try:
+                            result = generate_insights(df, question, "groq", planner=st.session_state.get("planner_mode"))
+                            session["selected_insight_results"].append({"question": question, "result": result})
+
+                            # 🔄 Sync with st.session_state so PDF export picks it up
+                            st.session_state["selected_insight_results"] = session["selected_insight_results"]
+
+                            st.session_state["open_category_index_single"] = idx
+                            rerun_panel()
+                        except Exception as e:
+                             st.error(f"Insight generation failed: {e}")
+         st.markdown("</div>", unsafe_allow_html=True)
+
+
+@panel
+def _visualization_panel(session, df):
+    st.header("Visualizations")
+
+    if not session.get("column_selection"):
+        st.warning("Please select columns in Tab 1 to visualize.")
+        return
+
+    x_axis = st.selectbox("Select X-Axis", session["column_selection"], key="single_visual_x")
+    y_axis = st.selectbox("Select Y-Axis", session["column_selection"], key="single_visual_y")
+    chart_type = st.selectbox("Chart Type", ["bar", "line", "scatter", "box", "violin", "area", "pie"], key="single_visual_chart")
+
+    if x_axis and y_axis:
+        try:
+            llm_response = {"chart_type": chart_type, "x": x_axis, "y": y_axis, "group_by": None}
+            fig, explanation = visualize_from_llm_response(df, f"{x_axis} vs {y_axis}", llm_response)
+            if fig:
+                st.plotly_chart(fig, use_container_width=True)
+                session["visualization_history"].append(f"{chart_type} chart: {x_axis} vs {y_axis}")
+                st.caption(explanation)
+        except Exception as e:
+            st.error(f"Visualization failed: {e}")
+
+
+@panel
+def _chat_panel(session, df):
+    st.markdown(
+        """
+        <style>
+        .chat-container {
+            max-height: 420px;
+            overflow-y: auto;
+            padding: 1rem;
+            display: flex;
+            flex-direction: column;
+            gap: 1rem;
+            background-color: rgba(240, 240, 240, 0.05);
+            border-radius: 12px;
+        }
+
+        .chat-row {
+            display: flex;
+            flex-direction: column;
+            max-width: 85%;
+        }
+
+        .chat-row.user {
+            align-self: flex-end;
+            text-align: right;
+        }
+
+        .chat-row.assistant {
+            align-self: flex-start;
+            text-align: left;
+        }
+
+        .chat-label {
+            font-weight: bold;
+            font-size: 0.85rem;
+            margin-bottom: 0.25rem;
+            color: #bbb;
+        }
 
+        .chat-bubble {
+            padding: 0.75rem 1rem;
+            border-radius: 12px;
+            background-color: rgba(255, 255, 255, 0.06);
+            color: white;
+            word-wrap: break-word;
+        }
+
+        .chat-row.user .chat-bubble {
+            background-color: rgba(180, 220, 255, 0.1);
+        }
+        </style>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    # History and memory belong to the dataset session, not the browser session.
+    chat_history = session.setdefault("chat_history", [])
+    chat_memory = session.setdefault("chat_memory", {})
+
+    with st.container():
+        render_chat_history(chat_history, key=f"chat_single_{st.session_state.current_session}")
+        st.markdown("</div>", unsafe_allow_html=True)
 
+    user_prompt = st.chat_input("Ask a question about your dataset...")
+    if user_prompt:
+        chat_history.append(new_message(user=user_prompt))
+        # save_chat(st.session_state.username, "user", user_prompt)
+
+        with st.spinner("Thinking..."):
+            result = safe_llm_call(handle_user_query_dynamic, user_prompt, df, "groq", default={"response": "No response."},
+                                   planner=st.session_state.get("planner_mode"),
+                                   history=chat_history[:-1], memory=chat_memory)
+
+        chat_history.append(new_message(assistant=result))
+        fold_async(chat_history, chat_memory)
+        # save_chat(st.session_state.username, "ai", result["response"])
+
+        rerun_panel()
+
+
+@panel
+def _export_panel(session):
     from utils.pdf_exporter import generate_pdf_report, export_to_pptx
     from utils.pdf_helpers import format_chat_for_pdf
 
-    st.markdown("---")
     st.subheader("Export Report")
 
     if "report_counter" not in st.session_state:
@@ -350,7 +374,7 @@ def render_single_tabs():
 
     with col1:
         if st.button("Export PDF Report"):
-            formatted_chat = format_chat_for_pdf(st.session_state.get("chat_history", []))
+            formatted_chat = format_chat_for_pdf(session.get("chat_history", []))
             
             # ✅ Ensure insights is always a list
             insights_dict = st.session_state.get("insights", {})
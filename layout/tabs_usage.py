@@ -1,56 +1,90 @@
 # layout/tabs_usage.py
 
+import datetime
 import streamlit as st
 import pandas as pd
-import os
-import json
+from utils.usage_tracker import query_rollups, query_usage_page, usage_date_bounds
 
-USAGE_LOG_PATH = "logs/usage_log.json"
+PAGE_SIZE = 50
+
+
+def _money(df, cols=("cost",)):
+    fmt = {col: "${:,.4f}" for col in cols if col in df.columns}
+    fmt.update({col: "{:,.0f}" for col in ("requests", "errors", "cache_hits", "tokens_input",
+                                            "tokens_output", "total_tokens", "avg_latency_ms") if col in df.columns})
+    return df.style.format(fmt)
 
-def load_usage_data():
-    if not os.path.exists(USAGE_LOG_PATH):
-        return pd.DataFrame(columns=["user_id", "model", "timestamp", "tokens_input", "tokens_output", "total_tokens", "cost"])
-    
-    with open(USAGE_LOG_PATH, "r") as f:
-        data = json.load(f)
-    return pd.DataFrame(data)
 
 def usage_tab():
     st.title("User Usage Tracker")
 
-    df = load_usage_data()
-
-    if df.empty:
+    first_day, last_day = usage_date_bounds()
+    if first_day is None:
         st.info("No usage data available yet.")
         return
 
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-    st.write("### Full Log")
-    st.dataframe(df.sort_values("timestamp", ascending=False), use_container_width=True)
+    min_date = datetime.date.fromisoformat(first_day)
+    max_date = datetime.date.fromisoformat(last_day)
 
-    st.write("---")
+    st.write("### Filter by Date Range")
+    start_date = st.date_input("Start date", min_value=min_date, max_value=max_date, value=min_date)
+    end_date = st.date_input("End date", min_value=min_date, max_value=max_date, value=max_date)
+    start_key, end_key = start_date.isoformat(), end_date.isoformat()
 
+    # Everything above the raw log reads the daily/hourly rollups, so render
+    # cost depends on the number of days, users and models - not on log size.
     st.write("### Total Usage per User")
-    summary = df.groupby("user_id").agg(
-        total_tokens=("total_tokens", "sum"),
-        total_cost=("cost", "sum"),
-        total_requests=("user_id", "count")
-    ).reset_index()
-
-    st.dataframe(summary.style.format({
-        "total_tokens": "{:,.0f}",
-        "total_cost": "${:,.4f}",
-        "total_requests": "{:,.0f}"
-    }), use_container_width=True)
+    per_user = pd.DataFrame(query_rollups("daily", start_key, end_key, group_by=("user_id",)))
+    if per_user.empty:
+        st.info("No usage in this date range.")
+        return
+    st.dataframe(_money(per_user), use_container_width=True)
+
+    st.write("### Usage per Model")
+    st.dataframe(_money(pd.DataFrame(query_rollups("daily", start_key, end_key, group_by=("model",)))),
+                 use_container_width=True)
+
+    st.write("### Usage per Feature")
+    st.dataframe(_money(pd.DataFrame(query_rollups("daily", start_key, end_key, group_by=("feature",)))),
+                 use_container_width=True)
+
+    st.write("### Tokens over Time")
+    granularity = "hourly" if start_date == end_date else "daily"
+    end_bucket = f"{end_key}T23" if granularity == "hourly" else end_key
+    series = pd.DataFrame(query_rollups(granularity, start_key, end_bucket, group_by=("bucket",)))
+    if not series.empty:
+        st.bar_chart(series.set_index("bucket")["total_tokens"])
 
     st.write("---")
+    _render_raw_log(start_date, end_date, per_user["user_id"].tolist())
 
-    st.write("### Filter by Date Range")
-    min_date, max_date = df["timestamp"].min(), df["timestamp"].max()
-    start_date = st.date_input("Start date", min_value=min_date.date(), max_value=max_date.date(), value=min_date.date())
-    end_date = st.date_input("End date", min_value=min_date.date(), max_value=max_date.date(), value=max_date.date())
-
-    mask = df["timestamp"].dt.date.between(start_date, end_date)
-    filtered = df[mask]
-    st.write(f"Showing {len(filtered)} entries between {start_date} and {end_date}")
-    st.dataframe(filtered, use_container_width=True)
\ No newline at end of file
+
+def _render_raw_log(start_date, end_date, users):
+    st.write("### Log Drill-down")
+    user_filter = st.selectbox("User", ["All users"] + users, key="usage_log_user")
+    user_id = None if user_filter == "All users" else user_filter
+
+    start_ts = start_date.isoformat()
+    end_ts = (end_date + datetime.timedelta(days=1)).isoformat()
+
+    # Keyset cursors of the pages visited so far; reset when the filter changes.
+    filter_key = (start_ts, end_ts, user_id)
+    if st.session_state.get("usage_log_filter") != filter_key:
+        st.session_state["usage_log_filter"] = filter_key
+        st.session_state["usage_log_cursors"] = [None]
+    cursors = st.session_state["usage_log_cursors"]
+
+    rows = query_usage_page(start_ts, end_ts, user_id=user_id, before=cursors[-1], limit=PAGE_SIZE)
+    st.caption(f"Page {len(cursors)} · {len(rows)} entries")
+    if rows:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+    col_prev, col_next = st.columns(2)
+    with col_prev:
+        if st.button("Previous page", disabled=len(cursors) == 1, key="usage_log_prev"):
+            cursors.pop()
+            st.rerun()
+    with col_next:
+        if st.button("Next page", disabled=len(rows) < PAGE_SIZE, key="usage_log_next"):
+            cursors.append((rows[-1]["timestamp"], rows[-1]["id"]))
+            st.rerun()
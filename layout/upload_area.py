@@ -112,6 +112,8 @@
 import streamlit as st
 from io import BytesIO
 from utils.file_loader import load_data, clean_data
+from utils.column_selector import cached_important_columns
+from utils.row_index import row_indexes
 
 def render_upload_area():
     st.markdown("## Upload Dataset(s)")
@@ -211,6 +213,8 @@ def render_upload_area():
                     "visualization_history": []
                 }
                 st.session_state["compare_sessions"][compare_key]["name"] = compare_key
+                # Picked once per dataset; the previews panel reads the stored picks.
+                cached_important_columns(st.session_state["compare_sessions"][compare_key], df1, "important_columns1")
 
                 st.session_state["current_compare"] = compare_key
                 st.toast(f"Comparison loaded: {compare_key}")
@@ -220,6 +224,8 @@ def render_upload_area():
                 st.error(f"Comparison upload failed: {e}")
 
 def store_dataset_session(file_name, df):
+    # Index rows for chat retrieval while the user looks around.
+    row_indexes.build_async(df)
     st.session_state["dataset_sessions"][file_name] = {
         "df": df,
         "chat_history": [],
@@ -229,3 +235,5 @@ def store_dataset_session(file_name, df):
         "column_selection": [],
         "name": file_name
     }
+    # Picked once per dataset; the data panel reads the stored picks.
+    cached_important_columns(st.session_state["dataset_sessions"][file_name], df)
@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os
+import sys
+
+# The app runs from the repository root (streamlit run app.py), so its
+# modules import as utils.* and layout.*.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
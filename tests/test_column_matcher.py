@@ -0,0 +1,32 @@
+# tests/test_column_matcher.py
+import re
+
+import pytest
+
+from utils.column_matcher import ColumnMatcher
+
+COLUMNS = ["Sales", "Sales Rep", "Region", "Order ID", "ID", "Unit Price", "Price"]
+
+
+def _regex_find(columns, text):
+    return [c for c in columns if re.search(rf"\b{re.escape(str(c))}\b", text, re.I)]
+
+
+@pytest.mark.parametrize("text", [
+    "Total sales by region",
+    "Which sales rep has the highest unit price?",
+    "Count orders per Order ID",
+    "salesman and regional totals",
+    "price, PRICE; unit-price",
+    "",
+])
+def test_matches_word_bounded_regex(text):
+    assert ColumnMatcher(COLUMNS).find(text) == _regex_find(COLUMNS, text)
+
+
+def test_overlapping_names_all_found_in_column_order():
+    assert ColumnMatcher(COLUMNS).find("unit price per sales rep") == ["Sales", "Sales Rep", "Unit Price", "Price"]
+
+
+def test_substring_is_not_a_mention():
+    assert ColumnMatcher(["age", "id"]).find("average of ids and page views") == []
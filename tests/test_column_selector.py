@@ -0,0 +1,23 @@
+# tests/test_column_selector.py
+import pandas as pd
+
+import utils.column_selector as column_selector
+
+
+def test_important_columns_are_picked_once_per_dataset(monkeypatch):
+    calls = []
+
+    def fake_pick(csv_data, model_source="groq"):
+        calls.append(csv_data)
+        return ["Sales"]
+
+    monkeypatch.setattr(column_selector, "get_important_columns", fake_pick)
+    session = {}
+    df = pd.DataFrame({"Region": ["North", "South"], "Sales": [1, 2]})
+
+    assert column_selector.cached_important_columns(session, df) == ["Sales"]
+    assert column_selector.cached_important_columns(session, df.copy()) == ["Sales"]
+    assert len(calls) == 1
+
+    column_selector.cached_important_columns(session, df.assign(Sales=[3, 4]))
+    assert len(calls) == 2
@@ -0,0 +1,71 @@
+# tests/test_expression_executor.py
+import pandas as pd
+import pytest
+
+from utils.expression_executor import ExpressionError, ExpressionExecutor, check_pandas_expression, check_sql
+from utils.llm_config import get_llm_config
+
+COLUMNS = ["Region", "Sales", "Order Date"]
+
+
+@pytest.mark.parametrize("code", [
+    'df.groupby("Region")["Sales"].sum().nlargest(5)',
+    'df[df["Sales"] > 100]["Region"].value_counts()',
+    'df.Sales.mean()',
+    'df.groupby(pd.Grouper(key="Order Date", freq="M"))["Sales"].agg(["sum", "mean"])',
+])
+def test_accepts_read_only_pandas(code):
+    check_pandas_expression(code, COLUMNS)
+
+
+@pytest.mark.parametrize("code, reason", [
+    ('__import__("os")', "unknown name '__import__'"),
+    ('open("/etc/passwd")', "unknown name 'open'"),
+    ("df.__class__", "attribute '__class__'"),
+    ("df._data", "attribute '_data'"),
+    ('df.query("Sales > 0")', "attribute 'query'"),
+    ('df.eval("Sales * 2")', "attribute 'eval'"),
+    ('df.to_csv("out.csv")', "attribute 'to_csv'"),
+    ("[row for row in df]", "ListComp"),
+    ("(lambda: df)()", "Lambda"),
+    ("df.Unknown", "attribute 'Unknown'"),
+    ('df.agg("exec")', "'exec' is not an allowed aggregation"),
+    ('df.pivot_table(index="Region", aggfunc=["sum", "system"])', "'system'"),
+    ("df[", "not a Python expression"),
+    ("x = 1", "not a Python expression"),
+])
+def test_rejects(code, reason):
+    with pytest.raises(ExpressionError, match=reason):
+        check_pandas_expression(code, COLUMNS)
+
+
+def test_dataframe_attribute_beats_column_name():
+    # A column named "values" would be read as DataFrame.values.
+    with pytest.raises(ExpressionError):
+        check_pandas_expression("df.values", ["values"])
+
+
+def test_sql_is_single_select():
+    check_sql("SELECT Region, SUM(Sales) FROM df GROUP BY Region;")
+    with pytest.raises(ExpressionError):
+        check_sql("DROP TABLE df")
+    with pytest.raises(ExpressionError):
+        check_sql("SELECT 1; DELETE FROM df")
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("WITH totals AS (SELECT Region, SUM(Sales) AS total FROM df GROUP BY Region) "
+     "SELECT total FROM totals ORDER BY total", [30, 40]),
+    ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3) SELECT i FROM n", [1, 2, 3]),
+])
+def test_sql_runs_read_only_ctes(code, expected):
+    executor = ExpressionExecutor({**get_llm_config()["executor"], "start_method": "spawn"})
+    df = pd.DataFrame({"Region": ["North", "South", "North"], "Sales": [10, 40, 20]})
+    check_sql(code)
+    assert executor.run(df, code, kind="sql").iloc[:, 0].tolist() == expected
+
+
+def test_sql_cannot_read_the_schema():
+    executor = ExpressionExecutor({**get_llm_config()["executor"], "start_method": "spawn"})
+    with pytest.raises(ExpressionError):
+        executor.run(pd.DataFrame({"Sales": [1]}), "SELECT name FROM sqlite_master", kind="sql")
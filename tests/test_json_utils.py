@@ -0,0 +1,48 @@
+# tests/test_json_utils.py
+import pytest
+
+from utils.json_utils import extract_json_list, repair_json
+
+
+def test_plain_and_fenced():
+    assert repair_json('{"a": 1}') == {"a": 1}
+    assert repair_json('Here you go:\n```json\n[1, 2]\n```') == [1, 2]
+
+
+def test_prose_trailing_commas_and_python_literals():
+    assert repair_json('Sure! {"a": [1, 2,],} Hope that helps.') == {"a": [1, 2]}
+    assert repair_json("{'a': True, 'b': None}") == {"a": True, "b": None}
+
+
+def test_truncated_mid_string_drops_partial_value():
+    assert repair_json('[{"q": "Total sales"}, {"q": "Average pro') == [{"q": "Total sales"}]
+    assert repair_json('{"title": "Sales", "summary": "Revenue grew') == {"title": "Sales"}
+
+
+def test_truncated_inside_first_element_leaves_empty_outer_value():
+    assert repair_json('[{"q": "Average pro') == []
+    assert repair_json('{"items": [') == {}
+
+
+def test_truncated_mid_number_and_after_key():
+    assert repair_json('[1, 2, 3') == [1, 2]
+    assert repair_json('{"a": 1, "b":') == {"a": 1}
+
+
+def test_truncated_after_complete_element_closes_brackets():
+    assert repair_json('{"items": ["x", "y"') == {"items": ["x", "y"]}
+    assert repair_json('[{"a": 1}, {"b": 2}') == [{"a": 1}, {"b": 2}]
+    assert repair_json('[[1, 2], [3') == [[1, 2]]
+
+
+def test_nothing_usable():
+    with pytest.raises(ValueError):
+        repair_json("no json here")
+    with pytest.raises(ValueError):
+        repair_json("]}")
+
+
+def test_extract_json_list_unwraps_json_mode_object():
+    assert extract_json_list('{"result": ["a", "b"]}') == ["a", "b"]
+    with pytest.raises(ValueError):
+        extract_json_list('{"a": 1}')
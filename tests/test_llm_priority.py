@@ -0,0 +1,89 @@
+# tests/test_llm_priority.py
+import threading
+import time
+
+import utils.model_router as router_module
+from utils.llm_context import llm_priority, set_llm_user
+from utils.llm_priority import PriorityGate
+from utils.quota import QuotaManager
+
+WAIT_S = 5
+
+
+def _gate(interactive=1, background=1):
+    return PriorityGate({
+        "classes": {"interactive": {"max_concurrent": interactive},
+                    "background": {"max_concurrent": background}},
+        "tasks": {"default": "interactive"},
+    })
+
+
+def _wait_until(condition):
+    deadline = time.monotonic() + WAIT_S
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_background_yields_to_queued_interactive():
+    gate = _gate(interactive=1, background=1)
+    order, release = [], threading.Event()
+
+    def call(priority, name):
+        with llm_priority(priority), gate.slot("default"):
+            order.append(name)
+            release.wait(WAIT_S)
+
+    first = _start(call, "interactive", "first")
+    _wait_until(lambda: order == ["first"])
+    waiting = _start(call, "interactive", "interactive")
+    _wait_until(lambda: gate.snapshot()["interactive"]["queued"] == 1)
+    background = _start(call, "background", "background")
+    _wait_until(lambda: gate.snapshot()["background"]["queued"] == 1)
+    # Background capacity is free, but an interactive call is queued.
+    time.sleep(0.1)
+    assert order == ["first"]
+
+    release.set()
+    for thread in (first, waiting, background):
+        thread.join(WAIT_S)
+    assert order == ["first", "interactive", "background"]
+
+
+def test_call_waiting_for_priority_holds_no_quota_slot(tmp_path, monkeypatch):
+    gate = _gate(interactive=1)
+    quota = QuotaManager({"daily_tokens": None, "max_concurrent": 2, "queue_timeout_s": WAIT_S,
+                          "interactive_reserved": 1},
+                         overrides_path=str(tmp_path / "quota_overrides.json"))
+    monkeypatch.setattr(router_module, "priority_gate", gate)
+    monkeypatch.setattr(router_module, "quota_manager", quota)
+    started, release = [], threading.Event()
+
+    def fake_complete(prompt, *args):
+        started.append(prompt)
+        release.wait(WAIT_S)
+        return prompt
+
+    monkeypatch.setattr(router_module.model_router, "_complete", fake_complete)
+
+    def call(user, prompt):
+        set_llm_user(user)
+        router_module.model_router.complete(prompt)
+
+    running = _start(call, "alice", "running")
+    _wait_until(lambda: started == ["running"])
+    queued = _start(call, "alice", "queued")
+    _wait_until(lambda: gate.snapshot()["interactive"]["queued"] == 1)
+    assert quota._in_flight["alice"] == 1
+
+    release.set()
+    for thread in (running, queued):
+        thread.join(WAIT_S)
+    assert started == ["running", "queued"]
+    assert quota._in_flight["alice"] == 0
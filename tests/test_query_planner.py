@@ -0,0 +1,83 @@
+# tests/test_query_planner.py
+import pandas as pd
+import pytest
+
+from utils.llm_config import get_llm_config
+from utils.query_planner import QuerySpecError, run_spec, validate_spec
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "Region": ["North", "South", "North", "West"],
+        "Sales": [100.0, 250.0, 50.0, 75.0],
+        "Order Date": pd.to_datetime(["2024-01-05", "2024-01-20", "2024-02-03", "2024-03-15"]),
+    })
+
+
+def test_normalizes_valid_spec(df):
+    spec = validate_spec({
+        "group_by": ["Region"],
+        "metrics": [{"column": "Sales", "agg": "sum"}],
+        "sort": [{"by": "sum_Sales", "descending": True}],
+        "limit": 10_000,
+    }, df)
+    assert spec["filters"] == []
+    assert spec["sort"] == [{"by": "sum_Sales", "descending": True}]
+    assert spec["limit"] == get_llm_config()["planner"]["max_result_rows"]
+
+
+def test_time_grain_sorts_by_period(df):
+    spec = validate_spec({
+        "group_by": ["Order Date:month"],
+        "metrics": [{"column": "*", "agg": "count"}],
+    }, df)
+    assert spec["sort"] == [{"by": "Order Date (month)", "descending": False}]
+
+
+def test_sort_by_raw_group_key_resolves_to_its_name(df):
+    spec = validate_spec({
+        "group_by": ["Order Date:year"],
+        "metrics": [{"column": "Sales", "agg": "sum"}],
+        "sort": [{"by": "Order Date:year"}],
+    }, df)
+    assert spec["sort"] == [{"by": "Order Date (year)", "descending": False}]
+
+
+def test_lists_every_problem(df):
+    with pytest.raises(QuerySpecError) as raised:
+        validate_spec({
+            "filters": [{"column": "Country", "op": "==", "value": "US"},
+                        {"column": "Sales", "op": "between", "value": 10}],
+            "group_by": ["Region:fortnight"],
+            "metrics": [{"column": "Region", "agg": "mean"}, {"column": "*", "agg": "sum"}],
+            "sort": [{"by": "profit"}],
+        }, df)
+    message = str(raised.value)
+    for problem in ("filter column 'Country' does not exist",
+                    "'between' needs a list value",
+                    "time grain must be one of",
+                    "'mean' needs a numeric column but 'Region'",
+                    "'*' can only be counted, not 'sum'",
+                    "sort key 'profit'"):
+        assert problem in message
+
+
+def test_filter_needs_value(df):
+    with pytest.raises(QuerySpecError, match="needs a value"):
+        validate_spec({"filters": [{"column": "Region", "op": "=="}],
+                       "metrics": [{"column": "*", "agg": "count"}]}, df)
+    validate_spec({"filters": [{"column": "Region", "op": "not null"}],
+                   "metrics": [{"column": "*", "agg": "count"}]}, df)
+
+
+def test_run_spec_aggregates_full_frame(df):
+    spec = validate_spec({
+        "filters": [{"column": "Sales", "op": ">", "value": 60}],
+        "group_by": ["Region"],
+        "metrics": [{"column": "Sales", "agg": "sum"}],
+        "sort": [{"by": "sum_Sales", "descending": True}],
+    }, df)
+    result = run_spec(spec, df)
+    assert result["Region"].tolist() == ["South", "North", "West"]
+    assert result["sum_Sales"].tolist() == [250.0, 100.0, 75.0]
@@ -0,0 +1,81 @@
+# tests/test_quota.py
+import threading
+import time
+
+import pytest
+
+from utils.llm_priority import BACKGROUND
+from utils.quota import QuotaExceededError, QuotaManager
+
+
+def _quota(tmp_path, max_concurrent=1, queue_timeout_s=5):
+    return QuotaManager({"daily_tokens": None, "max_concurrent": max_concurrent,
+                         "queue_timeout_s": queue_timeout_s, "interactive_reserved": 1},
+                        overrides_path=str(tmp_path / "quota_overrides.json"))
+
+
+def test_slot_caps_each_user_separately(tmp_path):
+    quota = _quota(tmp_path, max_concurrent=1, queue_timeout_s=0.2)
+    with quota.slot("alice"):
+        with quota.slot("bob"):
+            pass
+        with pytest.raises(QuotaExceededError):
+            with quota.slot("alice"):
+                pass
+    with quota.slot("alice"):
+        pass
+
+
+def _hold(quota, user, priority, started, release):
+    def run():
+        with quota.slot(user, priority):
+            started.append(priority)
+            release.wait(5)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_background_work_leaves_a_slot_for_interactive_calls(tmp_path):
+    quota = _quota(tmp_path, max_concurrent=3, queue_timeout_s=0.2)
+    started, release = [], threading.Event()
+    holders = [_hold(quota, "alice", BACKGROUND, started, release) for _ in range(2)]
+    _wait_until(lambda: len(started) == 2)
+
+    with pytest.raises(QuotaExceededError):
+        with quota.slot("alice", BACKGROUND):
+            pass
+    with quota.slot("alice"):
+        pass
+
+    release.set()
+    for thread in holders:
+        thread.join(5)
+
+
+def test_interactive_waiter_goes_ahead_of_background_waiter(tmp_path):
+    quota = _quota(tmp_path, max_concurrent=1)
+    started, release, done = [], threading.Event(), threading.Event()
+    holder = _hold(quota, "alice", BACKGROUND, started, done)
+    _wait_until(lambda: started == [BACKGROUND])
+    waiting = _hold(quota, "alice", BACKGROUND, started, release)
+    time.sleep(0.1)
+    interactive = _hold(quota, "alice", "interactive", started, release)
+    _wait_until(lambda: quota._interactive_waiting.get("alice") == 1)
+
+    done.set()
+    _wait_until(lambda: len(started) == 2)
+    assert started[1] == "interactive"
+
+    release.set()
+    for thread in (holder, waiting, interactive):
+        thread.join(5)
+    assert started == [BACKGROUND, "interactive", BACKGROUND]
@@ -0,0 +1,69 @@
+# tests/test_replay_backend.py
+import copy
+
+import pandas as pd
+import pytest
+
+import utils.replay_backend as replay_backend
+import utils.structured_output as structured_output
+from utils.llm_config import get_llm_config
+from utils.model_router import model_router
+from utils.query_planner import plan_query
+from utils.structured_output import (
+    CATEGORY_SCHEMA, CHAT_SCHEMA, COLUMN_LIST_SCHEMA, INSIGHT_BATCH_SCHEMA, QUERY_SPEC_SCHEMA,
+    TITLED_LIST_SCHEMA, complete_json,
+)
+
+DF = pd.DataFrame({
+    "Region": ["North", "South", "North"],
+    "Sales": [100.0, 250.0, 50.0],
+})
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Synthesize every call offline and count the model calls made per task."""
+    config = copy.deepcopy(get_llm_config()["replay"])
+    config["synthesize"]["sleep"] = False
+    backend = replay_backend.ReplayBackend(config)
+    backend.mode = replay_backend.SYNTHESIZE
+    monkeypatch.setattr(model_router, "replay", backend)
+    monkeypatch.setattr(replay_backend, "record_llm_call", lambda *args, **kwargs: None)
+
+    counted = []
+    complete = model_router.complete
+
+    def counting_complete(prompt, task="default", *args, **kwargs):
+        counted.append(task)
+        return complete(prompt, task, *args, **kwargs)
+
+    monkeypatch.setattr(structured_output.model_router, "complete", counting_complete)
+    return counted
+
+
+@pytest.mark.parametrize("task, schema, prompt", [
+    ("categories", CATEGORY_SCHEMA, "Suggest insight categories."),
+    ("categories", TITLED_LIST_SCHEMA, "Suggest comparison insights."),
+    ("categories", {"type": "array", "minItems": 1, "items": {"type": "object", "required": ["description"]}},
+     "Suggest comparisons."),
+    ("chat", CHAT_SCHEMA, "User Question: total sales?"),
+    ("column_selection", COLUMN_LIST_SCHEMA, "Dataset preview:\nRegion,Sales\nNorth,100"),
+    ("insight_batch", INSIGHT_BATCH_SCHEMA, "Titles:\n1. Sales by region\n2. Top region\n\nRegion,Sales\n"),
+    ("query_plan", QUERY_SPEC_SCHEMA, "The dataset has 3 rows and these columns:\n- Region: object\n- Sales: float64\n"),
+])
+def test_synthesized_output_validates_first_time(calls, task, schema, prompt):
+    complete_json(prompt, schema, task=task, model_source="replay", max_reasks=0)
+    assert calls == [task]
+
+
+def test_synthesized_query_plan_is_a_valid_spec(calls):
+    spec = plan_query("Total sales by region", DF, model_source="replay")
+    assert calls == ["query_plan"]
+    assert spec["group_by"] == ["Region"]
+    assert {"column": "Sales", "agg": "sum"} in spec["metrics"]
+
+
+def test_synthesized_batch_answers_every_title(calls):
+    prompt = "Titles:\n1. Sales by region\n2. Top region\n3. Trend\n\nRegion,Sales\n1. not a title"
+    items = complete_json(prompt, INSIGHT_BATCH_SCHEMA, task="insight_batch", model_source="replay", max_reasks=0)
+    assert [item["number"] for item in items] == [1, 2, 3]
@@ -0,0 +1,38 @@
+# tests/test_row_index.py
+import pandas as pd
+
+from utils.row_index import RowIndex
+
+
+def _frame():
+    return pd.DataFrame({
+        "Customer": ["Acme Corp", "Globex", "Acme Corp", "Initech", "Umbrella"],
+        "Notes": ["late delivery", "on time", "late delivery late again", None, "damaged box"],
+        "Amount": [10, 20, 30, 40, 50],
+    })
+
+
+def test_ranks_rows_by_bm25():
+    index = RowIndex(_frame())
+    # Both Acme rows match "acme"; the one that is late twice ranks first for "late".
+    assert index.search("late acme") == [2, 0]
+    assert index.search("globex") == [1]
+
+
+def test_no_match_and_numeric_columns_ignored():
+    index = RowIndex(_frame())
+    assert index.search("nothing matches") == []
+    assert index.search("40") == []
+
+
+def test_k_limits_results_best_first():
+    df = pd.DataFrame({"Item": ["red"] * 5 + ["red red"] + ["blue"] * 3})
+    index = RowIndex(df)
+    hits = index.search("red", k=3)
+    assert len(hits) == 3
+    assert hits[0] == 5
+
+
+def test_missing_values_and_empty_frame():
+    assert RowIndex(pd.DataFrame({"Notes": [None, None]})).search("late") == []
+    assert RowIndex(pd.DataFrame({"Notes": []}, dtype=object)).search("late") == []
@@ -0,0 +1,55 @@
+# tests/test_semantic_cache.py
+from utils.semantic_cache import SemanticCache
+
+
+def _cache_with(question, answer="cached"):
+    cache = SemanticCache()
+    cache.put("fp", "chat", question, answer)
+    return cache
+
+
+def test_paraphrase_hits():
+    cache = _cache_with("What is the average sales per region?")
+    assert cache.get("fp", "chat", "what's the avg sales by region") == "cached"
+    assert cache.stats()["hits"] == 1
+
+
+def test_different_entity_misses():
+    cache = _cache_with("Total sales in North region")
+    assert cache.get("fp", "chat", "Total sales in South region") is None
+
+
+def test_different_number_misses():
+    cache = _cache_with("Top 5 products by revenue")
+    assert cache.get("fp", "chat", "Top 10 products by revenue") is None
+
+
+def test_single_letter_name_is_kept():
+    cache = _cache_with("Sales of Product A")
+    assert cache.get("fp", "chat", "Sales of Product B") is None
+
+
+def test_scoped_by_dataset_and_namespace():
+    cache = _cache_with("Total sales in North region")
+    assert cache.get("other", "chat", "Total sales in North region") is None
+    assert cache.get("fp", "insight", "Total sales in North region") is None
+    cache.invalidate("fp")
+    assert cache.get("fp", "chat", "Total sales in North region") is None
+
+
+def test_lru_eviction_within_dataset():
+    cache = SemanticCache(max_entries_per_dataset=2)
+    cache.put("fp", "chat", "total revenue", 1)
+    cache.put("fp", "chat", "average discount", 2)
+    assert cache.get("fp", "chat", "total revenue") == 1
+    cache.put("fp", "chat", "number of customers", 3)
+    assert cache.get("fp", "chat", "average discount") is None
+    assert cache.get("fp", "chat", "total revenue") == 1
+
+
+def test_contains_leaves_stats_alone():
+    cache = _cache_with("What is the average sales per region?")
+    assert cache.contains("fp", "chat", "what's the avg sales by region")
+    assert not cache.contains("fp", "chat", "Total sales in South region")
+    assert not cache.contains("other", "chat", "What is the average sales per region?")
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 0
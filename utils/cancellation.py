@@ -0,0 +1,139 @@
+# utils/cancellation.py
+import threading
+import uuid
+
+from utils.logger import logger
+
+
+class LLMCancelledError(BaseException):
+    """
+    Raised inside LLM calls and report jobs whose originating session moved on.
+    Derives from BaseException, like Streamlit's own script-control exceptions,
+    so the broad `except Exception` fallbacks around LLM calls do not swallow
+    it and turn abandoned work into canned answers.
+    """
+
+
+class CancellationToken:
+    """
+    Shared flag for one unit of work (a script run, a report job). cancel()
+    aborts it at the next check; deprioritize() lets it finish as background
+    work. probe, when given, is polled while waiting; while it returns True
+    the token reads as cancelled (without cancelling other holders' work).
+    """
+
+    def __init__(self, probe=None):
+        self._cancelled = threading.Event()
+        self.reason = None
+        self.deprioritized = False
+        self._probe = probe
+
+    @property
+    def cancelled(self) -> bool:
+        if self._cancelled.is_set():
+            return True
+        if self._probe is not None:
+            try:
+                return bool(self._probe())
+            except Exception:
+                self._probe = None
+        return False
+
+    def cancel(self, reason="cancelled"):
+        if not self._cancelled.is_set():
+            self.reason = reason
+            self._cancelled.set()
+
+    def deprioritize(self):
+        self.deprioritized = True
+
+    def check(self):
+        if self.cancelled:
+            raise LLMCancelledError(self.reason or "rerun requested")
+
+
+class _Run:
+    def __init__(self, token, state):
+        self.token = token
+        self.state = state
+
+
+class SessionRuns:
+    """
+    The token of the latest script run of each browser session. A new run
+    cancels work from the previous one when the session's state key (user,
+    dataset) changed, and otherwise deprioritizes it.
+    """
+
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def begin_run(self, session_id, state, probe=None) -> CancellationToken:
+        token = CancellationToken(probe)
+        with self._lock:
+            previous = self._runs.get(session_id)
+            self._runs[session_id] = _Run(token, state)
+        if previous is not None:
+            if previous.state != state:
+                previous.token.cancel("session moved to another dataset")
+            else:
+                previous.token.deprioritize()
+        return token
+
+    def cancel_session(self, session_id, reason):
+        with self._lock:
+            run = self._runs.pop(session_id, None)
+        if run is not None:
+            logger.info(f"[Cancel] Session work cancelled: {reason}")
+            run.token.cancel(reason)
+
+
+session_runs = SessionRuns()
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+_probe_unsupported_logged = False
+
+
+def _probe_unsupported(reason):
+    global _probe_unsupported_logged
+    if not _probe_unsupported_logged:
+        _probe_unsupported_logged = True
+        logger.warning(f"[Cancel] Pending reruns will not interrupt LLM calls: {reason}. "
+                       f"requirements.txt pins the Streamlit versions this is checked against.")
+    return None
+
+
+def streamlit_rerun_probe():
+    """
+    A probe that reports when Streamlit has a rerun or stop pending for the
+    current script run, so a blocking LLM call on the script thread gives up
+    its slot right away instead of when it returns. Work the run handed to
+    other threads is unaffected (it is deprioritized by the next run instead).
+
+    Streamlit has no public API for this, so the probe reads the script
+    run's request state. That is feature-checked here against the Streamlit
+    versions pinned in requirements.txt: on any other layout it logs a
+    warning once and returns None (calls then end when they return).
+    """
+    script_thread = threading.current_thread()
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        try:
+            from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequestType  # 1.38+
+        except ImportError:
+            from streamlit.runtime.scriptrunner.script_requests import ScriptRequestType
+    except ImportError as e:
+        return _probe_unsupported(f"Streamlit's script request types moved ({e})")
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None  # not inside a script run (tests, background threads)
+    requests = getattr(ctx, "script_requests", None)
+    if not isinstance(getattr(requests, "_state", None), ScriptRequestType):
+        return _probe_unsupported("this Streamlit version does not expose the script run's request state")
+    return lambda: (threading.current_thread() is script_thread
+                    and requests._state is not ScriptRequestType.CONTINUE)
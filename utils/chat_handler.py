@@ -1,46 +1,158 @@
-from utils.groq_handler import call_groq_model, call_ollama_model
+from utils.structured_output import CHAT_SCHEMA, StructuredOutputError, complete_json
 from utils.logger import logger
+from utils.dataset_fingerprint import dataset_fingerprint
+from utils.semantic_cache import question_cache
+from utils.usage_tracker import record_llm_call
+from utils.prompt_planner import PromptPlanner, prompt_budget, schema_text
+from utils.query_planner import QuerySpecError, chart_for, narrate, plan_query, planner_enabled, run_spec
+from utils.expression_executor import ExpressionError, expression_executor
+from utils.llm_config import get_llm_config
+from utils.row_index import relevant_rows
+from utils.conversation_memory import conversation_context
 import json
 import traceback
 
-def handle_user_query_dynamic(prompt, df, model_source="groq"):
+
+def _answer_with_plan(prompt, df, model_source):
+    spec = plan_query(prompt, df, model_source, call_site="chat.plan")
+    table = run_spec(spec, df)
+    logger.info(f"[Planner] {prompt} -> {len(table)} result rows")
+    result = {"response": narrate(prompt, spec, table, "chat", model_source, call_site="chat").strip()}
+    chart = chart_for(spec, table)
+    if chart:
+        result["chart"] = chart
+    return result
+
+
+def _chart_from_table(table, chart_type):
+    if len(table) < 2 or len(table.columns) < 2:
+        return None
+    numeric = [c for c in table.columns if table[c].dtype.kind in "iuf"]
+    x = next((c for c in table.columns if c not in numeric), table.columns[0])
+    y = next((c for c in numeric if c != x), None)
+    if y is None:
+        return None
+    return {
+        "type": chart_type if chart_type in ("bar", "line", "pie") else "bar",
+        "data": json.loads(table[[x, y]].to_json(orient="records", date_format="iso")),
+        "x": x,
+        "y": y,
+    }
+
+
+def _table_text(table, max_rows=10):
+    rows = ["; ".join(f"{col}: {value}" for col, value in row.items())
+            for row in table.head(max_rows).to_dict(orient="records")]
+    more = f" (first {max_rows} of {len(table)} rows)" if len(table) > max_rows else ""
+    return f"On the full dataset{more}: " + " | ".join(rows)
+
+
+def _answer_with_expression(prompt, df, reply, model_source, narrated=False):
+    # narrated: rewrite the answer around the computed result with one more
+    # LLM call (planner mode); otherwise the result is appended to the answer.
+    field = "sql" if reply.get("sql") else "expression"
+    kind, code = ("sql" if field == "sql" else "pandas"), reply[field]
+    table = expression_executor.run(df, code, kind)
+    logger.info(f"[Executor] {kind}: {code} -> {len(table)} result rows")
+    if narrated:
+        response = narrate(prompt, {field: code}, table, "chat", model_source, call_site="chat").strip()
+    else:
+        response = f"{str(reply.get('response', '')).strip()}\n\n{_table_text(table)}".strip()
+    result = {"response": response, field: code}
+    chart = _chart_from_table(table, reply.get("chart_type"))
+    if chart:
+        result["chart"] = chart
+    return result
+
+
+def handle_user_query_dynamic(prompt, df, model_source="groq", planner=None, history=None, memory=None):
+    """
+    Answer a chat question about df. history holds the dataset session's
+    earlier messages and memory its rolling summary (see
+    utils/conversation_memory.py), so follow-up questions keep their context.
+    """
     try:
-        preview = df.head(100).to_csv(index=False)
+        use_planner = planner_enabled(planner)
+        namespace = "chat.plan" if use_planner else "chat"
+        fingerprint = dataset_fingerprint(df)
+        conversation = conversation_context(history or [], memory)
+        # A follow-up means something different in another conversation, so
+        # only standalone questions go through the semantic cache.
+        cached = None if conversation else question_cache.get(fingerprint, namespace, prompt)
+        if cached is not None:
+            logger.info(f"[Semantic cache hit] {prompt}")
+            record_llm_call("cache", "semantic", cache="hit", feature="chat")
+            return dict(cached)
+
+        if use_planner:
+            try:
+                question = f"{conversation}\n\nCurrent question: {prompt}" if conversation else prompt
+                result = _answer_with_plan(question, df, model_source)
+                if not conversation:
+                    question_cache.put(fingerprint, namespace, prompt, result)
+                return dict(result)
+            except (QuerySpecError, StructuredOutputError) as e:
+                # Not expressible as an aggregation: answer from the preview instead.
+                logger.info(f"[Planner] Falling back to preview answer: {e}")
+
+        # Rows matching the question first, so the trimmed sample keeps them.
+        preview = relevant_rows(df, prompt).to_csv(index=False)
 
         system_prompt = """
 You are a senior data analyst.
 Given a user's question and a preview of the dataset, provide a clear and concise answer.
-If relevant, return this JSON format:
+Return this JSON format:
 {
   "response": "Answer text here",
   "chart_type": "bar | line | scatter | pie | box | violin | area",
   "group_by": ["column1", "column2"],
-  "title": "Chart Title (optional)"
+  "title": "Chart Title (optional)",
+  "expression": "pandas expression over df computing the answer (optional)",
+  "sql": "SQLite SELECT over table df computing the answer (optional)"
 }
-If no chart is needed, return a plain response string.
+If no chart is needed, return only the "response" field.
+The preview is only a sample: when the answer needs numbers from the whole dataset, also give a
+single-line "expression" (e.g. df.groupby("Region")["Sales"].sum().nlargest(5)) or "sql".
         """
 
+        prompt_plan = PromptPlanner(prompt_budget("chat"))
+        prompt_plan.add("instructions", system_prompt, required=True)
+        prompt_plan.add("question", prompt, required=True)
+        prompt_plan.add("conversation", conversation, priority=20, min_tokens=100)
+        prompt_plan.add("schema", schema_text(df), priority=30, min_tokens=100, by_lines=True)
+        prompt_plan.add("sample", preview, priority=10, by_lines=True, keep_lines=1)
+        parts = prompt_plan.plan()
+
+        history_block = f"Earlier conversation:\n{parts['conversation']}\n\n" if conversation else ""
         user_prompt = f"""
-User Question: {prompt}
+{history_block}User Question: {prompt}
+
+Columns:
+{parts["schema"]}
 
-Dataset Preview:
-{preview[:1500]}
+Dataset Rows (those matching the question first):
+{parts["sample"]}
         """
 
-        logger.info(f"[Model: {model_source}] {prompt}")
+        logger.info(f"[Model: {model_source}] {prompt} (~{prompt_plan.predicted_tokens} input tokens)")
+
+        # A plain-prose answer is still an answer: keep it rather than re-asking.
+        result = complete_json(user_prompt, CHAT_SCHEMA, task="chat", model_source=model_source,
+                               system_prompt=system_prompt, call_site="chat",
+                               fallback=lambda text: {"response": text.strip()})
 
-        if model_source == "groq":
-            response = call_groq_model(system_prompt, user_prompt)
-        else:
-            response = call_ollama_model(f"{system_prompt.strip()}\n{user_prompt.strip()}")
+        logger.info(f"[LLM Response]: {result}")
 
-        logger.info(f"[LLM Raw Response]: {response}")
+        if get_llm_config()["executor"]["enabled"] and (result.get("expression") or result.get("sql")):
+            try:
+                question = f"{conversation}\n\nCurrent question: {prompt}" if conversation else prompt
+                result = _answer_with_expression(question, df, result, model_source, narrated=use_planner)
+            except ExpressionError as e:
+                logger.info(f"[Executor] Keeping the preview answer: {e}")
 
-        try:
-            parsed = json.loads(response)
-            return parsed if isinstance(parsed, dict) else {"response": response}
-        except Exception:
-            return {"response": response}
+        if not conversation:
+            question_cache.put(fingerprint, namespace, prompt, result)
+        return dict(result)
 
     except Exception as e:
         logger.error(f"Exception in handle_user_query_dynamic: {e}")
@@ -0,0 +1,82 @@
+# utils/column_matcher.py
+from collections import deque
+from functools import lru_cache
+
+
+def _is_word(ch) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class ColumnMatcher:
+    """
+    Finds which column names a text mentions, case-insensitively and on word
+    boundaries (the same rule as re.search(rf"\\b{col}\\b", text, re.I)), in
+    one pass over the text however many columns there are. Built once per
+    schema as an Aho-Corasick automaton over the lower-cased names.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # state -> [(column index, name length)]
+        for index, column in enumerate(self.columns):
+            name = str(column).lower()
+            if name:
+                self._add(name, index)
+        self._link()
+
+    def _add(self, name, index):
+        state = 0
+        for ch in name:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((index, len(name)))
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _bounded(self, text, start, end) -> bool:
+        # \b at start and end: word-ness differs on the two sides.
+        before = _is_word(text[start - 1]) if start > 0 else False
+        after = _is_word(text[end]) if end < len(text) else False
+        return before != _is_word(text[start]) and _is_word(text[end - 1]) != after
+
+    def find(self, text) -> list:
+        """Columns mentioned in text, in column order."""
+        text = str(text).lower()
+        found = set()
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for index, length in self._out[state]:
+                if index not in found and self._bounded(text, pos + 1 - length, pos + 1):
+                    found.add(index)
+        return [self.columns[i] for i in sorted(found)]
+
+
+@lru_cache(maxsize=32)
+def _matcher(columns) -> ColumnMatcher:
+    return ColumnMatcher(columns)
+
+
+def column_matcher(df) -> ColumnMatcher:
+    """The shared matcher for df's schema."""
+    return _matcher(tuple(df.columns))
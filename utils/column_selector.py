@@ -1,7 +1,9 @@
 import pandas as pd
 from io import StringIO
-from utils.llm_selector import get_llm
+from utils.dataset_fingerprint import dataset_fingerprint
+from utils.structured_output import COLUMN_LIST_SCHEMA, complete_json
 from utils.logger import logger
+from utils.prompt_planner import fit_table, prompt_budget
 
 def get_important_columns(csv_data: str, model_source="groq") -> list:
     """
@@ -23,25 +25,21 @@ def get_important_columns(csv_data: str, model_source="groq") -> list:
         # Drop low variance (single unique value) columns
         df = df.loc[:, df.nunique(dropna=True) > 1]
 
-        # Take preview for LLM
-        preview = df.head(100).to_csv(index=False)
+        # Take preview for LLM, trimmed by rows to the task's token budget
+        preview = fit_table(df.head(100).to_csv(index=False), prompt_budget("column_selection"))
 
         prompt = f"""
 You are a senior data analyst. Based on the dataset preview below, suggest the most important columns for analysis or visualization.
 
-Return only the column names in a Python list format like: ['Age', 'Score', 'Category']
+Return only the column names as a JSON list like: ["Age", "Score", "Category"]
 Dataset preview:
-{preview[:1200]}
+{preview}
 """
 
-        llm = get_llm(model_source)
-        if hasattr(llm, "invoke"):
-            response = llm.invoke(prompt).content.strip()
-        else:
-            response = llm(prompt)
-
-        cols = eval(response)
-        if isinstance(cols, list) and all(isinstance(col, str) for col in cols):
+        cols = complete_json(prompt, COLUMN_LIST_SCHEMA, task="column_selection", model_source=model_source,
+                             call_site="column_selection")
+        cols = [col for col in cols if col in df.columns]
+        if cols:
             return cols
         else:
             logger.warning("LLM did not return a valid list of column names.")
@@ -49,4 +47,17 @@ Dataset preview:
 
     except Exception as e:
         logger.error(f"Failed to select important columns: {e}")
-        return df.columns[:7].tolist() if 'df' in locals() else []
\ No newline at end of file
+        return df.columns[:7].tolist() if 'df' in locals() else []
+
+
+def cached_important_columns(session, df, key="important_columns", model_source="groq") -> list:
+    """
+    get_important_columns() for df, kept in the dataset session under key so
+    panel reruns read it instead of asking the LLM again. Recomputed only
+    when the dataset changes.
+    """
+    fingerprint = dataset_fingerprint(df)
+    cached = session.get(key)
+    if cached is None or cached[0] != fingerprint:
+        session[key] = (fingerprint, get_important_columns(df.to_csv(index=False), model_source))
+    return list(session[key][1])
@@ -0,0 +1,141 @@
+# utils/conversation_memory.py
+import contextvars
+import threading
+import time
+
+from utils.cancellation import LLMCancelledError
+from utils.llm_config import get_llm_config
+from utils.llm_context import llm_priority
+from utils.llm_selector import get_llm
+from utils.logger import logger
+from utils.token_counter import count_tokens, truncate_to_tokens
+
+_folding = set()
+_folding_lock = threading.Lock()
+
+
+def chat_turns(history) -> list:
+    """
+    "User: ...\\nAssistant: ..." texts from a chat history. Accepts both the
+    single-dataset layout ({"user"} and {"assistant"} as separate messages) and
+    the comparison one (both keys in one message).
+    """
+    turns = []
+    for msg in history:
+        if "user" in msg:
+            turns.append(f"User: {msg['user']}")
+        if "assistant" in msg and turns:
+            reply = msg["assistant"]
+            reply = reply.get("response", "") if isinstance(reply, dict) else reply
+            turns[-1] += f"\nAssistant: {reply}"
+    return turns
+
+
+def _recent_start(turns, settings) -> int:
+    """Index of the first turn kept verbatim."""
+    start, used = len(turns), 0
+    while start > 0 and len(turns) - start < settings["recent_turns"]:
+        tokens = count_tokens(turns[start - 1])
+        if used + tokens > settings["recent_tokens"]:
+            break
+        used += tokens
+        start -= 1
+    return start
+
+
+def _latest_within(turns, max_tokens) -> list:
+    """The last turns that fit in max_tokens together."""
+    start, used = len(turns), 0
+    while start > 0:
+        used += count_tokens(turns[start - 1])
+        if used > max_tokens:
+            break
+        start -= 1
+    return turns[start:]
+
+
+def conversation_context(history, memory) -> str:
+    """
+    Earlier conversation for the next prompt: the rolling summary of older
+    turns followed by the most recent turns verbatim, within
+    memory.summary_tokens + memory.recent_tokens. history holds the turns
+    before the current question; memory is the dataset session's
+    {"summary", "folded"} dict kept up to date by fold_async(). Older turns
+    the summary does not cover yet (a fold still running, or one that
+    failed) are included verbatim, as many of the latest as fit in
+    memory.summary_tokens.
+    """
+    settings = get_llm_config()["memory"]
+    turns = chat_turns(history)
+    if not turns:
+        return ""
+    start = _recent_start(turns, settings)
+    recent = turns[start:]
+    folded = min((memory or {}).get("folded", 0), start)
+    unfolded = _latest_within(turns[folded:start], settings["summary_tokens"])
+    parts = []
+    if memory and memory.get("summary"):
+        parts.append("Summary of the earlier conversation:\n" + memory["summary"])
+    if unfolded:
+        parts.append("Earlier turns:\n" + "\n\n".join(unfolded))
+    if recent:
+        parts.append("Most recent turns:\n" + "\n\n".join(recent))
+    return "\n\n".join(parts)
+
+
+def fold_async(history, memory, model_source="groq"):
+    """
+    Fold turns that no longer fit the verbatim window into memory["summary"],
+    on a background thread at background priority. Only the turns added
+    since the last fold are sent, together with the current summary. A failed
+    fold is retried memory.fold_retries times; after that the next call
+    tries again.
+    """
+    settings = get_llm_config()["memory"]
+    turns = chat_turns(history)
+    start = _recent_start(turns, settings)
+    folded = memory.get("folded", 0)
+    if start <= folded:
+        return
+    with _folding_lock:
+        if id(memory) in _folding:
+            return
+        _folding.add(id(memory))
+    ctx = contextvars.copy_context()
+    threading.Thread(target=ctx.run, args=(_fold, memory, turns[folded:start], start, model_source, settings),
+                     name="chat-memory", daemon=True).start()
+
+
+def _fold(memory, new_turns, upto, model_source, settings):
+    try:
+        for attempt in range(settings["fold_retries"] + 1):
+            try:
+                _fold_once(memory, new_turns, upto, model_source, settings)
+                return
+            except LLMCancelledError:
+                return
+            except Exception as e:
+                logger.warning(f"[Memory] Could not fold chat turns into the summary "
+                               f"(attempt {attempt + 1}): {e}")
+                if attempt < settings["fold_retries"]:
+                    time.sleep(2 ** attempt)
+    finally:
+        with _folding_lock:
+            _folding.discard(id(memory))
+
+
+def _fold_once(memory, new_turns, upto, model_source, settings):
+    prompt = f"""Update the running summary of a conversation between a user and a data analyst about one dataset.
+Keep facts, numbers, filters and column names the user may refer back to; drop pleasantries.
+Answer with the updated summary only, in at most {settings["summary_tokens"]} tokens.
+
+Current summary:
+{memory.get("summary") or "(none)"}
+
+New turns:
+{chr(10).join(new_turns)}
+"""
+    with llm_priority("background"):
+        summary = get_llm(model_source, task="memory", call_site="chat.memory")(prompt)
+    memory["summary"] = truncate_to_tokens(summary.strip(), settings["summary_tokens"])
+    memory["folded"] = upto
@@ -0,0 +1,46 @@
+# utils/dataset_fingerprint.py
+import hashlib
+import threading
+import weakref
+
+import pandas as pd
+
+_lock = threading.Lock()
+_memo = {}
+
+
+def _compute(df: pd.DataFrame) -> str:
+    digest = hashlib.sha256()
+    digest.update(repr(df.shape).encode())
+    digest.update("|".join(map(str, df.columns)).encode("utf-8", errors="ignore"))
+    digest.update("|".join(map(str, df.dtypes)).encode())
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=False)
+        digest.update(row_hashes.values.tobytes())
+    except Exception:
+        # Unhashable cells (lists, dicts) - fall back to the CSV text of the frame.
+        digest.update(df.to_csv(index=False).encode("utf-8", errors="ignore"))
+    return digest.hexdigest()[:16]
+
+
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Content hash identifying a dataset version. Memoized per DataFrame object,
+    so repeated lookups during a rerun cost a dict access instead of a full hash.
+    """
+    key = id(df)
+    with _lock:
+        cached = _memo.get(key)
+        if cached is not None and cached[0]() is df:
+            return cached[1]
+
+    fingerprint = _compute(df)
+
+    try:
+        ref = weakref.ref(df, lambda _, key=key: _memo.pop(key, None))
+    except TypeError:
+        return fingerprint
+
+    with _lock:
+        _memo[key] = (ref, fingerprint)
+    return fingerprint
@@ -0,0 +1,238 @@
+# utils/expression_executor.py
+import ast
+import multiprocessing
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils.dataset_fingerprint import dataset_fingerprint
+from utils.llm_config import get_llm_config
+from utils.llm_context import check_cancelled
+from utils.logger import logger
+
+try:
+    import resource
+except ImportError:  # Windows: only the wall-clock timeout applies
+    resource = None
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.Name, ast.Load, ast.Attribute, ast.Call, ast.keyword, ast.Subscript,
+    ast.Slice, ast.Constant, ast.List, ast.Tuple, ast.Dict, ast.Compare, ast.BoolOp, ast.BinOp,
+    ast.UnaryOp, ast.And, ast.Or, ast.Not, ast.Invert, ast.USub, ast.UAdd, ast.Add, ast.Sub,
+    ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.BitAnd, ast.BitOr, ast.Eq, ast.NotEq,
+    ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+)
+
+_NAMES = {"df", "pd"}
+
+# Read-only DataFrame/Series/GroupBy API an answer may need. Anything that
+# evaluates strings (query, eval), writes files (to_*) or reaches into
+# internals (dunder attributes) is deliberately absent.
+_METHODS = {
+    "groupby", "agg", "aggregate", "sum", "mean", "median", "min", "max", "count", "nunique",
+    "std", "var", "size", "quantile", "prod", "cumsum", "pct_change", "diff", "rank",
+    "sort_values", "sort_index", "head", "tail", "nlargest", "nsmallest", "value_counts",
+    "describe", "corr", "cov", "reset_index", "set_index", "rename", "to_frame", "unique",
+    "isin", "between", "isna", "notna", "fillna", "dropna", "drop_duplicates", "round", "abs",
+    "idxmax", "idxmin", "pivot_table", "crosstab", "resample", "first", "last", "astype",
+    "loc", "iloc", "columns", "index", "shape", "dt", "str", "year", "month", "quarter",
+    "day", "dayofweek", "day_name", "month_name", "date", "contains", "startswith", "endswith",
+    "lower", "upper", "strip", "len", "to_datetime", "Grouper", "cut", "qcut", "T",
+}
+
+# Calls whose string arguments name functions that pandas looks up by name.
+_AGG_CALLS = {"agg", "aggregate", "pivot_table", "crosstab"}
+_AGG_FUNCS = {"sum", "mean", "median", "min", "max", "count", "nunique", "std", "var", "size",
+              "first", "last", "prod", "idxmax", "idxmin"}
+
+_SQL_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def normalize_expression(kind, code) -> str:
+    """Canonical text of an expression, so formatting differences share a cache entry."""
+    if kind == "pandas":
+        try:
+            return ast.unparse(ast.parse(code.strip(), mode="eval"))
+        except SyntaxError as e:
+            raise ExpressionError(f"not a Python expression: {e}")
+    return " ".join(code.strip().rstrip(";").split())
+
+
+def check_pandas_expression(code, columns=()) -> ast.Expression:
+    """Parse code and reject anything outside the whitelist."""
+    try:
+        tree = ast.parse(code, mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"not a Python expression: {e}")
+    columns = set(map(str, columns))
+    # df.<column> is fine unless the name is also a DataFrame attribute, which wins.
+    column_attrs = {c for c in columns if c.isidentifier() and not hasattr(pd.DataFrame, c)}
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ExpressionError(f"{type(node).__name__} is not allowed")
+        if isinstance(node, ast.Name) and node.id not in _NAMES:
+            raise ExpressionError(f"unknown name '{node.id}' (use df)")
+        if isinstance(node, ast.Attribute):
+            if node.attr.startswith("_") or (node.attr not in _METHODS and node.attr not in column_attrs):
+                raise ExpressionError(f"attribute '{node.attr}' is not allowed")
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in _AGG_CALLS:
+            for arg in ast.walk(ast.Tuple(elts=node.args + [k.value for k in node.keywords])):
+                if isinstance(arg, ast.Constant) and isinstance(arg.value, str) \
+                        and arg.value not in _AGG_FUNCS and arg.value not in columns:
+                    raise ExpressionError(f"'{arg.value}' is not an allowed aggregation")
+    return tree
+
+
+def check_sql(code):
+    if not re.match(r"^\s*(select|with)\b", code, re.IGNORECASE):
+        raise ExpressionError("only SELECT statements are allowed")
+    if ";" in code.strip().rstrip(";"):
+        raise ExpressionError("only one statement is allowed")
+
+
+def _as_frame(value, max_rows):
+    if isinstance(value, pd.DataFrame):
+        frame = value if isinstance(value.index, pd.RangeIndex) else value.reset_index()
+    elif isinstance(value, pd.Series):
+        frame = value.rename(value.name or "value").reset_index()
+        if isinstance(value.index, pd.RangeIndex):
+            frame = frame.drop(columns="index")
+    elif pd.api.types.is_scalar(value):
+        frame = pd.DataFrame({"value": [value]})
+    else:
+        raise ExpressionError(f"expression returned a {type(value).__name__}, not a table or value")
+    frame.columns = [" ".join(map(str, c)).strip() if isinstance(c, tuple) else str(c) for c in frame.columns]
+    return frame.head(max_rows)
+
+
+def _limit_resources(limits):
+    if resource is None:
+        return
+    cpu = int(limits["cpu_s"])
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    try:
+        # The worker already maps the interpreter, pandas and the frame: allow that plus the budget.
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * resource.getpagesize()
+    except OSError:
+        current = 0
+    cap = current + int(limits["memory_mb"]) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (cap, cap))
+
+
+def _authorize_sql(action, table, *args):
+    # The in-memory database holds only df, so any other table read is a CTE
+    # of the statement itself (some SQLite versions report those by name);
+    # only the schema tables are off limits.
+    if action not in _SQL_ACTIONS or (action == sqlite3.SQLITE_READ and str(table).lower().startswith("sqlite_")):
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+def _evaluate(kind, code, df):
+    if kind == "pandas":
+        tree = check_pandas_expression(code, df.columns)
+        return eval(compile(tree, "<expression>", "eval"), {"__builtins__": {}}, {"df": df, "pd": pd})
+    conn = sqlite3.connect(":memory:")
+    try:
+        df.to_sql("df", conn, index=False)
+        conn.set_authorizer(_authorize_sql)
+        return pd.read_sql_query(code, conn)
+    finally:
+        conn.close()
+
+
+def _worker(pipe, kind, code, df, limits):
+    try:
+        _limit_resources(limits)
+        pipe.send(("ok", _as_frame(_evaluate(kind, code, df), limits["max_result_rows"])))
+    except MemoryError:
+        pipe.send(("error", "the expression ran out of memory"))
+    except BaseException as e:
+        pipe.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        pipe.close()
+
+
+class ExpressionExecutor:
+    """
+    Runs pandas expressions (over `df`) and SELECT statements (over table
+    `df`) proposed by the LLM against the session dataset.
+
+    Expressions are checked against an AST whitelist (SQL against an sqlite
+    authorizer that only allows reads) and evaluated in a separate worker
+    process with CPU-time and memory limits and a wall-clock timeout, so a
+    runaway expression costs a killed process, not the app. The dataset is
+    sent to the worker over a pipe. Results are cached
+    by (dataset fingerprint, normalized expression).
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        methods = multiprocessing.get_all_start_methods()
+        # Not fork: the Streamlit server is multi-threaded, and a forked child
+        # can deadlock on a lock another thread held at fork time.
+        self._context = multiprocessing.get_context(
+            config["start_method"] if config["start_method"] in methods else "spawn"
+        )
+        if self._context.get_start_method() == "forkserver":
+            # Workers fork from a server that has already imported pandas.
+            self._context.set_forkserver_preload(["utils.expression_executor"])
+
+    def run(self, df, code, kind="pandas") -> pd.DataFrame:
+        if kind not in ("pandas", "sql"):
+            raise ExpressionError(f"unsupported expression kind: {kind}")
+        if kind == "pandas":
+            check_pandas_expression(code, df.columns)
+        else:
+            check_sql(code)
+        key = (dataset_fingerprint(df), kind, normalize_expression(kind, code))
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key].copy()
+
+        result = self._execute(df, kind, key[2])
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.config["cache_size"]:
+                self._results.popitem(last=False)
+        return result.copy()
+
+    def _execute(self, df, kind, code):
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_worker, args=(sender, kind, code, df, self.config), daemon=True)
+        process.start()
+        sender.close()
+        waited = 0.0
+        try:
+            while not receiver.poll(0.25):
+                waited += 0.25
+                check_cancelled()
+                if waited >= self.config["timeout_s"]:
+                    raise ExpressionError(f"expression took longer than {self.config['timeout_s']}s")
+            try:
+                status, payload = receiver.recv()
+            except EOFError:
+                raise ExpressionError("expression exceeded its CPU or memory limit")
+        finally:
+            receiver.close()
+            if process.is_alive():
+                process.kill()
+            process.join(1)
+        if status != "ok":
+            logger.info(f"[Executor] {kind} expression failed: {payload}")
+            raise ExpressionError(payload)
+        return payload
+
+
+expression_executor = ExpressionExecutor(get_llm_config()["executor"])
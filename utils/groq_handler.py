@@ -1,29 +1,103 @@
 # # utils/groq_handler.py
 
-import os
-from groq import Groq
-from langchain_community.llms import Ollama
+import time
+from utils.groq_keys import groq_keys, rate_limit_retry_after
+from utils.ollama_backend import ollama_backend
+from utils.single_flight import llm_flight, make_key
+from utils.llm_context import get_llm_user
+from utils.quota import quota_manager
+from utils.token_counter import count_tokens
+from utils.usage_tracker import record_llm_call
 
-def call_ollama_model(prompt):
-    llm = Ollama(model="llama3")
-    return llm.invoke(prompt)
+GROQ_MODEL = "llama-3.1-8b-instant"
+OLLAMA_MODEL = "llama3"
 
-def call_groq_model(system_prompt, user_prompt):
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+def _invoke_ollama(prompt, model, json_mode=False, timeout=None):
+    # Clients are built once with the tuned options and keep the model loaded.
+    llm = ollama_backend.client(model, json_mode, timeout)
+    start = time.perf_counter()
+    result = llm.generate([prompt])
+    generation = result.generations[0][0]
+    info = generation.generation_info or {}
+    ollama_backend.note_generation(model, info, time.perf_counter() - start)
+    # Ollama reports its own token counts; estimate when they are missing.
+    usage = (
+        info.get("prompt_eval_count") or count_tokens(prompt),
+        info.get("eval_count") or count_tokens(generation.text),
+    )
+    return generation.text, usage
 
+def call_ollama_model(prompt, model=OLLAMA_MODEL, json_mode=False, timeout=None):
+    # Identical prompts already in flight share one local generation.
+    key = make_key("ollama", model, json_mode, prompt)
+    start = time.perf_counter()
     try:
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",   
-            messages=[
-                {"role": "system", "content": system_prompt.strip()},
-                {"role": "user", "content": user_prompt.strip()}
-            ],
-            temperature=0.4,
-            max_tokens=1024
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        raise RuntimeError(f"Groq API error: {e}")
+        (text, usage), shared = llm_flight.execute(key, _invoke_ollama, prompt, model, json_mode, timeout)
+    except Exception:
+        record_llm_call("ollama", model, latency_s=time.perf_counter() - start, ok=False)
+        raise
+    record_llm_call(
+        "ollama", model,
+        tokens_input=0 if shared else usage[0],
+        tokens_output=0 if shared else usage[1],
+        latency_s=time.perf_counter() - start,
+        cache="coalesced" if shared else "miss",
+    )
+    return text
+
+def _invoke_groq(system_prompt, user_prompt, model, timeout, json_mode=False):
+    # JSON mode makes Groq return a syntactically valid JSON object.
+    extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+
+    # A rate-limited key is cooled and the request moves on to the next key.
+    tried = []
+    for _ in range(groq_keys.size()):
+        with groq_keys.acquire(exclude=tried, max_wait_s=timeout) as key:
+            tried.append(key)
+            try:
+                raw = key.client.with_options(timeout=timeout).chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system_prompt.strip()},
+                        {"role": "user", "content": user_prompt.strip()}
+                    ],
+                    temperature=0.4,
+                    max_tokens=1024,
+                    **extra
+                )
+                response = raw.parse()
+            except Exception as e:
+                retry_after = rate_limit_retry_after(e)
+                if retry_after is None:
+                    raise RuntimeError(f"Groq API error: {e}")
+                groq_keys.throttled(key, retry_after)
+                error = e
+                continue
+            usage = response.usage
+            groq_keys.record(key, usage.total_tokens, raw.headers)
+            return response.choices[0].message.content, (usage.prompt_tokens, usage.completion_tokens)
+    raise RuntimeError(f"Groq API error: {error}")
+
+def call_groq_model(system_prompt, user_prompt, model=GROQ_MODEL, timeout=60.0, json_mode=False):
+    # Identical prompts already in flight (double clicks, several users on the
+    # same dataset) wait for the first request instead of spending another RPM.
+    key = make_key("groq", model, json_mode, system_prompt.strip(), user_prompt.strip())
+    start = time.perf_counter()
+    try:
+        (text, usage), shared = llm_flight.execute(key, _invoke_groq, system_prompt, user_prompt, model, timeout, json_mode)
+    except Exception:
+        record_llm_call("groq", model, latency_s=time.perf_counter() - start, ok=False)
+        raise
+    record_llm_call(
+        "groq", model,
+        tokens_input=0 if shared else usage[0],
+        tokens_output=0 if shared else usage[1],
+        latency_s=time.perf_counter() - start,
+        cache="coalesced" if shared else "miss",
+    )
+    if not shared:
+        quota_manager.charge(get_llm_user(), usage[0] + usage[1])
+    return text
 
 # utils/openai_handler.py
 
@@ -0,0 +1,183 @@
+# utils/groq_keys.py
+import itertools
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from groq import Groq
+
+from utils.llm_config import get_llm_config
+from utils.llm_context import check_cancelled
+from utils.logger import logger
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_S = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value):
+    """Seconds in a Groq rate-limit reset header such as '2m59.56s', '7.66s' or '120ms'."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parts = _DURATION_RE.findall(str(value))
+    return sum(float(n) * _UNIT_S[unit] for n, unit in parts) if parts else None
+
+
+def _int_header(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class GroqKey:
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.name = f"...{api_key[-4:]}"
+        # No SDK retries: a 429 must reach the pool so the key cools down and
+        # the request moves to another key.
+        self.client = Groq(api_key=api_key, max_retries=0)
+        self.in_flight = 0
+        self.recent = deque()  # (timestamp, tokens) over the last minute
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.cooling_until = 0.0
+        self.throttles = 0
+
+    def window(self, now):
+        while self.recent and now - self.recent[0][0] > 60:
+            self.recent.popleft()
+        return len(self.recent), sum(tokens for _, tokens in self.recent)
+
+
+class GroqKeyPool:
+    """
+    Spreads Groq calls over every configured API key (GROQ_API_KEYS, comma
+    separated, plus GROQ_API_KEY). Keys are picked round-robin or least-loaded
+    (fewest calls in flight, then most rate-limit headroom left according to
+    Groq's x-ratelimit-* headers). A key that gets a 429 cools down until its
+    limit resets and is skipped in the meantime; while every key is cooling,
+    acquire() waits for the first one to recover.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._keys = None
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Read lazily: app.py loads .env after the handlers are imported.
+        if self._keys is None:
+            raw = os.getenv("GROQ_API_KEYS", "").split(",") + [os.getenv("GROQ_API_KEY", "")]
+            keys = list(dict.fromkeys(k.strip() for k in raw if k.strip()))
+            self._keys = [GroqKey(k) for k in keys]
+            self._cycle = itertools.cycle(range(len(self._keys))) if self._keys else None
+            logger.info(f"[Groq] Using a pool of {len(self._keys)} API key(s)")
+        return self._keys
+
+    def size(self) -> int:
+        return len(self._load()) or 1
+
+    def _candidates(self, exclude):
+        return [k for k in self._keys if k not in exclude] or list(self._keys)
+
+    def _pick(self, exclude):
+        """The key to use now, or None while every candidate is cooling down."""
+        now = time.time()
+        ready = [k for k in self._candidates(exclude) if k.cooling_until <= now]
+        if not ready:
+            return None
+        if self.config["key_strategy"] == "round_robin":
+            for _ in range(len(self._keys)):
+                key = self._keys[next(self._cycle)]
+                if key in ready:
+                    return key
+
+        def load(key):
+            requests, tokens = key.window(now)
+            headroom = key.remaining_tokens if key.remaining_tokens is not None else float("inf")
+            return key.in_flight, -headroom, tokens, requests
+
+        return min(ready, key=load)
+
+    @contextmanager
+    def acquire(self, exclude=(), max_wait_s=None):
+        # Wait at most max_wait_s (capped by key_max_wait_s) for a key to
+        # recover; fail at once if none will in time.
+        limit = self.config["key_max_wait_s"]
+        give_up = time.monotonic() + (limit if max_wait_s is None else min(max_wait_s, limit))
+        while True:
+            with self._lock:
+                if not self._load():
+                    raise RuntimeError("Groq API error: no GROQ_API_KEY or GROQ_API_KEYS configured")
+                key = self._pick(exclude)
+                if key is not None:
+                    key.in_flight += 1
+                    break
+                wait = min(k.cooling_until for k in self._candidates(exclude)) - time.time()
+            if time.monotonic() + wait > give_up:
+                raise RuntimeError(f"Groq API error: every API key is rate limited for another {wait:.0f}s")
+            check_cancelled()
+            time.sleep(min(max(wait, 0.0), 0.25))
+        try:
+            yield key
+        finally:
+            with self._lock:
+                key.in_flight -= 1
+
+    def record(self, key, tokens, headers=None):
+        with self._lock:
+            key.recent.append((time.time(), tokens))
+            if headers is not None:
+                key.remaining_requests = _int_header(headers, "x-ratelimit-remaining-requests")
+                key.remaining_tokens = _int_header(headers, "x-ratelimit-remaining-tokens")
+                # Out of headroom: cool down until the limit resets rather than
+                # waiting for a 429.
+                if key.remaining_requests == 0 or key.remaining_tokens == 0:
+                    reset = parse_duration(headers.get("x-ratelimit-reset-requests" if key.remaining_requests == 0
+                                                       else "x-ratelimit-reset-tokens"))
+                    key.cooling_until = time.time() + (reset or self.config["key_cooldown_s"])
+
+    def throttled(self, key, retry_after=None):
+        with self._lock:
+            key.throttles += 1
+            key.cooling_until = time.time() + (retry_after or self.config["key_cooldown_s"])
+        logger.warning(f"[Groq] Key {key.name} rate limited, cooling for "
+                       f"{retry_after or self.config['key_cooldown_s']:.0f}s")
+
+    def snapshot(self) -> list:
+        with self._lock:
+            now = time.time()
+            rows = []
+            for key in self._keys or []:
+                requests, tokens = key.window(now)
+                rows.append({
+                    "key": key.name,
+                    "in_flight": key.in_flight,
+                    "requests_last_min": requests,
+                    "tokens_last_min": tokens,
+                    "remaining_requests": key.remaining_requests,
+                    "remaining_tokens": key.remaining_tokens,
+                    "cooling_s": round(max(0.0, key.cooling_until - now), 1),
+                    "throttles": key.throttles,
+                })
+            return rows
+
+
+def rate_limit_retry_after(error):
+    """Seconds to back off if error is a 429 from Groq, else None."""
+    response = getattr(error, "response", None)
+    if getattr(error, "status_code", None) != 429 and getattr(response, "status_code", None) != 429:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    return parse_duration(headers.get("retry-after")) or 0.0
+
+
+groq_keys = GroqKeyPool(get_llm_config()["groq"])
@@ -0,0 +1,253 @@
+# utils/insight_categories.py
+import contextvars
+import re
+import threading
+import time
+from itertools import combinations
+
+import pandas as pd
+
+from utils.cancellation import LLMCancelledError
+from utils.llm_config import get_llm_config
+from utils.llm_context import llm_priority
+from utils.logger import logger
+from utils.prompt_planner import fit_table, prompt_budget
+from utils.structured_output import CATEGORY_SCHEMA, complete_json
+
+_TIME_NAME_RE = re.compile(r"date|time|day|month|year|period|timestamp", re.IGNORECASE)
+_ID_NAME_RE = re.compile(r"(^|_|\b)(id|uuid|key|index)($|_|\b)", re.IGNORECASE)
+_MAX_PER_KIND = 3
+
+
+def column_profile(df) -> dict:
+    """
+    Columns grouped by role from dtypes, names and a small sample; cheap
+    enough to run on every first visit of a dataset.
+    """
+    profile = {"time": [], "numeric": [], "categorical": []}
+    sample = df.head(200)
+    for col in df.columns:
+        series = sample[col]
+        name = str(col)
+        if pd.api.types.is_datetime64_any_dtype(series):
+            profile["time"].append(name)
+        elif pd.api.types.is_bool_dtype(series):
+            profile["categorical"].append(name)
+        elif pd.api.types.is_numeric_dtype(series):
+            if _TIME_NAME_RE.search(name) and series.dropna().between(1900, 2100).all():
+                profile["time"].append(name)
+            elif not _ID_NAME_RE.search(name):
+                profile["numeric"].append(name)
+        elif _TIME_NAME_RE.search(name) and pd.to_datetime(series.dropna().head(20), errors="coerce").notna().all():
+            profile["time"].append(name)
+        elif 1 < series.nunique(dropna=True) <= max(20, len(series) // 10):
+            profile["categorical"].append(name)
+    return profile
+
+
+def _strongest_pairs(df, numeric, limit=4):
+    # A sample of rows and the first dozen numeric columns keep this in milliseconds.
+    numeric = numeric[:12]
+    if len(numeric) < 2:
+        return []
+    corr = df[numeric].head(2000).corr().abs().fillna(0).to_numpy()
+    pairs = sorted(combinations(range(len(numeric)), 2), key=lambda p: -corr[p[0], p[1]])
+    return [(numeric[a], numeric[b]) for a, b in pairs[:limit]]
+
+
+def local_insight_categories(df) -> list:
+    """
+    Insight categories built from the column profile alone (time columns ->
+    trends, numeric pairs -> correlations, categoricals -> segment
+    comparisons, ...), available instantly while the LLM's suggestions load.
+    """
+    profile = column_profile(df)
+    time, numeric, categorical = (profile[k][:_MAX_PER_KIND] for k in ("time", "numeric", "categorical"))
+    categories = []
+
+    if time and numeric:
+        t = time[0]
+        categories.append({"title": "Trend Analysis", "questions": [
+            *(f"How does {n} change over {t}?" for n in numeric),
+            f"Which period had the highest {numeric[0]}?",
+            f"Is there a seasonal pattern in {numeric[0]}?",
+        ]})
+    pairs = _strongest_pairs(df, profile["numeric"])
+    if pairs:
+        categories.append({"title": "Correlation Analysis", "questions": [
+            f"How are {a} and {b} related?" for a, b in pairs
+        ]})
+    if categorical and numeric:
+        c = categorical[0]
+        categories.append({"title": "Segment Comparison", "questions": [
+            *(f"Which {c} has the highest average {n}?" for n in numeric),
+            *(f"How does {numeric[0]} vary across {other}?" for other in categorical[1:]),
+        ]})
+    if numeric:
+        categories.append({"title": "Distribution & Outliers", "questions": [
+            *(f"What is the distribution of {n}?" for n in numeric),
+            f"Are there outliers in {numeric[0]}?",
+        ]})
+    if categorical:
+        categories.append({"title": "Composition", "questions": [
+            f"What share of records falls into each {c}?" for c in categorical
+        ] + ([f"Which combinations of {categorical[0]} and {categorical[1]} are most common?"]
+             if len(categorical) > 1 else [])})
+    if df.isna().any().any():
+        categories.append({"title": "Data Quality", "questions": [
+            "Which columns have the most missing values?",
+            "Do missing values cluster in particular rows or segments?",
+        ]})
+    return categories or [{"title": "Overview", "questions": ["What are the key characteristics of this dataset?"]}]
+
+
+def local_comparison_categories(df1, df2) -> list:
+    """local_insight_categories() for a pair of datasets, over their shared columns."""
+    shared = [c for c in df1.columns if c in df2.columns]
+    profile = column_profile(df1[shared]) if shared else {"time": [], "numeric": [], "categorical": []}
+    time, numeric, categorical = (profile[k][:_MAX_PER_KIND] for k in ("time", "numeric", "categorical"))
+    categories = [{"title": "Size & Coverage", "questions": [
+        "How do the number of records and columns compare between Dataset 1 and Dataset 2?",
+        "Which columns appear in only one of the datasets?",
+    ]}]
+    if numeric:
+        categories.append({"title": "Metric Comparison", "questions": [
+            *(f"How does the average {n} compare between Dataset 1 and Dataset 2?" for n in numeric),
+            f"Which dataset has higher variability in {numeric[0]}?",
+        ]})
+    if time and numeric:
+        categories.append({"title": "Trend Comparison", "questions": [
+            f"How does the trend of {n} over {time[0]} differ between the datasets?" for n in numeric
+        ]})
+    if categorical:
+        categories.append({"title": "Segment Comparison", "questions": [
+            f"How does the mix of {c} differ between Dataset 1 and Dataset 2?" for c in categorical
+        ] + ([f"Which {categorical[0]} changed most in {numeric[0]} between the datasets?"] if numeric else [])})
+    return categories
+
+
+def llm_insight_categories(df, model_source="groq"):
+    preview = fit_table(df.head(100).to_csv(index=False), prompt_budget("categories"))
+    prompt = f"""
+    You are provided with a dataset preview and some representative sample rows.
+    {preview}
+
+    Please generate 5-6 analytical insight categories with 4-6 detailed questions each.
+    Return strictly in JSON format:
+    [
+        {{"title": "Category Name", "questions": ["Question 1", "Question 2", "Question 3"]}},
+        ...
+    ]
+    """
+    return complete_json(prompt, CATEGORY_SCHEMA, task="categories", model_source=model_source,
+                         call_site="insight_categories.single")
+
+
+def llm_comparison_categories(df1, df2, model_source="groq"):
+    # Half of the budget per dataset, so neither is cut off entirely.
+    half = prompt_budget("categories") // 2
+    preview = "\n".join([
+        fit_table(df1.head(100).assign(dataset="Dataset 1").to_csv(index=False), half),
+        fit_table(df2.head(100).assign(dataset="Dataset 2").to_csv(index=False), half).split("\n", 1)[-1],
+    ])
+    prompt = f"""
+    You are provided with the following combined dataset preview:
+    {preview}
+
+    The dataset contains records from two sources:
+    - Dataset 1
+    - Dataset 2
+
+    Please generate 5-6 analytical comparison insight categories.
+    For each category, provide 4-6 detailed comparison-based analytical questions that compare Dataset 1 and Dataset 2.
+
+    Example questions:
+    - How do the average values of column X compare between Dataset 1 and Dataset 2?
+    - Which dataset has higher variability in column Y?
+    - Is there a noticeable difference in trends for column Z across datasets?
+
+    IMPORTANT:
+    Return strictly in the following JSON format:
+    [
+        {{
+            "title": "Category Name",
+            "questions": ["Question 1", "Question 2", "Question 3"]
+        }},
+        ...
+    ]
+
+    Do not include any introduction, explanation, or extra text. Only return the JSON array.
+    """
+    return complete_json(prompt, CATEGORY_SCHEMA, task="categories", model_source=model_source,
+                         call_site="insight_categories.comparison")
+
+
+class _Refinement:
+    def __init__(self):
+        self.result = None
+        self.error = None
+        self.failed_at = None
+        self.thread = None
+
+
+class CategoryRefiner:
+    """
+    Fetches the LLM's insight categories in the background, at background
+    priority, while the page shows the local ones. refine() is called on every
+    rerun: it starts the job the first time and returns the categories once
+    they are in; ready() lets a poller rerun the page at that point. A job
+    cancelled because the session left the dataset is started again when the
+    user comes back, and a failed one after retry_after_s.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _evict_failed_locked(self):
+        now = time.monotonic()
+        for key in [k for k, j in self._jobs.items()
+                    if j.failed_at is not None and now - j.failed_at >= self.config["retry_after_s"]]:
+            del self._jobs[key]
+
+    def refine(self, key, generate, *args):
+        with self._lock:
+            self._evict_failed_locked()
+            job = self._jobs.get(key)
+            if job is not None:
+                if job.result is not None:
+                    del self._jobs[key]
+                    return job.result
+                return None
+            job = self._jobs[key] = _Refinement()
+        ctx = contextvars.copy_context()
+        job.thread = threading.Thread(target=ctx.run, args=(self._run, key, job, generate, args),
+                                      name="category-refine", daemon=True)
+        job.thread.start()
+        return None
+
+    def pending(self, key) -> bool:
+        with self._lock:
+            job = self._jobs.get(key)
+        return job is not None and job.error is None
+
+    def ready(self, key) -> bool:
+        with self._lock:
+            job = self._jobs.get(key)
+        return job is not None and job.result is not None
+
+    def _run(self, key, job, generate, args):
+        try:
+            with llm_priority("background"):
+                job.result = generate(*args)
+        except LLMCancelledError:
+            with self._lock:
+                self._jobs.pop(key, None)
+        except Exception as e:
+            logger.warning(f"[Categories] Keeping local categories for now, LLM refinement failed: {e}")
+            job.error = e
+            job.failed_at = time.monotonic()
+
+
+category_refiner = CategoryRefiner(get_llm_config()["category_refinement"])
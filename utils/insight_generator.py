@@ -1,22 +1,23 @@
 # utils/insight_generator.py
 import pandas as pd
-from utils.groq_handler import call_groq_model
+from utils.model_router import model_router
 
 from utils.logger import logger
 
 from utils.llm_selector import get_llm
-import re
-import json
+from utils.dataset_fingerprint import dataset_fingerprint
+from utils.semantic_cache import question_cache
+from utils.usage_tracker import record_llm_call
+from utils.prompt_planner import fit_table, prompt_budget
+from utils.structured_output import CATEGORY_SCHEMA, TITLED_LIST_SCHEMA, complete_json
 
 def generate_comparison_insight_suggestions(df1, df2, model_source="groq"):
     """
     Generate comparison insight suggestions between two datasets using the LLM.
     """
-    llm = get_llm(model_source)
-
     # Merge datasets with labels
     merged_df = df1.assign(dataset="Dataset 1").append(df2.assign(dataset="Dataset 2"), ignore_index=True)
-    preview = merged_df.head(10).to_csv(index=False)[:2048]
+    preview = fit_table(merged_df.head(10).to_csv(index=False), prompt_budget("categories"))
 
     prompt = f"""
     I have two datasets merged with a 'dataset' column identifying each. Here's a sample:
@@ -42,35 +43,37 @@ def generate_comparison_insight_suggestions(df1, df2, model_source="groq"):
     """
 
     try:
-        response = llm(prompt)
-
-        if hasattr(response, "content"):
-            response = response.content
-
-        json_string = re.search(r"\[.*\]", response, re.DOTALL).group(0)
-        categories = json.loads(json_string)
-        return categories
+        return complete_json(prompt, CATEGORY_SCHEMA, task="categories", model_source=model_source,
+                             call_site="comparison_suggestions")
 
     except Exception as e:
         raise RuntimeError(f"Failed to generate comparison insight suggestions: {str(e)}")
 
 
 def generate_insights(df: pd.DataFrame, insight_type: str, model_source: str = "groq") -> str:
-    preview = df.head(100).to_csv(index=False)
+    fingerprint = dataset_fingerprint(df)
+    cached = question_cache.get(fingerprint, "insight_type", insight_type)
+    if cached is not None:
+        record_llm_call("cache", "semantic", cache="hit", feature="insights")
+        return cached
+
+    preview = fit_table(df.head(100).to_csv(index=False), prompt_budget("insight"))
 
     prompt = f"""
 You are a senior data analyst. The user has selected this insight type: '{insight_type}'.
 Based on the data preview below, provide a concise but deep insight (4-6 lines).
 
 Data Preview (first 100 rows):
-{preview[:1500]}
+{preview}
  Don't generate the code 
     Generate Data Visualization based on the users data if needed
 """
 
     try:
         if model_source == "groq":
-            return call_groq_model("Generate Insight", prompt)
+            result = model_router.complete(prompt, task="insight", system_prompt="Generate Insight", call_site="insights")
+            question_cache.put(fingerprint, "insight_type", insight_type, result)
+            return result
         
     except Exception as e:
         logger.error(f"Insight generation failed: {e}")
@@ -83,23 +86,22 @@ def generate_comparison_insights(df1: pd.DataFrame, df2: pd.DataFrame, model_sou
             df1.head(50).assign(dataset="Dataset 1"),
             df2.head(50).assign(dataset="Dataset 2")
         ])
+        preview = fit_table(merged_preview.to_csv(index=False), prompt_budget("categories"))
         prompt = f"""
 You are an expert data analyst.
 Suggest 3-5 high-value comparison insights between Dataset 1 and Dataset 2 from this preview.
 Return them in JSON list of dicts with 'title' and 'description'.
 
 Data Preview:
-{merged_preview.to_csv(index=False)[:3000]}
+{preview}
  Don't generate the code 
     Generate Data Visualization based on the users data if needed
 """
 
         if model_source == "groq":
-            response = call_groq_model("Suggest Comparison Insights", prompt)
-        
-
-        import json
-        return json.loads(response)
+            return complete_json(prompt, TITLED_LIST_SCHEMA, task="categories", model_source=model_source,
+                                 system_prompt="Suggest Comparison Insights", call_site="comparison_insights")
+        return []
     except Exception as e:
         logger.warning(f"Comparison insight generation failed: {e}")
         return []
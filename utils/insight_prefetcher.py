@@ -0,0 +1,168 @@
+# utils/insight_prefetcher.py
+import contextvars
+import threading
+from functools import lru_cache
+
+from utils.cancellation import LLMCancelledError
+from utils.dataset_fingerprint import dataset_fingerprint
+from utils.insight_suggester import generate_insights, insight_is_cached
+from utils.llm_config import get_llm_config
+from utils.llm_context import get_cancel_token, llm_call_site, llm_priority, set_cancel_token
+from utils.logger import logger
+from utils.semantic_cache import cosine, embed
+
+
+@lru_cache(maxsize=4096)
+def _question_vector(question):
+    # The suggested questions stay the same across reruns; embed each once.
+    return embed(question)
+
+
+def rank_questions(categories, open_index=None, clicked=()):
+    """
+    Questions ordered by how likely the user is to click them next: questions
+    in the open category first, then those most similar to questions already
+    clicked, then top-to-bottom as they are shown.
+    """
+    clicked_vectors = [_question_vector(q) for q in clicked]
+    scored = []
+    for cat_idx, category in enumerate(categories):
+        for q_idx, question in enumerate(category.get("questions", [])):
+            if question in clicked:
+                continue
+            score = -(cat_idx * 0.1 + q_idx * 0.02)
+            if cat_idx == open_index:
+                score += 1.0
+            if clicked_vectors:
+                vector = _question_vector(question)
+                score += max(cosine(vector, c) for c in clicked_vectors)
+            scored.append((score, question))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [question for _, question in scored]
+
+
+class _Job:
+    def __init__(self, fingerprint, questions, token, planner):
+        self.fingerprint = fingerprint
+        self.planner = planner
+        self.questions = questions
+        self.token = token
+        self.stopped = threading.Event()
+        self.done = 0
+        self.thread = None
+
+    @property
+    def active(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def should_stop(self) -> bool:
+        return self.stopped.is_set() or (self.token is not None and self.token.cancelled)
+
+
+class _JobToken:
+    """
+    The cancellation token a job's LLM calls see. It follows job.token, which
+    start() replaces on every rerun, so a dataset switch also cancels a call
+    that is already in flight.
+    """
+
+    deprioritized = True
+
+    def __init__(self, job):
+        self._job = job
+
+    @property
+    def cancelled(self) -> bool:
+        return self._job.should_stop()
+
+    @property
+    def reason(self):
+        token = self._job.token
+        return (token.reason if token is not None else None) or "prefetch stopped"
+
+    def check(self):
+        if self.cancelled:
+            raise LLMCancelledError(self.reason)
+
+
+class InsightPrefetcher:
+    """
+    Answers suggested insight questions ahead of the click, one session at a
+    time and at background priority, so interactive calls always go first.
+    Answers land in the per-dataset question cache that generate_insights()
+    reads, so a click on a prefetched question returns at once; a click on a
+    question still in flight joins that request instead of sending another.
+
+    A job stops when the user switches dataset or logs out (the run's
+    cancellation token) or when a newer job replaces it.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, session_id, df, questions, model_source="groq", planner=None):
+        fingerprint = dataset_fingerprint(df)
+        questions = list(questions)[: self.config["max_questions"]]
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is not None and job.active and (job.fingerprint, job.planner) == (fingerprint, planner):
+                # Same dataset: keep going, but follow the latest ordering and
+                # the latest run's token, which is the one a dataset switch cancels.
+                job.questions = questions
+                job.token = get_cancel_token()
+                return job
+            if job is not None:
+                job.stopped.set()
+            job = self._jobs[session_id] = _Job(fingerprint, questions, get_cancel_token(), planner)
+
+        ctx = contextvars.copy_context()
+        job.thread = threading.Thread(
+            target=ctx.run, args=(self._run, job, df, model_source),
+            name="insight-prefetch", daemon=True,
+        )
+        job.thread.start()
+        return job
+
+    def stop(self, session_id):
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+        if job is not None:
+            job.stopped.set()
+
+    def _run(self, job, df, model_source):
+        attempted = set()
+        set_cancel_token(_JobToken(job))
+        with llm_priority("background"), llm_call_site("insights.prefetch"):
+            while not job.should_stop():
+                pending = [q for q in job.questions if q not in attempted]
+                if not pending:
+                    break
+                question = pending[0]
+                attempted.add(question)
+                if insight_is_cached(df, question, job.planner):
+                    job.done += 1
+                    continue
+                try:
+                    generate_insights(df, question, model_source, planner=job.planner)
+                    job.done += 1
+                except LLMCancelledError:
+                    break
+                except Exception as e:
+                    logger.warning(f"[Prefetch] Giving up after failure on '{question}': {e}")
+                    break
+        logger.debug(f"[Prefetch] Finished {job.done}/{len(job.questions)} for {job.fingerprint}")
+
+    def progress(self, session_id, df):
+        """(ready, total) for the session's current job on this dataset."""
+        with self._lock:
+            job = self._jobs.get(session_id)
+        if job is None or job.fingerprint != dataset_fingerprint(df):
+            return 0, 0
+        # Polled on every rerun, so it must not count as cache hits and misses.
+        ready = sum(1 for q in job.questions if insight_is_cached(df, q, job.planner))
+        return ready, len(job.questions)
+
+
+insight_prefetcher = InsightPrefetcher(get_llm_config()["prefetch"])
@@ -1,14 +1,18 @@
 # utils/insight_suggester.py
-import json
 from utils.llm_selector import get_llm
+from utils.logger import logger
+from utils.dataset_fingerprint import dataset_fingerprint
+from utils.semantic_cache import question_cache
+from utils.usage_tracker import record_llm_call
+from utils.prompt_planner import PromptPlanner, fit_table, prompt_budget, schema_text
+from utils.structured_output import CATEGORY_SCHEMA, INSIGHT_BATCH_SCHEMA, StructuredOutputError, complete_json
+from utils.query_planner import QuerySpecError, narrate, plan_query, planner_enabled, run_spec
 import streamlit as st
 def generate_insight_suggestions(preview_data, model_source="groq"):
     """
     Generate categorized insight suggestions using the selected LLM.
     Returns a list of categories, each with a list of questions.
     """
-    llm = get_llm(model_source)
-
     prompt = f"""
     I have the following dataset preview:
     {preview_data}
@@ -26,9 +30,8 @@ def generate_insight_suggestions(preview_data, model_source="groq"):
     """
 
     try:
-        response = llm(prompt)
-        suggestions = eval(response)  # If response is a pure Python JSON list
-        return suggestions
+        return complete_json(prompt, CATEGORY_SCHEMA, task="categories", model_source=model_source,
+                             call_site="insight_categories")
     except Exception as e:
         
         print(f"Insight suggestion failed: {e}")
@@ -60,10 +63,46 @@ def generate_insight_suggestions(preview_data, model_source="groq"):
             }
         ]
 
-def generate_insights(df, title, model_source="groq"):
-    llm = get_llm(model_source)
-    # preview = df.to_csv(index=False)[:10000]
-    dataset =df
+def _insight_namespace(planner):
+    return "insight.plan" if planner else "insight"
+
+
+def insight_is_cached(df, title, planner=None):
+    """Whether title is answered for this dataset version; leaves the cache stats alone."""
+    return question_cache.contains(dataset_fingerprint(df), _insight_namespace(planner_enabled(planner)), title)
+
+
+def _insight_with_plan(df, title, model_source):
+    spec = plan_query(title, df, model_source, call_site="insights.plan")
+    table = run_spec(spec, df)
+    narration = narrate(title, spec, table, "insight", model_source, call_site="insights", markdown=True)
+    return f"{narration}\n\n{table.to_markdown(index=False)}"
+
+
+def generate_insights(df, title, model_source="groq", planner=None):
+    planner = planner_enabled(planner)
+    namespace = _insight_namespace(planner)
+    fingerprint = dataset_fingerprint(df)
+    cached = question_cache.get(fingerprint, namespace, title)
+    if cached is not None:
+        record_llm_call("cache", "semantic", cache="hit", feature="insights")
+        return cached
+
+    if planner:
+        try:
+            result = _insight_with_plan(df, title, model_source)
+            question_cache.put(fingerprint, namespace, title, result)
+            return result
+        except (QuerySpecError, StructuredOutputError) as e:
+            logger.warning(f"[Insights] Planned insight failed, answering from the preview: {e}")
+
+    llm = get_llm(model_source, task="insight", call_site="insights")
+    prompt_plan = PromptPlanner(prompt_budget("insight"))
+    prompt_plan.add("title", title, required=True)
+    prompt_plan.add("schema", schema_text(df), priority=30, min_tokens=100, by_lines=True)
+    prompt_plan.add("sample", df.head(100).to_csv(index=False), priority=10, by_lines=True, keep_lines=1)
+    parts = prompt_plan.plan()
+    dataset = f"{parts['schema']}\n\n{parts['sample']}"
     prompt = f"""You are a data analyst. Based on the dataset and the selected insight title, generate an analytical insight.
 
 Title: {title}
@@ -78,13 +117,78 @@ Respond in markdown format with your full analysis.
     Generate Data Visualization based on the users data if needed 
 """
 
-    return llm(prompt)
+    result = llm(prompt)
+    question_cache.put(fingerprint, namespace, title, result)
+    return result
 
-def generate_comparison_analysis(df1, df2, title, model_source="groq"):
-    llm = get_llm(model_source)
+def generate_insights_batch(df, titles, model_source="groq", planner=None):
+    """
+    Answer several insight questions (typically one category) in a single
+    call that shares one copy of the dataset context. Returns
+    {title: answer} in the order given; answers already cached are reused,
+    and any question the batch answer leaves out is asked on its own.
+    In planner mode each question needs its own aggregation, so they are
+    answered one by one.
+    """
+    if planner_enabled(planner):
+        return {title: generate_insights(df, title, model_source, planner=True) for title in titles}
+
+    fingerprint = dataset_fingerprint(df)
+    answers = {}
+    pending = []
+    for title in titles:
+        cached = question_cache.get(fingerprint, "insight", title)
+        if cached is not None:
+            record_llm_call("cache", "semantic", cache="hit", feature="insights")
+            answers[title] = cached
+        elif title not in pending:
+            pending.append(title)
+
+    if len(pending) == 1:
+        answers[pending[0]] = generate_insights(df, pending[0], model_source)
+    elif pending:
+        numbered = "\n".join(f"{i}. {title}" for i, title in enumerate(pending, 1))
+        prompt_plan = PromptPlanner(prompt_budget("insight_batch"))
+        prompt_plan.add("titles", numbered, required=True)
+        prompt_plan.add("schema", schema_text(df), priority=30, min_tokens=100, by_lines=True)
+        prompt_plan.add("sample", df.head(100).to_csv(index=False), priority=10, by_lines=True, keep_lines=1)
+        parts = prompt_plan.plan()
+        dataset = f"{parts['schema']}\n\n{parts['sample']}"
+        prompt = f"""You are a data analyst. Based on the dataset, generate an analytical insight for each of the numbered insight titles below.
+
+Titles:
+{numbered}
 
-    sample1 = df1.to_csv(index=False)[:10000]
-    sample2 = df2.to_csv(index=False)[:10000]
+Based on the provided Dataset:
+{dataset}
+
+Give one answer per title, with "number" set to the title's number and "answer" holding your full analysis in markdown.
+
+-Do Not Create your own column names, use the ones provided in the CSV.
+ Don't generate the code 
+"""
+        try:
+            items = complete_json(prompt, INSIGHT_BATCH_SCHEMA, task="insight_batch", model_source=model_source,
+                                  call_site="insights.batch")
+        except Exception as e:
+            logger.warning(f"[Insights] Batch insight generation failed: {e}")
+            items = []
+        for item in items:
+            if 1 <= item["number"] <= len(pending):
+                title = pending[item["number"] - 1]
+                answers.setdefault(title, item["answer"])
+                question_cache.put(fingerprint, "insight", title, item["answer"])
+        for title in pending:
+            if title not in answers:
+                answers[title] = generate_insights(df, title, model_source)
+
+    return {title: answers[title] for title in titles}
+
+def generate_comparison_analysis(df1, df2, title, model_source="groq"):
+    # Split the budget evenly between the two datasets.
+    half = prompt_budget("categories") // 2
+    sample1 = fit_table(df1.head(200).to_csv(index=False), half)
+    sample2 = fit_table(df2.head(200).to_csv(index=False), half)
 
     prompt = f"""You are a data analyst. Given these two datasets, suggest 3 insightful comparisons a user may want to explore.
 
@@ -102,10 +206,6 @@ def generate_comparison_analysis(df1, df2, title, model_source="groq"):
                  Don't generate the code 
     Generate Data Visualization based on the users data if needed
             """
-    response = llm(prompt).strip()
-
-    try:
-        return json.loads(response)
-    except json.JSONDecodeError:
-        from utils.json_utils import extract_json_list
-        return extract_json_list(response)
+    schema = {"type": "array", "minItems": 1, "items": {"type": "object", "required": ["description"]}}
+    return complete_json(prompt, schema, task="categories", model_source=model_source,
+                         call_site="comparison_analysis")
@@ -1,21 +1,107 @@
+import ast
 import re
 import json
 
-def extract_json_list(text):
-    """
-    Tries to extract a JSON list from messy or partially valid LLM output.
-    """
+_FENCE_RE = re.compile(r"```(?:json|python)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([\]}])")
+_CLOSERS = {"[": "]", "{": "}"}
+
+
+def _loads_lenient(text):
+    """json.loads that also accepts trailing commas and Python-style literals."""
     try:
         return json.loads(text)
     except Exception:
         pass
+    cleaned = _TRAILING_COMMA_RE.sub(r"\1", text)
+    try:
+        return json.loads(cleaned)
+    except Exception:
+        pass
+    # Single quotes, True/False/None: parsed as literals only, never evaluated.
+    return ast.literal_eval(cleaned)
 
+
+def repair_json(text):
+    """
+    Parse the first JSON value in messy LLM output: code fences, prose around
+    the value, trailing commas, Python-style quoting and output truncated
+    mid-value (e.g. at max_tokens). A truncated value is cut back to its last
+    complete element and its open brackets are closed. Raises ValueError when
+    nothing usable is found.
+    """
+    text = str(text or "").strip()
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
     try:
-        match = re.search(r'\[.*\]', text, re.DOTALL)
-        if match:
-            json_str = match.group()
-            return json.loads(json_str)
+        return json.loads(text)
     except Exception:
         pass
 
-    raise ValueError(f"Failed to extract JSON list: {text}")
+    starts = [i for i in (text.find("["), text.find("{")) if i != -1]
+    if not starts:
+        raise ValueError(f"No JSON value in: {text[:200]}")
+    start = min(starts)
+
+    stack, quote, escaped = [], None, False
+    cut, cut_stack = None, None
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+            continue
+        if ch in "\"'":
+            quote = ch
+        elif ch in _CLOSERS:
+            stack.append(ch)
+            if len(stack) == 1:
+                # The outer value on its own, emptied, beats nothing; a nested
+                # one would leave an empty element behind instead.
+                cut, cut_stack = i + 1, list(stack)
+        elif ch in "]}":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return _loads_lenient(text[start:i + 1])
+            cut, cut_stack = i + 1, list(stack)
+        elif ch == ",":
+            # Everything before this comma is a run of complete elements.
+            cut, cut_stack = i, list(stack)
+
+    # Truncated. If it stopped right after a complete string or container, the
+    # open brackets just need closing; otherwise (mid-string, mid-number, after
+    # a key) cut back to the last point where every element was complete.
+    candidates = []
+    if quote is None and text[start:].rstrip()[-1:] in ("\"", "'", "]", "}"):
+        candidates.append(text[start:] + "".join(_CLOSERS[b] for b in reversed(stack)))
+    if cut is not None:
+        candidates.append(text[start:cut] + "".join(_CLOSERS[b] for b in reversed(cut_stack)))
+    for candidate in candidates:
+        try:
+            return _loads_lenient(candidate)
+        except Exception:
+            continue
+    raise ValueError(f"Could not repair JSON: {text[:200]}")
+
+
+def extract_json_list(text):
+    """
+    Tries to extract a JSON list from messy or partially valid LLM output.
+    """
+    try:
+        value = repair_json(text)
+    except ValueError:
+        raise ValueError(f"Failed to extract JSON list: {text}")
+    if isinstance(value, dict):
+        # JSON mode wraps lists in an object, e.g. {"result": [...]}.
+        value = next((v for v in value.values() if isinstance(v, list)), value)
+    if not isinstance(value, list):
+        raise ValueError(f"Failed to extract JSON list: {text}")
+    return value
@@ -0,0 +1,235 @@
+# utils/llm_config.py
+import copy
+import json
+import os
+
+from utils.logger import logger
+
+LLM_CONFIG_PATH = os.getenv("LLM_CONFIG_PATH", "llm_config.json")
+
+DEFAULT_LLM_CONFIG = {
+    "routing": {
+        # Named targets a task can be routed to.
+        "targets": {
+            "groq_small": {"backend": "groq", "model": "llama-3.1-8b-instant"},
+            "groq_large": {"backend": "groq", "model": "llama-3.3-70b-versatile"},
+            "ollama": {"backend": "ollama", "model": "llama3"},
+        },
+        # Task class -> target. Unknown tasks use "default".
+        "tasks": {
+            "column_selection": "groq_small",
+            "categories": "groq_small",
+            "chat": "groq_small",
+            "insight": "groq_small",
+            "insight_batch": "groq_small",
+            "query_plan": "groq_small",
+            "memory": "groq_small",
+            "narration": "groq_large",
+            "default": "groq_small",
+        },
+        # Where Groq traffic goes once it looks unhealthy.
+        "fallback": "ollama",
+        "fallback_thresholds": {
+            "p95_latency_s": 15.0,
+            "error_rate": 0.5,
+            "min_samples": 5,
+        },
+        "latency_window": 200,
+        "latency_max_age_s": 300,
+    },
+    "resilience": {
+        # Seconds a caller waits for an answer, per task class.
+        "deadline_s": {
+            "chat": 30,
+            "insight": 45,
+            "insight_batch": 90,
+            "query_plan": 20,
+            "column_selection": 20,
+            "categories": 30,
+            "narration": 90,
+            "default": 60,
+        },
+        # Duplicate a slow primary call to the fallback target after the
+        # primary's observed p95 (never earlier than hedge_min_s).
+        "hedging": True,
+        "hedge_min_s": 2.0,
+        "breaker": {
+            "failure_threshold": 5,
+            "reset_timeout_s": 30,
+        },
+    },
+    "prompts": {
+        # Input-token budget per task class; the prompt planner trims the
+        # lowest-value parts (samples first, then schema) to fit.
+        "budget_tokens": {
+            "chat": 1500,
+            "insight": 2000,
+            "insight_batch": 2000,
+            "query_plan": 1500,
+            "column_selection": 800,
+            "categories": 3000,
+            "narration": 3000,
+            "default": 2000,
+        },
+    },
+    "groq": {
+        # How calls are spread over the keys in GROQ_API_KEYS:
+        # "least_loaded" or "round_robin".
+        "key_strategy": "least_loaded",
+        # Cool-down for a rate-limited key when Groq sends no reset time.
+        "key_cooldown_s": 30,
+        # Longest a call waits for a key to recover when every key is cooling.
+        "key_max_wait_s": 20,
+    },
+    # Local Ollama backend, tuned for CPU-only hosts. None leaves an option at
+    # Ollama's default (num_thread defaults to the physical core count).
+    "ollama": {
+        "base_url": "http://localhost:11434",
+        # How long the model stays loaded after a request.
+        "keep_alive": "30m",
+        "num_ctx": 8192,
+        "num_thread": None,
+        "num_predict": 1024,
+        # Load the model when the app starts.
+        "warm_up": True,
+    },
+    "priority": {
+        # Calls in each class share that class's concurrency limit. Queued
+        # background calls wait while any interactive call is queued.
+        "classes": {
+            "interactive": {"max_concurrent": 6},
+            "background": {"max_concurrent": 2},
+        },
+        # Task class -> priority class; llm_priority() overrides per call.
+        "tasks": {
+            "narration": "background",
+            "default": "interactive",
+        },
+    },
+    "structured_output": {
+        # Request JSON mode from backends that support it (Groq, Ollama).
+        "json_mode": True,
+        # Follow-up calls that ask only for fields still missing after repair.
+        "max_reasks": 1,
+    },
+    # Per-user fair sharing of Groq throughput; admins can override per user.
+    "quotas": {
+        "daily_tokens": 200000,
+        "max_concurrent": 2,
+        # How long a call waits for one of the user's own calls to finish.
+        "queue_timeout_s": 60,
+        # Per-user slots background calls leave free for interactive ones.
+        "interactive_reserved": 1,
+    },
+    # Planner mode for chat and insights (see utils/query_planner.py): the LLM
+    # writes an aggregation that runs locally over the full dataset and only
+    # the result table is sent back for narration.
+    "planner": {
+        # Default for the per-user toggle in the Chat tab.
+        "enabled": False,
+        # Rows of the result table kept (and sent for narration).
+        "max_result_rows": 50,
+        # Follow-up calls that fix a spec naming unknown columns and the like.
+        "replans": 1,
+    },
+    # Sandbox for pandas/SQL expressions proposed in chat answers (see
+    # utils/expression_executor.py).
+    "executor": {
+        "enabled": True,
+        # Limits of the worker process that evaluates one expression.
+        "cpu_s": 5,
+        "memory_mb": 1024,
+        "timeout_s": 10,
+        "max_result_rows": 50,
+        # Results kept, keyed by dataset fingerprint and normalized expression.
+        "cache_size": 256,
+        # "forkserver" (or "spawn", the fallback where it is unavailable). Not
+        # "fork": forking the multi-threaded server can deadlock the worker.
+        "start_method": "forkserver",
+    },
+    # Per-dataset chat memory (see utils/conversation_memory.py): recent turns
+    # verbatim, older ones folded into a rolling summary.
+    "memory": {
+        "recent_turns": 6,
+        "recent_tokens": 600,
+        "summary_tokens": 250,
+        # Extra attempts for a failed fold, one, two, four... seconds apart.
+        "fold_retries": 2,
+    },
+    # Chat grounding: rows ranked by a BM25 index over text/categorical cells
+    # (see utils/row_index.py) lead the dataset sample instead of df.head().
+    "retrieval": {
+        "enabled": True,
+        "top_k": 30,
+    },
+    # LLM insight categories fetched in the background to replace the local
+    # ones (see utils/insight_categories.py).
+    "category_refinement": {
+        # A failed refinement is tried again on the first rerun after this.
+        "retry_after_s": 60,
+        # How often the page checks whether the refined categories are in.
+        "poll_s": 2,
+    },
+    # Answering suggested insight questions before they are clicked.
+    "prefetch": {
+        # Default for the per-user toggle in the Insights tab.
+        "enabled": False,
+        # Most likely questions answered per dataset.
+        "max_questions": 12,
+    },
+    # Offline "replay" model source (see utils/replay_backend.py). The mode and
+    # cassette path can also be set with LLM_REPLAY_MODE / LLM_REPLAY_PATH.
+    "replay": {
+        "mode": "replay",
+        "path": "logs/llm_replay.jsonl",
+        # Live model source used while recording.
+        "record_source": "groq",
+        # Sleep for the recorded latency when replaying.
+        "replay_latency": False,
+        # What a replay miss does: "synthesize" or "error".
+        "on_miss": "synthesize",
+        "synthesize": {
+            "seed": 0,
+            "sleep": True,
+            # Time to first token, then output_tokens at tokens_per_s.
+            "latency_s": {"dist": "lognormal", "median": 0.4, "sigma": 0.5},
+            "tokens_per_s": {"dist": "normal", "mean": 300, "stddev": 60, "min": 20},
+            "output_tokens": {"dist": "normal", "mean": 250, "stddev": 80, "min": 16},
+        },
+    },
+    # USD per million tokens, used for usage metering. Local models cost nothing.
+    "pricing": {
+        "llama-3.1-8b-instant": {"input": 0.05, "output": 0.08},
+        "llama-3.3-70b-versatile": {"input": 0.59, "output": 0.79},
+    },
+}
+
+
+def _merge(base, override):
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+_config = None
+
+
+def get_llm_config() -> dict:
+    """
+    LLM settings: built-in defaults overlaid with llm_config.json (or the file
+    named by LLM_CONFIG_PATH) when present. Loaded once per process.
+    """
+    global _config
+    if _config is None:
+        config = copy.deepcopy(DEFAULT_LLM_CONFIG)
+        if os.path.exists(LLM_CONFIG_PATH):
+            try:
+                with open(LLM_CONFIG_PATH, "r") as f:
+                    _merge(config, json.load(f))
+            except Exception as e:
+                logger.warning(f"Ignoring invalid LLM config {LLM_CONFIG_PATH}: {e}")
+        _config = config
+    return _config
@@ -0,0 +1,60 @@
+# utils/llm_context.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Who is calling and from where. Set by the UI layer and read by the LLM layer
+# for metering; worker threads inherit them via utils.llm_resilience.submit.
+_user = ContextVar("llm_user", default="anonymous")
+_call_site = ContextVar("llm_call_site", default=None)
+_priority = ContextVar("llm_priority", default=None)
+_cancel_token = ContextVar("llm_cancel_token", default=None)
+
+
+def set_llm_user(username):
+    _user.set(username or "anonymous")
+
+
+def get_llm_user() -> str:
+    return _user.get()
+
+
+def get_call_site():
+    return _call_site.get()
+
+
+@contextmanager
+def llm_call_site(name):
+    token = _call_site.set(name)
+    try:
+        yield
+    finally:
+        _call_site.reset(token)
+
+
+def get_priority():
+    return _priority.get()
+
+
+@contextmanager
+def llm_priority(name):
+    """Run the enclosed LLM calls in a priority class ("interactive" or "background")."""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def set_cancel_token(token):
+    """Bind LLM calls in this context to a utils.cancellation.CancellationToken."""
+    _cancel_token.set(token)
+
+
+def get_cancel_token():
+    return _cancel_token.get()
+
+
+def check_cancelled():
+    token = _cancel_token.get()
+    if token is not None:
+        token.check()
@@ -0,0 +1,101 @@
+# utils/llm_priority.py
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utils.cancellation import LLMCancelledError
+from utils.llm_config import get_llm_config
+from utils.llm_context import get_cancel_token, get_priority
+from utils.logger import logger
+
+INTERACTIVE, BACKGROUND = "interactive", "background"
+
+# Classes in preemption order: a queued call only starts once no call of an
+# earlier class is queued.
+_ORDER = (INTERACTIVE, BACKGROUND)
+
+
+def _quantile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class PriorityGate:
+    """
+    Admission control for LLM calls by priority class. Each class runs at most
+    its max_concurrent calls at once, so background work (report sections,
+    prefetching) can never take the capacity reserved for interactive calls,
+    and queued background calls yield to any queued interactive call.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._running = {name: 0 for name in _ORDER}
+        self._queued = {name: 0 for name in _ORDER}
+        self._waits = {name: deque(maxlen=200) for name in _ORDER}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def class_for(self, task) -> str:
+        token = get_cancel_token()
+        if token is not None and token.deprioritized:
+            # Work left behind by an earlier run of the session.
+            return BACKGROUND
+        name = get_priority()
+        if name is None:
+            tasks = self.config["tasks"]
+            name = tasks.get(task, tasks["default"])
+        return name if name in self._running else INTERACTIVE
+
+    def _can_start(self, name) -> bool:
+        limit = self.config["classes"][name]["max_concurrent"]
+        if self._running[name] >= limit:
+            return False
+        earlier = _ORDER[:_ORDER.index(name)]
+        return not any(self._queued[other] for other in earlier)
+
+    @contextmanager
+    def slot(self, task):
+        name = self.class_for(task)
+        token = get_cancel_token()
+        start = time.monotonic()
+        with self._lock:
+            self._queued[name] += 1
+            try:
+                while not self._can_start(name):
+                    if token is not None and token.cancelled:
+                        raise LLMCancelledError(token.reason or "rerun requested")
+                    self._changed.wait(0.25 if token is not None else None)
+            finally:
+                self._queued[name] -= 1
+                # A dequeued (or cancelled) interactive call may unblock background waiters.
+                self._changed.notify_all()
+            self._running[name] += 1
+        waited = time.monotonic() - start
+        self._waits[name].append(waited)
+        if waited > 1.0:
+            logger.debug(f"[Priority] {name} call waited {waited:.1f}s for a slot")
+        try:
+            yield name
+        finally:
+            with self._lock:
+                self._running[name] -= 1
+                self._changed.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "running": self._running[name],
+                    "queued": self._queued[name],
+                    "max_concurrent": self.config["classes"][name]["max_concurrent"],
+                    "p95_wait_s": _quantile(list(self._waits[name]), 0.95),
+                }
+                for name in _ORDER
+            }
+
+
+priority_gate = PriorityGate(get_llm_config()["priority"])
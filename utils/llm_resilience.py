@@ -0,0 +1,199 @@
+# utils/llm_resilience.py
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.cancellation import LLMCancelledError
+from utils.llm_context import get_cancel_token
+from utils.logger import logger
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# How often a waiting caller checks its cancellation token.
+CANCEL_POLL_S = 0.25
+
+# Worker threads that carry LLM calls so callers can stop waiting at a deadline.
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+
+
+class LLMTimeoutError(RuntimeError):
+    def __init__(self, message, targets=()):
+        super().__init__(message)
+        self.targets = list(targets)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker. After failure_threshold consecutive failures the
+    backend is skipped for reset_timeout_s; then a single probe call is let
+    through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout_s=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.last_error = None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.time() - self._opened_at >= self.reset_timeout_s:
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.last_error = str(error) if error else self.last_error
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"[Circuit] {self.name} opened after {self._failures} failure(s): {self.last_error}")
+                self._state = OPEN
+                self._opened_at = time.time()
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self._state == OPEN:
+                retry_in = max(0.0, self.reset_timeout_s - (time.time() - self._opened_at))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "retry_in_s": retry_in,
+                "last_error": self.last_error,
+            }
+
+
+class _Attempt:
+    """One in-flight try against a target. Abandoned once the caller stopped waiting for it."""
+
+    def __init__(self, target):
+        self.target = target
+        self.future = None
+        self.abandoned = False
+
+
+def submit(func, *args):
+    """Run func on the LLM worker pool, carrying the caller's context variables."""
+    ctx = contextvars.copy_context()
+    return _executor.submit(ctx.run, func, *args)
+
+
+def release_after(futures, release):
+    """Call release() once every future in futures is done: now, or from the last one to finish."""
+    pending = [f for f in futures if not f.done()]
+    if not pending:
+        release()
+        return
+    remaining = [len(pending)]
+    lock = threading.Lock()
+
+    def one_done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            release()
+
+    for future in pending:
+        future.add_done_callback(one_done)
+
+
+def hedged_call(attempt_fn, primary, secondary=None, hedge_after_s=None, deadline_s=60.0, inflight=None):
+    """
+    Call attempt_fn(primary, attempt) and wait at most deadline_s for an answer.
+    When a secondary target is given and the primary has not answered after
+    hedge_after_s, the same request is also sent to the secondary and the first
+    successful answer wins. A primary that fails outright fails over to the
+    secondary straight away. Returns (target, result). If the caller's
+    cancellation token fires while waiting, the attempts are abandoned and
+    LLMCancelledError is raised. An abandoned attempt keeps running until its
+    request returns; the futures of all attempts are appended to inflight so
+    the caller can hold its slots until then (see release_after()).
+    """
+    start = time.monotonic()
+    token = get_cancel_token()
+
+    def launch(target):
+        attempt = _Attempt(target)
+        attempt.future = submit(attempt_fn, target, attempt)
+        if inflight is not None:
+            inflight.append(attempt.future)
+        return attempt
+
+    attempts = [launch(primary)]
+    errors = []
+
+    def remaining():
+        return deadline_s - (time.monotonic() - start)
+
+    hedged = secondary is None
+    hedge_at = hedge_after_s if hedge_after_s is not None else float("inf")
+    while True:
+        pending = [a for a in attempts if not a.future.done()]
+        finished = [a for a in attempts if a.future.done() and a not in errors]
+        for attempt in finished:
+            exc = attempt.future.exception()
+            if exc is None:
+                for other in attempts:
+                    if other is not attempt:
+                        other.abandoned = True
+                return attempt.target, attempt.future.result()
+            errors.append(attempt)
+
+        if not hedged and (not pending or time.monotonic() - start >= hedge_at):
+            hedged = True
+            logger.info(f"[Hedge] {primary['backend']} slow or failed, also asking {secondary['backend']}")
+            attempts.append(launch(secondary))
+            continue
+
+        pending = [a for a in attempts if not a.future.done()]
+        if not pending:
+            raise errors[-1].future.exception()
+        if token is not None and token.cancelled:
+            for attempt in pending:
+                attempt.abandoned = True
+            raise LLMCancelledError(token.reason or "rerun requested")
+        if remaining() <= 0:
+            for attempt in pending:
+                attempt.abandoned = True
+            raise LLMTimeoutError(
+                f"LLM call exceeded its {deadline_s:.0f}s deadline",
+                targets=[a.target for a in pending],
+            )
+
+        timeout = remaining()
+        if not hedged:
+            timeout = min(timeout, max(0.0, hedge_at - (time.monotonic() - start)))
+        if token is not None:
+            timeout = min(timeout, CANCEL_POLL_S)
+        wait([a.future for a in pending], timeout=timeout, return_when=FIRST_COMPLETED)
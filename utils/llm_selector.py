@@ -1,14 +1,16 @@
-from utils.groq_handler import call_groq_model, call_ollama_model
+from utils.model_router import model_router
 
-def get_llm(model_source="groq"):
-    if model_source == "groq":
-        def llm(prompt):
-            system_prompt = "You are a helpful data analyst. Provide clear and concise responses."
-            return call_groq_model(system_prompt, prompt)
-        return llm
-    elif model_source == "ollama":
-        def llm(prompt):
-            return call_ollama_model(prompt)
-        return llm
-    else:
-        raise ValueError(f"Unsupported model source: {model_source}")
\ No newline at end of file
+def get_llm(model_source="groq", task="default", call_site=None):
+    """
+    Return a prompt -> text callable. The router picks the concrete backend and
+    model for the task class (see utils/llm_config.py); model_source="ollama"
+    pins the call to the local backend and model_source="replay" to the offline
+    record/replay backend (see utils/replay_backend.py). call_site names the feature the calls
+    are metered under (defaults to the task class).
+    """
+    if model_source not in ("groq", "ollama", "replay"):
+        raise ValueError(f"Unsupported model source: {model_source}")
+
+    def llm(prompt):
+        return model_router.complete(prompt, task=task, model_source=model_source, call_site=call_site)
+    return llm
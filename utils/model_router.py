@@ -0,0 +1,236 @@
+# utils/model_router.py
+import os
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from utils.groq_handler import call_groq_model, call_ollama_model
+from utils.llm_config import get_llm_config
+from utils.llm_context import check_cancelled, get_call_site, get_llm_user, llm_call_site
+from utils.llm_priority import priority_gate
+from utils.llm_resilience import CircuitBreaker, CircuitOpenError, LLMTimeoutError, hedged_call, release_after
+from utils.logger import logger
+from utils.quota import quota_manager
+from utils.replay_backend import ReplayBackend
+from utils.token_counter import estimate_request_tokens
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful data analyst. Provide clear and concise responses."
+
+# LLM_MODEL_SOURCE=replay runs the whole app against the replay backend.
+MODEL_SOURCE_OVERRIDE = os.getenv("LLM_MODEL_SOURCE")
+
+
+def _quantile(sorted_values, q):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class BackendStats:
+    """
+    Sliding window of (timestamp, latency, ok) samples for one backend. Samples
+    older than max_age_s are ignored, so a backend that was routed around
+    becomes eligible again once its bad samples age out.
+    """
+
+    def __init__(self, window, max_age_s):
+        self._samples = deque(maxlen=window)
+        self._max_age_s = max_age_s
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._samples.append((time.time(), latency, ok))
+
+    def snapshot(self):
+        cutoff = time.time() - self._max_age_s
+        with self._lock:
+            samples = [(lat, ok) for ts, lat, ok in self._samples if ts >= cutoff]
+        latencies = sorted(lat for lat, ok in samples if ok)
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "p50": _quantile(latencies, 0.50),
+            "p95": _quantile(latencies, 0.95),
+            "error_rate": errors / len(samples) if samples else 0.0,
+        }
+
+
+class ModelRouter:
+    """
+    Picks a backend/model per task class from the routing config and diverts
+    Groq traffic to the fallback target while Groq's observed p95 latency or
+    error rate is over its threshold. Every call runs under a per-task deadline,
+    is hedged to the fallback target when the primary is slower than its p95,
+    and skips backends whose circuit breaker is open.
+    """
+
+    def __init__(self, config, resilience, replay=None):
+        self.config = config
+        self.resilience = resilience
+        self.replay = replay
+        self._stats = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def stats_for(self, backend) -> BackendStats:
+        with self._lock:
+            if backend not in self._stats:
+                self._stats[backend] = BackendStats(
+                    self.config.get("latency_window", 200),
+                    self.config.get("latency_max_age_s", 300),
+                )
+            return self._stats[backend]
+
+    def breaker_for(self, backend) -> CircuitBreaker:
+        with self._lock:
+            if backend not in self._breakers:
+                settings = self.resilience["breaker"]
+                self._breakers[backend] = CircuitBreaker(
+                    backend,
+                    failure_threshold=settings["failure_threshold"],
+                    reset_timeout_s=settings["reset_timeout_s"],
+                )
+            return self._breakers[backend]
+
+    def is_healthy(self, backend) -> bool:
+        limits = self.config["fallback_thresholds"]
+        snap = self.stats_for(backend).snapshot()
+        if snap["samples"] < limits["min_samples"]:
+            return True
+        if snap["error_rate"] >= limits["error_rate"]:
+            return False
+        return snap["p95"] is None or snap["p95"] <= limits["p95_latency_s"]
+
+    def target_for(self, task, model_source="groq") -> dict:
+        targets = self.config["targets"]
+        if model_source == "ollama":
+            return targets["ollama"]
+
+        tasks = self.config["tasks"]
+        target = targets[tasks.get(task, tasks["default"])]
+        if target["backend"] == "groq" and not self.is_healthy("groq"):
+            fallback = targets[self.config["fallback"]]
+            logger.warning(f"[Router] Groq unhealthy, routing '{task}' to {fallback['backend']}:{fallback['model']}")
+            return fallback
+        return target
+
+    def _deadline_for(self, task) -> float:
+        deadlines = self.resilience["deadline_s"]
+        return float(deadlines.get(task, deadlines["default"]))
+
+    def _hedge_after(self, backend, deadline):
+        if not self.resilience.get("hedging"):
+            return None
+        p95 = self.stats_for(backend).snapshot()["p95"]
+        if p95 is None:
+            return None
+        return min(max(p95, self.resilience["hedge_min_s"]), deadline)
+
+    def complete(self, prompt, task="default", model_source="groq", system_prompt=DEFAULT_SYSTEM_PROMPT, call_site=None,
+                 json_mode=False):
+        # json_mode asks backends that support it to return a JSON object.
+        # Metering attributes the call to the explicit call site, an enclosing
+        # llm_call_site() block, or finally the task class. Each call waits for
+        # a slot in its priority class (interactive or background), and only
+        # then for one of its user's concurrency slots, so a user's queued
+        # background work never holds the slots their interactive calls need;
+        # within the user's slots, interactive calls also go first.
+        # Work whose session moved on stops here, before it takes any slot.
+        # A request abandoned at its deadline or on cancellation keeps both
+        # slots until it actually returns, so the limits bound real traffic.
+        check_cancelled()
+        model_source = MODEL_SOURCE_OVERRIDE or model_source
+        with llm_call_site(call_site or get_call_site() or task):
+            with ExitStack() as stack:
+                priority = stack.enter_context(priority_gate.slot(task))
+                stack.enter_context(quota_manager.slot(get_llm_user(), priority))
+                slots = stack.pop_all()
+            inflight = []
+            try:
+                return self._complete(prompt, task, model_source, system_prompt, json_mode, inflight)
+            finally:
+                release_after(inflight, slots.close)
+
+    def _complete(self, prompt, task, model_source, system_prompt, json_mode=False, inflight=None):
+        if model_source == "replay":
+            return self.replay.complete(
+                system_prompt, prompt, task,
+                live=lambda: self._complete(prompt, task, self.replay.config["record_source"], system_prompt,
+                                            json_mode, inflight),
+            )
+
+        primary = self.target_for(task, model_source)
+        fallback = self.config["targets"][self.config["fallback"]]
+        secondary = fallback if fallback["backend"] != primary["backend"] else None
+        deadline = self._deadline_for(task)
+        estimated_tokens = estimate_request_tokens(system_prompt, prompt)
+        if primary["backend"] == "groq":
+            quota_manager.check(get_llm_user(), estimated_tokens)
+        logger.debug(f"[Router] {task} -> {primary['backend']}:{primary['model']}, "
+                     f"~{estimated_tokens} input tokens")
+
+        def attempt(target, handle):
+            backend = target["backend"]
+            breaker = self.breaker_for(backend)
+            if not breaker.allow():
+                raise CircuitOpenError(f"{backend} circuit is open")
+            start = time.perf_counter()
+            try:
+                if backend == "groq":
+                    result = call_groq_model(system_prompt, prompt, model=target["model"], timeout=deadline,
+                                             json_mode=json_mode)
+                else:
+                    result = call_ollama_model(f"{system_prompt.strip()}\n{prompt.strip()}", model=target["model"],
+                                               json_mode=json_mode, timeout=deadline)
+            except Exception as e:
+                self.stats_for(backend).record(time.perf_counter() - start, False)
+                if not handle.abandoned:
+                    breaker.record_failure(e)
+                raise
+            self.stats_for(backend).record(time.perf_counter() - start, True)
+            if not handle.abandoned:
+                breaker.record_success()
+            return result
+
+        try:
+            _, result = hedged_call(
+                attempt,
+                primary,
+                secondary=secondary,
+                hedge_after_s=self._hedge_after(primary["backend"], deadline) if secondary else None,
+                deadline_s=deadline,
+                inflight=inflight,
+            )
+        except LLMTimeoutError as e:
+            for target in e.targets:
+                self.breaker_for(target["backend"]).record_failure(e)
+            raise
+        return result
+
+    def reset_breakers(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        for breaker in breakers:
+            breaker.reset()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            backends = sorted(set(self._stats) | set(self._breakers))
+        return {
+            backend: {
+                **self.stats_for(backend).snapshot(),
+                "healthy": self.is_healthy(backend),
+                "circuit": self.breaker_for(backend).snapshot(),
+            }
+            for backend in backends
+        }
+
+
+model_router = ModelRouter(
+    get_llm_config()["routing"],
+    get_llm_config()["resilience"],
+    replay=ReplayBackend(get_llm_config()["replay"]),
+)
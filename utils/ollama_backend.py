@@ -0,0 +1,105 @@
+# utils/ollama_backend.py
+import math
+import os
+import threading
+import time
+
+from langchain_community.llms import Ollama
+
+from utils.llm_config import get_llm_config
+from utils.logger import logger
+
+# Ollama reports durations in nanoseconds.
+_NS = 1e9
+
+
+class OllamaBackend:
+    """
+    Long-lived Ollama clients built once per (model, json_mode, timeout) with
+    the tuned options from the "ollama" config section. keep_alive keeps the model
+    resident between calls; warm_up() loads it ahead of the first user request
+    so nobody pays the model load on a cold start.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.base_url = os.getenv("OLLAMA_BASE_URL", config["base_url"])
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._warming = set()
+        self.status = {}
+
+    def _options(self) -> dict:
+        keys = ("keep_alive", "num_ctx", "num_thread", "num_predict")
+        return {key: self.config[key] for key in keys if self.config.get(key) is not None}
+
+    def client(self, model, json_mode=False, timeout=None) -> Ollama:
+        # The HTTP timeout ends a request to a hung server, so a call the router
+        # has already abandoned still returns and frees its slots.
+        timeout = math.ceil(timeout) if timeout else None
+        key = (model, json_mode, timeout)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = Ollama(
+                    model=model,
+                    base_url=self.base_url,
+                    format="json" if json_mode else None,
+                    timeout=timeout,
+                    **self._options(),
+                )
+            return self._clients[key]
+
+    def note_generation(self, model, info, latency_s):
+        """Keep per-model latency and model-load figures for the admin panel."""
+        load_s = (info.get("load_duration") or 0) / _NS
+        with self._lock:
+            status = self.status.setdefault(model, {})
+            status["last_latency_s"] = round(latency_s, 2)
+            status["last_load_s"] = round(load_s, 2)
+            status["warm"] = True
+            if info.get("eval_count") and info.get("eval_duration"):
+                status["tokens_per_s"] = round(info["eval_count"] / (info["eval_duration"] / _NS), 1)
+        if load_s > 1.0:
+            logger.info(f"[Ollama] {model} was loaded on demand ({load_s:.1f}s)")
+
+    def warm_up(self, model=None, wait=False):
+        """Load the model into memory with a one-token request (in a background thread unless wait)."""
+        model = model or get_llm_config()["routing"]["targets"]["ollama"]["model"]
+        with self._lock:
+            # Once per process: Streamlit reruns the app script on every interaction.
+            if model in self._warming or model in self.status:
+                return
+            self._warming.add(model)
+
+        def run():
+            start = time.perf_counter()
+            try:
+                llm = Ollama(model=model, base_url=self.base_url, **{**self._options(), "num_predict": 1})
+                result = llm.generate(["ping"])
+                info = result.generations[0][0].generation_info or {}
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.status.setdefault(model, {}).update(
+                        warm=True, warm_up_s=round(elapsed, 2), last_load_s=round((info.get("load_duration") or 0) / _NS, 2),
+                        error=None,
+                    )
+                logger.info(f"[Ollama] Warmed up {model} in {elapsed:.1f}s")
+            except Exception as e:
+                with self._lock:
+                    self.status.setdefault(model, {}).update(warm=False, error=str(e))
+                logger.warning(f"[Ollama] Warm-up of {model} failed: {e}")
+            finally:
+                with self._lock:
+                    self._warming.discard(model)
+
+        if wait:
+            run()
+        else:
+            threading.Thread(target=run, name="ollama-warmup", daemon=True).start()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {model: dict(status) for model, status in self.status.items()}
+
+
+ollama_backend = OllamaBackend(get_llm_config()["ollama"])
@@ -0,0 +1,94 @@
+# utils/prompt_planner.py
+from utils.llm_config import get_llm_config
+from utils.prompt_templates import dataset_block
+from utils.token_counter import count_tokens, truncate_to_tokens
+
+
+class PromptPart:
+    def __init__(self, name, text, priority, min_tokens=0, by_lines=False, keep_lines=0):
+        self.name = name
+        self.text = str(text or "")
+        self.priority = priority
+        self.min_tokens = min_tokens
+        self.by_lines = by_lines
+        self.keep_lines = keep_lines
+        self.tokens = count_tokens(self.text)
+
+
+class PromptPlanner:
+    """
+    Fits named prompt parts into a token budget. Parts are trimmed lowest
+    priority first: each gives up tokens, down to its min_tokens, before a
+    higher priority part is touched. Parts added with required=True are never
+    trimmed.
+
+    Tabular parts (CSV previews, row dumps) are trimmed by whole lines from the
+    end, keeping the first keep_lines lines (e.g. the header).
+    """
+
+    REQUIRED = 10 ** 6
+
+    def __init__(self, budget_tokens):
+        self.budget_tokens = budget_tokens
+        self.parts = []
+
+    def add(self, name, text, priority=50, min_tokens=0, by_lines=False, keep_lines=0, required=False):
+        if required:
+            priority, min_tokens = self.REQUIRED, None
+        self.parts.append(PromptPart(name, text, priority, min_tokens, by_lines, keep_lines))
+        return self
+
+    @property
+    def predicted_tokens(self) -> int:
+        return sum(p.tokens for p in self.parts)
+
+    def _trim(self, part, target_tokens):
+        if target_tokens <= 0:
+            part.text, part.tokens = "", 0
+            return
+        if part.by_lines:
+            lines = part.text.splitlines()
+            lo, hi = part.keep_lines, len(lines)
+            # Binary search for the most lines that fit.
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if count_tokens("\n".join(lines[:mid])) <= target_tokens:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            part.text = "\n".join(lines[:lo])
+        else:
+            part.text = truncate_to_tokens(part.text, target_tokens)
+        part.tokens = count_tokens(part.text)
+
+    def plan(self) -> dict:
+        """Trim parts into the budget and return {name: text}."""
+        overflow = self.predicted_tokens - self.budget_tokens
+        for part in sorted(self.parts, key=lambda p: p.priority):
+            if overflow <= 0:
+                break
+            if part.min_tokens is None:
+                continue
+            spare = part.tokens - part.min_tokens
+            if spare <= 0:
+                continue
+            target = part.tokens - min(spare, overflow)
+            before = part.tokens
+            self._trim(part, target if target > 0 else 0)
+            overflow -= before - part.tokens
+        return {p.name: p.text for p in self.parts}
+
+
+def fit_table(text, budget_tokens) -> str:
+    """Trim a CSV/markdown table to budget_tokens by whole rows, keeping the header."""
+    return PromptPlanner(budget_tokens).add("table", text, by_lines=True, keep_lines=1).plan()["table"]
+
+
+def schema_text(df) -> str:
+    # Same block the report templates use, rendered once per dataset version.
+    return dataset_block(df, "column_types")
+
+
+def prompt_budget(task) -> int:
+    budgets = get_llm_config()["prompts"]["budget_tokens"]
+    return int(budgets.get(task, budgets["default"]))
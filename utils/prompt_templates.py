@@ -0,0 +1,181 @@
+# utils/prompt_templates.py
+import string
+import textwrap
+import threading
+from collections import OrderedDict
+
+from utils.dataset_fingerprint import dataset_fingerprint
+
+# Dataset context blocks: name -> builder(df). A template placeholder with one
+# of these names is filled from the dataset, rendered once per dataset version.
+_BLOCKS = {}
+
+TEMPLATES = {}
+
+
+def context_block(name):
+    def register(builder):
+        _BLOCKS[name] = builder
+        return builder
+    return register
+
+
+def _preview(df, rows, max_cols=None):
+    preview = df.head(rows)
+    if max_cols and df.shape[1] > max_cols:
+        preview = preview.iloc[:, :max_cols]
+    return preview
+
+
+@context_block("num_rows")
+def _num_rows(df):
+    return str(df.shape[0])
+
+
+@context_block("num_cols")
+def _num_cols(df):
+    return str(df.shape[1])
+
+
+@context_block("column_names")
+def _column_names(df):
+    return ", ".join(map(str, df.columns[:10])) + ("..." if len(df.columns) > 10 else "")
+
+
+@context_block("column_types")
+def _column_types(df):
+    return "\n".join(f"- {col}: {dtype}" for col, dtype in df.dtypes.astype(str).items())
+
+
+@context_block("preview_3")
+def _preview_3(df):
+    return _preview(df, 3).to_markdown(index=False)
+
+
+@context_block("preview_5x10")
+def _preview_5x10(df):
+    return _preview(df, 5, max_cols=10).to_markdown(index=False)
+
+
+@context_block("preview_10_text")
+def _preview_10_text(df):
+    return df.head(10).to_string()
+
+
+@context_block("numeric_summary")
+def _numeric_summary(df):
+    return df.describe().round(2).to_string()
+
+
+@context_block("full_summary")
+def _full_summary(df):
+    return df.describe(include="all").to_string()
+
+
+@context_block("categorical_summary")
+def _categorical_summary(df):
+    cat_cols = df.select_dtypes(include="object").columns[:3]
+    return df[cat_cols].describe().to_string() if len(cat_cols) > 0 else ""
+
+
+@context_block("category_values")
+def _category_values(df):
+    # Distinct values of low-cardinality text columns, so generated filters
+    # can use values that actually occur.
+    lines = []
+    for col in df.columns:
+        series = df[col]
+        if series.dtype.kind in "biufcmM":
+            continue
+        values = series.dropna().unique()
+        if 0 < len(values) <= 20:
+            lines.append(f"- {col}: " + ", ".join(map(str, values)))
+    return "\n".join(lines)
+
+
+class DatasetContext:
+    """
+    Context blocks of one dataset version, each rendered on first use. Only the
+    rendered text is kept; the frame is passed in, so no DataFrame is pinned.
+    """
+
+    def __init__(self):
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def block(self, name, df) -> str:
+        with self._lock:
+            if name in self._blocks:
+                return self._blocks[name]
+        text = _BLOCKS[name](df)
+        with self._lock:
+            return self._blocks.setdefault(name, text)
+
+
+class _ContextCache:
+    """LRU of DatasetContext objects keyed by dataset fingerprint."""
+
+    def __init__(self, max_datasets=16):
+        self.max_datasets = max_datasets
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, df) -> DatasetContext:
+        key = dataset_fingerprint(df)
+        with self._lock:
+            context = self._contexts.get(key)
+            if context is None:
+                context = self._contexts[key] = DatasetContext()
+                while len(self._contexts) > self.max_datasets:
+                    self._contexts.popitem(last=False)
+            self._contexts.move_to_end(key)
+            return context
+
+
+dataset_contexts = _ContextCache()
+
+
+class PromptTemplate:
+    """
+    A prompt template parsed once at import. Placeholders use str.format
+    syntax; names of dataset context blocks (column_types, preview_5x10,
+    numeric_summary, ...) are filled from the shared per-dataset cache, the
+    rest from the keyword arguments given to render().
+    """
+
+    def __init__(self, name, text, dedent=False):
+        self.name = name
+        self._segments = []
+        for literal, field, spec, conversion in string.Formatter().parse(textwrap.dedent(text) if dedent else text):
+            if literal:
+                self._segments.append((literal, None))
+            if field is not None:
+                if spec or conversion:
+                    raise ValueError(f"Template {name}: format specs are not supported ({field})")
+                self._segments.append((None, field))
+        self.fields = {field for _, field in self._segments if field}
+        self.blocks = self.fields & set(_BLOCKS)
+        TEMPLATES[name] = self
+
+    def render(self, df=None, **values) -> str:
+        context = dataset_contexts.get(df) if df is not None and self.blocks else None
+        parts = []
+        for literal, field in self._segments:
+            if field is None:
+                parts.append(literal)
+            elif field in values:
+                parts.append(str(values[field]))
+            elif context is not None and field in self.blocks:
+                parts.append(context.block(field, df))
+            else:
+                raise KeyError(f"Template {self.name} needs a value for '{field}'")
+        return "".join(parts)
+
+
+def render(name, df=None, **values) -> str:
+    return TEMPLATES[name].render(df, **values)
+
+
+def dataset_block(df, name) -> str:
+    """One cached dataset context block, for prompts assembled outside a template."""
+    return dataset_contexts.get(df).block(name, df)
@@ -0,0 +1,253 @@
+# utils/query_planner.py
+import json
+
+import pandas as pd
+
+from utils.llm_config import get_llm_config
+from utils.llm_selector import get_llm
+from utils.logger import logger
+from utils.prompt_planner import PromptPlanner, fit_table, prompt_budget, schema_text
+from utils.prompt_templates import dataset_block
+from utils.structured_output import QUERY_SPEC_SCHEMA, complete_json
+
+_NUMERIC_AGGS = {"sum", "mean", "median", "std"}
+_GRAINS = {"day": "D", "week": "W", "month": "M", "quarter": "Q", "year": "Y"}
+
+
+class QuerySpecError(ValueError):
+    pass
+
+
+def planner_enabled(planner=None) -> bool:
+    return get_llm_config()["planner"]["enabled"] if planner is None else bool(planner)
+
+
+def _split_key(key):
+    column, _, grain = key.partition(":")
+    return column, grain
+
+
+def _key_name(key):
+    column, grain = _split_key(key)
+    return f"{column} ({grain})" if grain else column
+
+
+def _metric_name(metric):
+    if metric.get("as"):
+        return metric["as"]
+    return "row_count" if metric["column"] == "*" else f"{metric['agg']}_{metric['column']}"
+
+
+def validate_spec(spec, df) -> dict:
+    """
+    Check a query spec against the frame and return it normalized (limit
+    capped, sort keys resolved). Raises QuerySpecError listing every problem.
+    """
+    columns = set(map(str, df.columns))
+    problems = []
+
+    for f in spec.get("filters", []):
+        if f["column"] not in columns:
+            problems.append(f"filter column '{f['column']}' does not exist")
+        elif f["op"] not in ("is null", "not null") and "value" not in f:
+            problems.append(f"filter on '{f['column']}' with '{f['op']}' needs a value")
+        elif f["op"] in ("in", "not in", "between") and not isinstance(f.get("value"), list):
+            problems.append(f"filter on '{f['column']}' with '{f['op']}' needs a list value")
+        elif f["op"] == "between" and len(f["value"]) != 2:
+            problems.append(f"filter on '{f['column']}' with 'between' needs [low, high]")
+
+    for key in spec.get("group_by", []):
+        column, grain = _split_key(key)
+        if column not in columns:
+            problems.append(f"group_by column '{column}' does not exist")
+        if grain and grain not in _GRAINS:
+            problems.append(f"group_by '{key}': time grain must be one of {sorted(_GRAINS)}")
+
+    for metric in spec["metrics"]:
+        column, agg = metric["column"], metric["agg"]
+        if column == "*":
+            if agg != "count":
+                problems.append(f"'*' can only be counted, not '{agg}'")
+        elif column not in columns:
+            problems.append(f"metric column '{column}' does not exist")
+        elif agg in _NUMERIC_AGGS and not pd.api.types.is_numeric_dtype(df[column]):
+            problems.append(f"'{agg}' needs a numeric column but '{column}' is {df[column].dtype}")
+
+    names = [_key_name(k) for k in spec.get("group_by", [])] + [_metric_name(m) for m in spec["metrics"]]
+    aliases = {name: name for name in names}
+    aliases.update({k: _key_name(k) for k in spec.get("group_by", [])})
+    sort = []
+    for s in spec.get("sort", []):
+        if s["by"] not in aliases:
+            problems.append(f"sort key '{s['by']}' is not a group_by column or metric ({', '.join(names)})")
+        else:
+            sort.append({"by": aliases[s["by"]], "descending": bool(s.get("descending", False))})
+
+    if problems:
+        raise QuerySpecError("; ".join(problems))
+    if not sort and any(_split_key(k)[1] for k in spec.get("group_by", [])):
+        # Periods read in time order unless asked otherwise.
+        sort = [{"by": _key_name(k), "descending": False} for k in spec["group_by"]]
+
+    max_rows = get_llm_config()["planner"]["max_result_rows"]
+    limit = spec.get("limit")
+    return {
+        "filters": spec.get("filters", []),
+        "group_by": spec.get("group_by", []),
+        "metrics": spec["metrics"],
+        "sort": sort,
+        "limit": max_rows if not limit or limit <= 0 else min(limit, max_rows),
+    }
+
+
+def _coerce(series, value):
+    if isinstance(value, list):
+        return [_coerce(series, v) for v in value]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.to_datetime(value)
+    if pd.api.types.is_numeric_dtype(series) and isinstance(value, str):
+        return pd.to_numeric(value)
+    return value
+
+
+def _condition(df, f):
+    series, op = df[f["column"]], f["op"]
+    if op == "is null":
+        return series.isna()
+    if op == "not null":
+        return series.notna()
+    if op == "contains":
+        return series.astype(str).str.contains(str(f["value"]), case=False, regex=False, na=False)
+    value = _coerce(series, f["value"])
+    if op == "in":
+        return series.isin(value)
+    if op == "not in":
+        return ~series.isin(value)
+    if op == "between":
+        return series.between(value[0], value[1])
+    return {
+        "==": series.__eq__, "!=": series.__ne__, ">": series.__gt__,
+        ">=": series.__ge__, "<": series.__lt__, "<=": series.__le__,
+    }[op](value)
+
+
+def _group_key(frame, key):
+    column, grain = _split_key(key)
+    series = frame[column]
+    if grain:
+        if not pd.api.types.is_datetime64_any_dtype(series):
+            series = pd.to_datetime(series, errors="coerce")
+        series = series.dt.to_period(_GRAINS[grain]).astype(str)
+    return series.rename(_key_name(key))
+
+
+def run_spec(spec, df) -> pd.DataFrame:
+    """Execute a validated spec over the whole frame with vectorized pandas ops."""
+    mask = pd.Series(True, index=df.index)
+    for f in spec["filters"]:
+        try:
+            mask &= _condition(df, f)
+        except (TypeError, ValueError) as e:
+            raise QuerySpecError(f"filter on '{f['column']}' failed: {e}")
+    frame = df[mask]
+
+    try:
+        result = _aggregate(spec, frame)
+    except (TypeError, ValueError, KeyError) as e:
+        raise QuerySpecError(f"aggregation failed: {e}")
+
+    if spec["sort"]:
+        result = result.sort_values([s["by"] for s in spec["sort"]],
+                                    ascending=[not s["descending"] for s in spec["sort"]])
+    return result.head(spec["limit"]).reset_index(drop=True)
+
+
+def _aggregate(spec, frame):
+    if spec["group_by"]:
+        grouped = frame.groupby([_group_key(frame, k) for k in spec["group_by"]], dropna=False, sort=False)
+        columns = {
+            _metric_name(m): grouped.size() if m["column"] == "*" else grouped[m["column"]].agg(m["agg"])
+            for m in spec["metrics"]
+        }
+        result = pd.DataFrame(columns).reset_index()
+    else:
+        result = pd.DataFrame([{
+            _metric_name(m): len(frame) if m["column"] == "*" else frame[m["column"]].agg(m["agg"])
+            for m in spec["metrics"]
+        }])
+    return result
+
+
+def plan_query(question, df, model_source="groq", call_site="planner"):
+    """Ask the LLM for an aggregation spec answering question; returns it validated."""
+    prompt_plan = PromptPlanner(prompt_budget("query_plan"))
+    prompt_plan.add("question", question, required=True)
+    prompt_plan.add("schema", schema_text(df), priority=30, min_tokens=100, by_lines=True)
+    prompt_plan.add("values", dataset_block(df, "category_values"), priority=10, by_lines=True)
+    parts = prompt_plan.plan()
+    prompt = f"""You are a data analyst. Do not answer the question directly. Instead, write the aggregation that computes the numbers needed to answer it over the full dataset.
+
+Question: {question}
+
+The dataset has {len(df)} rows and these columns:
+{parts["schema"]}
+
+Values of text columns:
+{parts["values"]}
+
+Fields:
+- filters: rows to keep, e.g. {{"column": "Region", "op": "==", "value": "West"}}
+- group_by: columns to group by; add ":day", ":week", ":month", ":quarter" or ":year" to a date column to group by period
+- metrics: e.g. {{"column": "Sales", "agg": "sum"}}; use {{"column": "*", "agg": "count"}} to count rows
+- sort: e.g. {{"by": "sum_Sales", "descending": true}}; sort keys are group_by columns or metric names ("<agg>_<column>", "row_count", or the metric's "as")
+- limit: maximum number of result rows
+
+Use only the column names listed above.
+"""
+    spec = complete_json(prompt, QUERY_SPEC_SCHEMA, task="query_plan", model_source=model_source,
+                         call_site=call_site)
+    for _ in range(get_llm_config()["planner"]["replans"]):
+        try:
+            return validate_spec(spec, df)
+        except QuerySpecError as e:
+            logger.info(f"[Planner] Re-planning invalid spec: {e}")
+            spec = complete_json(prompt + f"\nYour previous aggregation was invalid: {e}\nFix it.",
+                                 QUERY_SPEC_SCHEMA, task="query_plan", model_source=model_source,
+                                 call_site=f"{call_site}.replan")
+    return validate_spec(spec, df)
+
+
+def describe_spec(spec) -> str:
+    return json.dumps({k: v for k, v in spec.items() if v}, default=str)
+
+
+def narrate(question, spec, result, task, model_source="groq", call_site=None, markdown=False):
+    """Turn a computed result table into an answer to question."""
+    table = fit_table(result.to_csv(index=False), prompt_budget(task))
+    style = "Respond in markdown format." if markdown else "Answer in a few sentences of plain text."
+    prompt = f"""You are a data analyst. The table below was computed exactly over the full dataset to answer the question. Explain what it shows, quoting its numbers; do not invent numbers that are not in it.
+
+Question: {question}
+
+Computation: {describe_spec(spec)}
+
+Result ({len(result)} rows):
+{table}
+
+{style}
+"""
+    return get_llm(model_source, task=task, call_site=call_site)(prompt)
+
+
+def chart_for(spec, result):
+    """A chat chart ({type, data, x, y}) for one-key grouped results, else None."""
+    if len(spec["group_by"]) != 1 or len(result) < 2:
+        return None
+    x = _key_name(spec["group_by"][0])
+    y = _metric_name(spec["metrics"][0])
+    return {
+        "type": "line" if _split_key(spec["group_by"][0])[1] else "bar",
+        "data": json.loads(result[[x, y]].to_json(orient="records", date_format="iso")),
+        "x": x,
+        "y": y,
+    }
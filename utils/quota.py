@@ -0,0 +1,200 @@
+# utils/quota.py
+import datetime
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.cancellation import LLMCancelledError
+from utils.llm_config import get_llm_config
+from utils.llm_context import get_cancel_token
+from utils.llm_priority import BACKGROUND, INTERACTIVE
+from utils.logger import logger
+from utils.usage_tracker import tokens_used_since
+
+QUOTA_OVERRIDES_PATH = os.getenv("QUOTA_OVERRIDES_PATH", "quota_overrides.json")
+
+
+class QuotaExceededError(RuntimeError):
+    pass
+
+
+class QuotaManager:
+    """
+    Fair sharing of Groq throughput between users of one app process.
+
+    Each user has a daily Groq token budget and a cap on LLM calls in flight at
+    once; a call beyond the cap waits for one of the user's own calls to finish
+    (up to queue_timeout_s) instead of taking capacity from everyone else.
+    The user's interactive calls go ahead of their queued background calls,
+    and background calls leave interactive_reserved slots free, so the user's
+    own prefetching or report sections never lock out their chat.
+    Admin overrides per user are kept in quota_overrides.json; a limit of None
+    means unlimited.
+    """
+
+    def __init__(self, config, overrides_path=QUOTA_OVERRIDES_PATH):
+        self.config = config
+        self.overrides_path = overrides_path
+        self._overrides = self._load_overrides()
+        self._used = {}
+        self._day = None
+        self._in_flight = {}
+        self._background = {}
+        self._interactive_waiting = {}
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def _load_overrides(self) -> dict:
+        if not os.path.exists(self.overrides_path):
+            return {}
+        try:
+            with open(self.overrides_path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring invalid quota overrides {self.overrides_path}: {e}")
+            return {}
+
+    def _save_overrides(self):
+        with open(self.overrides_path, "w") as f:
+            json.dump(self._overrides, f, indent=4)
+
+    def limits_for(self, user) -> dict:
+        limits = {
+            "daily_tokens": self.config["daily_tokens"],
+            "max_concurrent": self.config["max_concurrent"],
+        }
+        limits.update(self._overrides.get(user, {}))
+        return limits
+
+    def set_override(self, user, daily_tokens=None, max_concurrent=None):
+        with self._lock:
+            self._overrides[user] = {"daily_tokens": daily_tokens, "max_concurrent": max_concurrent}
+            self._save_overrides()
+            self._released.notify_all()
+
+    def clear_override(self, user):
+        with self._lock:
+            if self._overrides.pop(user, None) is not None:
+                self._save_overrides()
+                self._released.notify_all()
+
+    def overrides(self) -> dict:
+        with self._lock:
+            return {user: dict(limits) for user, limits in self._overrides.items()}
+
+    def _roll_day_locked(self, today):
+        if today != self._day:
+            self._day, self._used = today, {}
+
+    def used_today(self, user) -> int:
+        today = datetime.date.today().isoformat()
+        with self._lock:
+            self._roll_day_locked(today)
+            if user in self._used:
+                return self._used[user]
+        # First call of the day in this process: pick up what earlier
+        # processes already spent from the usage store. Read outside the lock
+        # so other users' calls do not wait on the disk.
+        stored = tokens_used_since(user, today, backend="groq")
+        with self._lock:
+            self._roll_day_locked(today)
+            return self._used.setdefault(user, stored)
+
+    def remaining(self, user):
+        """Groq tokens left today, or None when the user has no daily limit."""
+        limit = self.limits_for(user)["daily_tokens"]
+        if limit is None:
+            return None
+        return max(0, limit - self.used_today(user))
+
+    def charge(self, user, tokens):
+        self.used_today(user)
+        with self._lock:
+            self._used[user] = self._used.get(user, 0) + int(tokens)
+
+    def check(self, user, estimated_tokens=0):
+        limit = self.limits_for(user)["daily_tokens"]
+        if limit is None:
+            return
+        used = self.used_today(user)
+        if used + estimated_tokens > limit:
+            raise QuotaExceededError(
+                f"Daily LLM token quota reached for {user} ({used:,} of {limit:,} tokens used). "
+                f"Ask an admin to raise it or try again tomorrow."
+            )
+
+    def _can_start_locked(self, user, background) -> bool:
+        limit = self.limits_for(user)["max_concurrent"]
+        if limit is None:
+            return True
+        if self._in_flight.get(user, 0) >= limit:
+            return False
+        if not background:
+            return True
+        if self._interactive_waiting.get(user, 0):
+            return False
+        # With a single slot there is nothing to reserve.
+        reserved = min(self.config["interactive_reserved"], limit - 1)
+        return self._background.get(user, 0) < limit - reserved
+
+    @contextmanager
+    def slot(self, user, priority=INTERACTIVE):
+        """Hold one of the user's concurrent-call slots for the duration of the block."""
+        background = priority == BACKGROUND
+        deadline = time.monotonic() + self.config["queue_timeout_s"]
+        token = get_cancel_token()
+        with self._lock:
+            if not background:
+                self._interactive_waiting[user] = self._interactive_waiting.get(user, 0) + 1
+            try:
+                while not self._can_start_locked(user, background):
+                    if token is not None and token.cancelled:
+                        raise LLMCancelledError(token.reason or "rerun requested")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise QuotaExceededError(
+                            f"{user} already has {self._in_flight.get(user, 0)} LLM request(s) running; "
+                            f"wait for them to finish."
+                        )
+                    self._released.wait(min(remaining, 0.25))
+            finally:
+                if not background:
+                    self._interactive_waiting[user] -= 1
+                    # Background calls held back for this one may go now.
+                    self._released.notify_all()
+            self._in_flight[user] = self._in_flight.get(user, 0) + 1
+            if background:
+                self._background[user] = self._background.get(user, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[user] -= 1
+                if background:
+                    self._background[user] -= 1
+                self._released.notify_all()
+
+    def snapshot(self) -> list:
+        with self._lock:
+            users = sorted(set(self._used) | set(self._in_flight) | set(self._overrides))
+        used_today = {user: self.used_today(user) for user in users}
+        with self._lock:
+            rows = []
+            for user in users:
+                limits = self.limits_for(user)
+                used = used_today[user]
+                rows.append({
+                    "user": user,
+                    "tokens_used_today": used,
+                    "daily_tokens": limits["daily_tokens"],
+                    "remaining": None if limits["daily_tokens"] is None else max(0, limits["daily_tokens"] - used),
+                    "in_flight": self._in_flight.get(user, 0),
+                    "max_concurrent": limits["max_concurrent"],
+                    "override": user in self._overrides,
+                })
+            return rows
+
+
+quota_manager = QuotaManager(get_llm_config()["quotas"])
@@ -0,0 +1,212 @@
+# utils/replay_backend.py
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from utils.logger import logger
+from utils.single_flight import make_key
+from utils.token_counter import count_tokens
+from utils.usage_tracker import record_llm_call
+
+RECORD, REPLAY, SYNTHESIZE = "record", "replay", "synthesize"
+
+_FILLER = (
+    "the data shows a steady pattern across the selected columns",
+    "values in the top segment are noticeably higher than the median",
+    "a small number of records account for most of the variation",
+    "the trend is stable with a few short-lived spikes",
+    "this suggests focusing on the largest categories first",
+    "missing values are rare and do not change the overall picture",
+)
+_HEADER_RE = re.compile(r"Dataset preview:\s*\n([^\n]+)", re.IGNORECASE)
+# Prompt fragments the structured-output and planner prompts are built from.
+_SCHEMA_RE = re.compile(r"matches this JSON schema:\n(\{.*\})\n")
+_COLUMNS_RE = re.compile(r"these columns:\n(.*?)(?:\n\n|$)", re.DOTALL)
+_COLUMN_TYPE_RE = re.compile(r"^- (.+): (\S+)$", re.MULTILINE)
+_TITLES_RE = re.compile(r"Titles:\n(.*?)(?:\n\n|$)", re.DOTALL)
+_NUMBERED_RE = re.compile(r"^(\d+)\. \S", re.MULTILINE)
+_SUMMARY_LIMIT_RE = re.compile(r"at most (\d+) tokens")
+
+
+def sample(spec, rng) -> float:
+    """Draw one value from a distribution spec such as {"dist": "normal", "mean": 1, "stddev": 0.2}."""
+    if not isinstance(spec, dict):
+        return float(spec)
+    dist = spec.get("dist", "constant")
+    if dist == "constant":
+        value = spec["value"]
+    elif dist == "normal":
+        value = rng.gauss(spec["mean"], spec.get("stddev", 0.0))
+    elif dist == "lognormal":
+        value = spec["median"] * rng.lognormvariate(0.0, spec.get("sigma", 0.0))
+    elif dist == "uniform":
+        value = rng.uniform(spec["low"], spec["high"])
+    else:
+        raise ValueError(f"Unsupported distribution: {dist}")
+    return max(float(spec.get("min", 0.0)), float(value))
+
+
+class ReplayBackend:
+    """
+    Offline stand-in for the real backends, for benchmarking the app's own
+    overhead without network noise. Three modes:
+
+    - record: forward the call to the live backend and append the response to
+      the cassette (a JSONL file), keyed by a hash of the prompt.
+    - replay: answer from the cassette; the same prompt always gets the same
+      response. Misses are synthesized (or raise, with on_miss="error").
+    - synthesize: generate a response shaped for the task class, with latency
+      and token rate drawn from the configured distributions. Draws are seeded
+      by the prompt hash, so a run is reproducible.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.mode = os.getenv("LLM_REPLAY_MODE", config["mode"])
+        self.path = os.getenv("LLM_REPLAY_PATH", config["path"])
+        self._cassette = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self._cassette is None:
+            cassette = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                            cassette[entry["key"]] = entry
+                        except Exception:
+                            continue
+            self._cassette = cassette
+            logger.info(f"[Replay] Loaded {len(cassette)} recorded responses from {self.path}")
+        return self._cassette
+
+    def _save(self, entry):
+        with self._lock:
+            self._load()[entry["key"]] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def complete(self, system_prompt, prompt, task, live):
+        """Answer one request; live() performs the real call in record mode."""
+        key = make_key(system_prompt.strip(), prompt.strip())
+        start = time.perf_counter()
+
+        if self.mode == RECORD:
+            response = live()
+            self._save({
+                "key": key,
+                "task": task,
+                "response": response,
+                "latency_s": round(time.perf_counter() - start, 4),
+                "tokens_input": count_tokens(system_prompt) + count_tokens(prompt),
+                "tokens_output": count_tokens(response),
+            })
+            return response
+
+        if self.mode == REPLAY:
+            with self._lock:
+                entry = self._load().get(key)
+            if entry is not None:
+                if self.config["replay_latency"]:
+                    time.sleep(entry.get("latency_s", 0.0))
+                self._meter(entry["tokens_input"], entry["tokens_output"], start)
+                return entry["response"]
+            if self.config["on_miss"] == "error":
+                raise KeyError(f"No recorded response for this {task} prompt in {self.path}")
+            logger.debug(f"[Replay] Miss for {task} prompt, synthesizing")
+
+        return self._synthesize(key, system_prompt, prompt, task, start)
+
+    def _synthesize(self, key, system_prompt, prompt, task, start):
+        settings = self.config["synthesize"]
+        rng = random.Random(f"{settings['seed']}:{key}")
+        output_tokens = int(sample(settings["output_tokens"], rng))
+        delay = sample(settings["latency_s"], rng) + output_tokens / max(sample(settings["tokens_per_s"], rng), 1.0)
+
+        response = self._shaped_response(task, prompt, output_tokens, rng)
+        if settings["sleep"]:
+            time.sleep(delay)
+        self._meter(count_tokens(system_prompt) + count_tokens(prompt), count_tokens(response), start)
+        return response
+
+    @staticmethod
+    def _text(tokens, rng) -> str:
+        sentences = []
+        while sum(count_tokens(s) for s in sentences) < tokens:
+            sentences.append(rng.choice(_FILLER).capitalize() + ".")
+        return " ".join(sentences)
+
+    def _shaped_response(self, task, prompt, tokens, rng) -> str:
+        # Callers parse and validate these shapes, so synthetic answers take
+        # the same code paths as real ones instead of the repair/re-ask path.
+        if task == "column_selection":
+            match = _HEADER_RE.search(prompt)
+            columns = [c.strip() for c in match.group(1).split(",")][:5] if match else []
+            return repr(columns)
+        if task == "query_plan":
+            return json.dumps(self._query_spec(prompt))
+        titles = _TITLES_RE.search(prompt) if task == "insight_batch" else None
+        numbers = list(dict.fromkeys(int(n) for n in _NUMBERED_RE.findall(titles.group(1)))) if titles else []
+        if numbers:
+            return json.dumps([{"number": n, "answer": self._text(tokens // len(numbers), rng)} for n in numbers])
+        if task == "chat":
+            return json.dumps({"response": self._text(tokens, rng)})
+        if task == "memory":
+            limit = _SUMMARY_LIMIT_RE.search(prompt)
+            return self._text(min(tokens, int(limit.group(1))) if limit else tokens, rng)
+        schema = _SCHEMA_RE.search(prompt)
+        if schema:
+            return json.dumps(self._from_schema(json.loads(schema.group(1)), rng))
+        if task == "categories":
+            return json.dumps([
+                {"title": f"Category {i + 1}", "questions": [self._text(12, rng) for _ in range(4)]}
+                for i in range(5)
+            ])
+        return self._text(tokens, rng)
+
+    @staticmethod
+    def _query_spec(prompt) -> dict:
+        """A valid aggregation over the columns the planner prompt lists."""
+        match = _COLUMNS_RE.search(prompt)
+        columns = _COLUMN_TYPE_RE.findall(match.group(1)) if match else []
+        text = [col for col, dtype in columns if dtype in ("object", "str", "string", "category")]
+        numeric = [col for col, dtype in columns if re.match(r"u?int|float", dtype)]
+        spec = {"metrics": [{"column": "*", "agg": "count"}]}
+        if text:
+            spec["group_by"] = [text[0]]
+        if numeric:
+            spec["metrics"].append({"column": numeric[0], "agg": "sum"})
+        return spec
+
+    def _from_schema(self, schema, rng):
+        """A value matching the subset of JSON schema that structured_output validates."""
+        if "enum" in schema:
+            return rng.choice(schema["enum"])
+        kind = schema.get("type")
+        if kind == "object":
+            props = schema.get("properties", {})
+            return {key: self._from_schema(props.get(key, {}), rng) for key in schema.get("required", [])}
+        if kind == "array":
+            count = max(schema.get("minItems", 0), 3)
+            return [self._from_schema(schema.get("items", {}), rng) for _ in range(count)]
+        if kind == "integer":
+            return rng.randint(1, 5)
+        if kind == "number":
+            return round(rng.uniform(0, 100), 2)
+        if kind == "boolean":
+            return False
+        return self._text(12, rng)
+
+    def _meter(self, tokens_input, tokens_output, start):
+        record_llm_call(
+            "replay", self.mode,
+            tokens_input=tokens_input,
+            tokens_output=tokens_output,
+            latency_s=time.perf_counter() - start,
+        )
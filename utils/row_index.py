@@ -0,0 +1,152 @@
+# utils/row_index.py
+import math
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from utils.dataset_fingerprint import dataset_fingerprint
+from utils.llm_config import get_llm_config
+from utils.logger import logger
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text) -> list:
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class RowIndex:
+    """
+    BM25 index over the text and categorical cells of one dataset version.
+
+    Cells are indexed per distinct value: each column is factorized once and
+    the postings point at (column, value code) pairs, so building costs one
+    pass over the distinct values and scoring a query term is one vectorized
+    lookup per column that contains it.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, df):
+        self.num_rows = len(df)
+        self._codes = {}
+        self._sizes = {}
+        postings = defaultdict(lambda: defaultdict(list))  # token -> column -> [(value code, tf)]
+        lengths = np.zeros(self.num_rows, dtype=np.float32)
+        for col in df.columns:
+            series = df[col]
+            if series.dtype.kind in "iufcmM":
+                continue
+            codes, uniques = pd.factorize(series)
+            value_lengths = np.zeros(len(uniques) + 1, dtype=np.float32)  # last slot: missing (-1)
+            for code, value in enumerate(uniques):
+                tokens = tokenize(value)
+                value_lengths[code] = len(tokens)
+                counts = defaultdict(int)
+                for token in tokens:
+                    counts[token] += 1
+                for token, tf in counts.items():
+                    postings[token][col].append((code, tf))
+            self._codes[col] = codes
+            self._sizes[col] = len(uniques) + 1
+            lengths += value_lengths[codes]
+        self._postings = {
+            token: {col: np.array(entries, dtype=np.int64).T for col, entries in columns.items()}
+            for token, columns in postings.items()
+        }
+        self._lengths = lengths
+        self._avg_length = float(lengths.mean()) if self.num_rows and lengths.mean() > 0 else 1.0
+
+    def search(self, query, k=20) -> list:
+        """Positions of the k rows scoring highest for query, best first."""
+        scores = None
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            tf = np.zeros(self.num_rows, dtype=np.float32)
+            for col, (codes, counts) in postings.items():
+                # Term frequency per distinct value, spread to rows by value code.
+                per_value = np.zeros(self._sizes[col], dtype=np.float32)
+                per_value[codes] = counts
+                tf += per_value[self._codes[col]]
+            containing = int(np.count_nonzero(tf))
+            idf = math.log(1 + (self.num_rows - containing + 0.5) / (containing + 0.5))
+            norm = self.K1 * (1 - self.B + self.B * self._lengths / self._avg_length)
+            term = idf * tf * (self.K1 + 1) / (tf + norm)
+            scores = term if scores is None else scores + term
+        if scores is None:
+            return []
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        return hits[np.argsort(-scores[hits], kind="stable")].tolist()
+
+
+class RowIndexRegistry:
+    """
+    Row indexes per dataset fingerprint, built on a background thread so an
+    upload never waits for one. get() returns None until the index is ready.
+    """
+
+    def __init__(self, max_datasets=8):
+        self.max_datasets = max_datasets
+        self._indexes = OrderedDict()
+        self._building = set()
+        self._lock = threading.Lock()
+
+    def build_async(self, df):
+        fingerprint = dataset_fingerprint(df)
+        with self._lock:
+            if fingerprint in self._indexes or fingerprint in self._building:
+                return
+            self._building.add(fingerprint)
+        threading.Thread(target=self._build, args=(fingerprint, df), name="row-index", daemon=True).start()
+
+    def _build(self, fingerprint, df):
+        try:
+            index = RowIndex(df)
+        except Exception as e:
+            logger.warning(f"[RowIndex] Could not index dataset {fingerprint}: {e}")
+            index = None
+        with self._lock:
+            self._building.discard(fingerprint)
+            if index is not None:
+                self._indexes[fingerprint] = index
+                while len(self._indexes) > self.max_datasets:
+                    self._indexes.popitem(last=False)
+
+    def get(self, df):
+        fingerprint = dataset_fingerprint(df)
+        with self._lock:
+            index = self._indexes.get(fingerprint)
+            if index is not None:
+                self._indexes.move_to_end(fingerprint)
+        return index
+
+
+row_indexes = RowIndexRegistry()
+
+
+def relevant_rows(df, question, fill=100):
+    """
+    The rows to show the model for question: those the row index ranks
+    highest (up to retrieval.top_k), then leading rows up to fill rows in
+    total. Falls back to df.head(fill) while the index is still building.
+    """
+    settings = get_llm_config()["retrieval"]
+    index = row_indexes.get(df) if settings["enabled"] else None
+    if index is None:
+        if settings["enabled"]:
+            row_indexes.build_async(df)
+        return df.head(fill)
+    hits = index.search(question, settings["top_k"])
+    if not hits:
+        return df.head(fill)
+    seen = set(hits)
+    head = [i for i in range(min(fill, len(df))) if i not in seen][: max(0, fill - len(hits))]
+    return df.iloc[hits + head]
@@ -1,23 +1,8 @@
 import pandas as pd
 from utils.llm_selector import get_llm
+from utils.prompt_templates import PromptTemplate
 
-def generate_section8_conclusion(df: pd.DataFrame, insights: dict = None, model_source="groq") -> str:
-    llm = get_llm(model_source)
-
-    try:
-        # Lightweight context
-        preview_df = df.head(3)
-        preview_str = preview_df.to_markdown(index=False)
-
-        # Insight summary block (optional)
-        insight_text = ""
-        if insights:
-            for key, value in insights.items():
-                insight_text += f"\n### {key}\n{value.strip()}\n"
-
-        insights_block = f"**Key Insights from Other Sections:**\n{insight_text}" if insight_text else ""
-
-        prompt = f"""
+CONCLUSION_TEMPLATE = PromptTemplate("report.conclusion", """
 You are generating the **Conclusion** section of a professional data analysis report.
 
 **Objective**:
@@ -26,12 +11,26 @@ You are generating the **Conclusion** section of a professional data analysis re
 - Suggest final thoughts or high-level next steps
 
 **Data Preview (first 3 rows)**:
-{preview_str}
+{preview_3}
 
 {insights_block}
 
 Write 1–2 well-structured paragraphs in a formal tone that summarize the entire analysis and provide closure.
-"""
+""")
+
+def generate_section8_conclusion(df: pd.DataFrame, insights: dict = None, model_source="groq") -> str:
+    llm = get_llm(model_source, task="narration", call_site="report.conclusion")
+
+    try:
+        # Insight summary block (optional)
+        insight_text = ""
+        if insights:
+            for key, value in insights.items():
+                insight_text += f"\n### {key}\n{value.strip()}\n"
+
+        insights_block = f"**Key Insights from Other Sections:**\n{insight_text}" if insight_text else ""
+
+        prompt = CONCLUSION_TEMPLATE.render(df, insights_block=insights_block)
 
         return llm(prompt)
 
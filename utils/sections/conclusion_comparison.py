@@ -1,14 +1,27 @@
 import pandas as pd
 from utils.llm_selector import get_llm
+from utils.prompt_templates import PromptTemplate
+
+CONCLUSION_TEMPLATE = PromptTemplate("report.conclusion_comparison", """
+You are generating the **Conclusion** section of a professional data analysis report.
+
+**Objective**:
+- Summarize the key takeaways without repeating the full report
+- Emphasize the overall implications or strategic insights
+- Suggest final thoughts or high-level next steps
+
+**Data Preview (first 3 rows)**:
+{preview_3}
+
+{insights_block}
+
+Write 1–2 well-structured paragraphs in a formal tone that summarize the entire analysis and provide closure.
+""")
 
 def generate_section8_conclusion_comparsion(df: pd.DataFrame, insights=None, model_source="groq") -> str:
-    llm = get_llm(model_source)
+    llm = get_llm(model_source, task="narration", call_site="report.conclusion_comparison")
 
     try:
-        # Lightweight context for the LLM
-        preview_df = df.head(3)
-        preview_str = preview_df.to_markdown(index=False)
-
         # Prepare insight summary block
         insight_text = ""
         if insights:
@@ -23,22 +36,7 @@ def generate_section8_conclusion_comparsion(df: pd.DataFrame, insights=None, mod
 
         insights_block = f"**Key Insights from Other Sections:**\n{insight_text}" if insight_text else ""
 
-        # LLM Prompt
-        prompt = f"""
-You are generating the **Conclusion** section of a professional data analysis report.
-
-**Objective**:
-- Summarize the key takeaways without repeating the full report
-- Emphasize the overall implications or strategic insights
-- Suggest final thoughts or high-level next steps
-
-**Data Preview (first 3 rows)**:
-{preview_str}
-
-{insights_block}
-
-Write 1–2 well-structured paragraphs in a formal tone that summarize the entire analysis and provide closure.
-"""
+        prompt = CONCLUSION_TEMPLATE.render(df, insights_block=insights_block)
 
         return llm(prompt)
 
@@ -2,31 +2,9 @@
 
 import pandas as pd
 from utils.llm_selector import get_llm
-import textwrap
+from utils.prompt_templates import PromptTemplate, dataset_block
 
-def generate_section6_cross_domain(df: pd.DataFrame, model_source="groq") -> str:
-    llm = get_llm(model_source)
-
-    try:
-        # Reduce table preview size
-        preview_df = df.head(5)
-        if df.shape[1] > 10:
-            preview_df = preview_df.iloc[:, :10]  # cap at 10 columns
-
-        preview_str = preview_df.to_markdown(index=False)
-
-        # Summarize column types
-        column_types = df.dtypes.astype(str).to_dict()
-        column_types_str = "\n".join([f"- {col}: {dtype}" for col, dtype in column_types.items()])
-
-        # Describe numeric + first 3 categorical columns (if any)
-        numeric_desc = df.describe().round(2).to_string()
-
-        cat_cols = df.select_dtypes(include="object").columns[:3]
-        cat_stats = df[cat_cols].describe().to_string() if len(cat_cols) > 0 else ""
-
-        # Construct prompt parts
-        prompt = textwrap.dedent(f"""
+CROSS_DOMAIN_TEMPLATE = PromptTemplate("report.cross_domain", """
         You are generating the **Cross-Domain Insights** section of a formal data report.
 
         **Objective**:
@@ -35,14 +13,22 @@ def generate_section6_cross_domain(df: pd.DataFrame, model_source="groq") -> str
         - Write in a professional, business-oriented tone
 
         **Column Types**:
-        {column_types_str}
+        {column_types}
 
         **Dataset Preview (First 5 rows, up to 10 columns)**:
-        {preview_str}
+        {preview_5x10}
 
         **Numerical Summary**:
-        {numeric_desc}
-        """)
+        {numeric_summary}
+        """, dedent=True)
+
+def generate_section6_cross_domain(df: pd.DataFrame, model_source="groq") -> str:
+    llm = get_llm(model_source, task="narration", call_site="report.cross_domain")
+
+    try:
+        # Column types, preview and summaries come from the per-dataset block cache
+        prompt = CROSS_DOMAIN_TEMPLATE.render(df)
+        cat_stats = dataset_block(df, "categorical_summary")
 
         # Append categorical stats separately if available
         if cat_stats:
@@ -1,23 +1,14 @@
 # utils/sections/section3_data_overview.py
+from utils.prompt_templates import PromptTemplate
 
-
-def generate_section3_data_overview(df, model_source="groq"):
-    from utils.llm_selector import get_llm
-    llm = get_llm(model_source)
-
-    # Get real shape info
-    num_rows, num_cols = df.shape
-    sample_data = df.head(3).to_markdown(index=False)
-    column_names = ", ".join(df.columns[:10]) + ("..." if len(df.columns) > 10 else "")
-
-    prompt = f"""
+DATA_OVERVIEW_TEMPLATE = PromptTemplate("report.data_overview", """
 You are generating a formal 'Data Overview' section for a dataset report.
 
 Dataset contains {num_rows} rows and {num_cols} columns.
 Some of the column names are: {column_names}.
 
 Here are some sample rows:
-{sample_data}
+{preview_3}
 
 Instructions:
 - Describe the volume and structure of the data.
@@ -26,6 +17,13 @@ Instructions:
 - Mention any missing values or limitations.
 
 Generate this in a formal report tone.
-    """
+    """)
+
+def generate_section3_data_overview(df, model_source="groq"):
+    from utils.llm_selector import get_llm
+    llm = get_llm(model_source, task="narration", call_site="report.data_overview")
+
+    # Shape, column names and sample rows are shared dataset context blocks
+    prompt = DATA_OVERVIEW_TEMPLATE.render(df)
 
     return llm(prompt)
@@ -3,7 +3,7 @@
 from utils.llm_selector import get_llm
 
 def generate_section2_introduction(df, model_source="groq"):
-    llm = get_llm(model_source)
+    llm = get_llm(model_source, task="narration", call_site="report.introduction")
 
     # Generate a prompt using dataset preview
     prompt = f"""
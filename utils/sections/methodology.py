@@ -2,21 +2,16 @@
 
 import pandas as pd
 from utils.llm_selector import get_llm
+from utils.prompt_templates import PromptTemplate
 
-def generate_section4_methodology(df: pd.DataFrame, model_source="groq") -> str:
-    llm = get_llm(model_source)
-
-    describe_str = df.describe(include="all").to_string()
-    preview_str = df.head(10).to_string()
-
-    prompt = f"""
+METHODOLOGY_TEMPLATE = PromptTemplate("report.methodology", """
 You are generating the **Methodology** section of a data analysis report.
 
 Here is a dataset preview:
-{preview_str}
+{preview_10_text}
 
 Here are summary statistics:
-{describe_str}
+{full_summary}
 
 Write a concise Methodology section covering:
 - Tools and techniques used (e.g., statistical analysis, machine learning)
@@ -26,7 +21,12 @@ Write a concise Methodology section covering:
 
 Do NOT include tables or charts.
 Return a formal, structured summary as a paragraph.
-"""
+""")
+
+def generate_section4_methodology(df: pd.DataFrame, model_source="groq") -> str:
+    llm = get_llm(model_source, task="narration", call_site="report.methodology")
+
+    prompt = METHODOLOGY_TEMPLATE.render(df)
 
     try:
         return llm(prompt)
@@ -2,8 +2,31 @@ import pandas as pd
 import re
 import streamlit as st
 from utils.llm_selector import get_llm
+from utils.prompt_templates import PromptTemplate
 from utils.data_cleaner import clean_data  # Optional: use only if needed
 
+RECOMMENDATIONS_TEMPLATE = PromptTemplate("report.recommendations_comparison", """
+You are generating the **Recommendations & Actionable Items** section of a professional data report.
+
+**Objective**:
+- Suggest clear, data-driven actions based on the dataset and insights.
+- Use the format:
+  1. Insight: ...
+     Recommended Action: ...
+     Priority: High/Medium/Low
+     Owner/Team: ...
+     Timeline: ...
+
+**Column Types**:
+{column_types}
+
+**Data Preview (first 5 rows, max 10 cols)**:
+{preview_5x10}
+
+**Numeric Summary**:
+{numeric_summary}
+""")
+
 def parse_recommendations(raw_text: str):
     """
     Parses LLM-generated text into a list of structured recommendation dicts.
@@ -38,51 +61,16 @@ def generate_section7_recommendations_comparison(df: pd.DataFrame, insights: dic
     if df is None:
         return [f"Recommendation generation failed: No dataset provided."]
 
-    llm = get_llm(model_source)
+    llm = get_llm(model_source, task="narration", call_site="report.recommendations_comparison")
 
     try:
-        # Trim dataset for preview
-        preview_df = df.head(5)
-        if df.shape[1] > 10:
-            preview_df = preview_df.iloc[:, :10]
-
-        preview_str = preview_df.to_markdown(index=False)
-
-        # Column summary
-        column_types = df.dtypes.astype(str).to_dict()
-        column_types_str = "\n".join([f"- {col}: {dtype}" for col, dtype in column_types.items()])
-
-        # Descriptive stats
-        numeric_summary = df.describe().round(2).to_string()
-
         # Insight text
         insight_text = ""
         if insights is not None and isinstance(insights, dict) and len(insights) > 0:
             for key, value in insights.items():
                 insight_text += f"\n### {key}\n{value}\n"
 
-        # Prompt
-        prompt = f"""
-You are generating the **Recommendations & Actionable Items** section of a professional data report.
-
-**Objective**:
-- Suggest clear, data-driven actions based on the dataset and insights.
-- Use the format:
-  1. Insight: ...
-     Recommended Action: ...
-     Priority: High/Medium/Low
-     Owner/Team: ...
-     Timeline: ...
-
-**Column Types**:
-{column_types_str}
-
-**Data Preview (first 5 rows, max 10 cols)**:
-{preview_str}
-
-**Numeric Summary**:
-{numeric_summary}
-"""
+        prompt = RECOMMENDATIONS_TEMPLATE.render(df)
 
         if insight_text:
             prompt += f"\n**Relevant Insights from Other Sections:**\n{insight_text}"
@@ -1,14 +1,13 @@
 # utils/sections/section1_summary.py
 
 from utils.llm_selector import get_llm
+from utils.prompt_templates import PromptTemplate
 
-def generate_section1_summary(df, model_source="groq"):
-    llm = get_llm(model_source)
-    prompt = f"""
+SUMMARY_TEMPLATE = PromptTemplate("report.summary", """
     You are a senior data analyst. Analyze the dataset provided below and generate an executive summary.
 
     Dataset Summary (df.describe()):
-    {df.describe(include='all').to_string()}
+    {full_summary}
 
     Instructions:
     1. Start with the **Objective of the analysis**
@@ -19,5 +18,9 @@ def generate_section1_summary(df, model_source="groq"):
     - Objective:
     - Key Insights:
     - Recommendations:
-    """
+    """)
+
+def generate_section1_summary(df, model_source="groq"):
+    llm = get_llm(model_source, task="narration", call_site="report.summary")
+    prompt = SUMMARY_TEMPLATE.render(df)
     return llm(prompt)
@@ -0,0 +1,243 @@
+# utils/semantic_cache.py
+import math
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+# Hashed n-gram embedding: fully local, no model download and no network.
+VECTOR_DIM = 4096
+SIMILARITY_THRESHOLD = 0.82
+MAX_ENTRIES_PER_DATASET = 256
+MAX_DATASETS = 32
+
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "for",
+    "to", "me", "my", "our", "we", "you", "please", "can", "could", "would",
+    "what", "whats", "which", "show", "tell", "give", "find", "do", "does", "there",
+    "this", "that", "data", "dataset", "it", "and", "with", "from", "about",
+}
+
+_SYNONYMS = {
+    "avg": "average", "mean": "average", "averages": "average",
+    "per": "by", "across": "by", "each": "by",
+    "no": "number", "num": "number", "count": "number", "qty": "quantity",
+    "pct": "percent", "percentage": "percent", "%": "percent",
+    "max": "maximum", "highest": "maximum", "top": "maximum", "largest": "maximum",
+    "min": "minimum", "lowest": "minimum", "smallest": "minimum", "bottom": "minimum",
+    "yoy": "yearly", "annual": "yearly", "monthly": "month",
+}
+
+
+def _stem(word: str) -> str:
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _normalize(text: str) -> list:
+    words = re.findall(r"[a-z0-9_%]+", str(text).lower())
+    words = [_stem(_SYNONYMS.get(w, w)) for w in words]
+    return [w for w in words if w not in _STOPWORDS]
+
+
+def _numbers(text: str) -> frozenset:
+    return frozenset(re.findall(r"\d+(?:\.\d+)?", str(text)))
+
+
+def _content_tokens(text: str) -> frozenset:
+    """
+    The normalised non-stopword tokens of text. A capital single letter after
+    the first word ("Product A") is kept as a name rather than dropped as an
+    article.
+    """
+    tokens = set()
+    text = re.sub(r"['\u2019]", "", str(text))  # "what's" -> "whats", "region's" -> "regions"
+    for i, word in enumerate(re.findall(r"[A-Za-z0-9_%]+", text)):
+        lower = word.lower()
+        token = _stem(_SYNONYMS.get(lower, lower))
+        if token in _STOPWORDS and not (i and len(word) == 1 and word.isupper()):
+            continue
+        tokens.add(token)
+    return frozenset(tokens)
+
+
+def _signature(text: str) -> tuple:
+    """
+    What two questions must share exactly to share an answer: their numbers
+    and their content tokens. Embeddings of "sales in north" and "sales in
+    south" are close, but the questions are not the same.
+    """
+    return _numbers(text), _content_tokens(text)
+
+
+def _bucket(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) % VECTOR_DIM
+
+
+def embed(text: str) -> dict:
+    """
+    Sparse, L2-normalised vector of hashed word unigrams, word bigrams and
+    character trigrams. Words carry most of the weight; trigrams absorb typos
+    and plural/singular drift.
+    """
+    words = _normalize(text)
+    vec = {}
+
+    def add(token, weight):
+        b = _bucket(token)
+        vec[b] = vec.get(b, 0.0) + weight
+
+    for w in words:
+        add("w:" + w, 1.0)
+        padded = f"#{w}#"
+        for i in range(len(padded) - 2):
+            add("c:" + padded[i:i + 3], 0.25)
+    for a, b in zip(words, words[1:]):
+        add(f"b:{a} {b}", 0.5)
+
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    if norm == 0:
+        return {}
+    return {k: v / norm for k, v in vec.items()}
+
+
+def cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class _DatasetIndex:
+    """Nearest-neighbour index for one dataset: LRU entries plus an inverted bucket index."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()   # entry_id -> (vector, signature, question, answer)
+        self.postings = {}             # bucket -> set(entry_id)
+        self._next_id = 0
+
+    def search(self, vec, signature):
+        candidates = set()
+        for bucket in vec:
+            candidates.update(self.postings.get(bucket, ()))
+        best_id, best_score = None, 0.0
+        for entry_id in candidates:
+            entry_vec, entry_signature = self.entries[entry_id][:2]
+            # "top 5" / "top 10" and "electronics" / "furniture" embed almost
+            # identically but must not share answers.
+            if entry_signature != signature:
+                continue
+            score = cosine(vec, entry_vec)
+            if score > best_score:
+                best_id, best_score = entry_id, score
+        return best_id, best_score
+
+    def add(self, vec, signature, question, answer):
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = (vec, signature, question, answer)
+        for bucket in vec:
+            self.postings.setdefault(bucket, set()).add(entry_id)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def touch(self, entry_id):
+        self.entries.move_to_end(entry_id)
+
+    def _remove(self, entry_id):
+        vec = self.entries.pop(entry_id)[0]
+        for bucket in vec:
+            ids = self.postings.get(bucket)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self.postings[bucket]
+
+
+class SemanticCache:
+    """
+    Question -> answer cache scoped per (dataset fingerprint, namespace).
+    Lookups return the stored answer of the most similar earlier question when
+    its cosine similarity clears the threshold and both questions have the
+    same numbers and content tokens (up to synonyms, stopwords and plurals).
+    Entries are evicted LRU within a dataset, and whole datasets are evicted
+    LRU beyond MAX_DATASETS.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD,
+                 max_entries_per_dataset=MAX_ENTRIES_PER_DATASET, max_datasets=MAX_DATASETS):
+        self.threshold = threshold
+        self.max_entries_per_dataset = max_entries_per_dataset
+        self.max_datasets = max_datasets
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, fingerprint, namespace, question):
+        vec, signature = embed(question), _signature(question)
+        if not vec:
+            return None
+        with self._lock:
+            index = self._indexes.get((fingerprint, namespace))
+            if index is None:
+                self.misses += 1
+                return None
+            self._indexes.move_to_end((fingerprint, namespace))
+            entry_id, score = index.search(vec, signature)
+            if entry_id is None or score < self.threshold:
+                self.misses += 1
+                return None
+            index.touch(entry_id)
+            self.hits += 1
+            return index.entries[entry_id][3]
+
+    def contains(self, fingerprint, namespace, question) -> bool:
+        """Whether get() would hit, without counting a hit or miss or touching the LRU order."""
+        vec, signature = embed(question), _signature(question)
+        if not vec:
+            return False
+        with self._lock:
+            index = self._indexes.get((fingerprint, namespace))
+            if index is None:
+                return False
+            entry_id, score = index.search(vec, signature)
+            return entry_id is not None and score >= self.threshold
+
+    def put(self, fingerprint, namespace, question, answer):
+        vec, signature = embed(question), _signature(question)
+        if not vec:
+            return
+        with self._lock:
+            key = (fingerprint, namespace)
+            index = self._indexes.get(key)
+            if index is None:
+                index = _DatasetIndex(self.max_entries_per_dataset)
+                self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            entry_id, score = index.search(vec, signature)
+            if entry_id is not None and score >= 0.999:
+                index.entries[entry_id] = (vec, signature, question, answer)
+                index.touch(entry_id)
+            else:
+                index.add(vec, signature, question, answer)
+            while len(self._indexes) > self.max_datasets:
+                self._indexes.popitem(last=False)
+
+    def invalidate(self, fingerprint):
+        with self._lock:
+            for key in [k for k in self._indexes if k[0] == fingerprint]:
+                del self._indexes[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "datasets": len(self._indexes),
+                "entries": sum(len(i.entries) for i in self._indexes.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+question_cache = SemanticCache()
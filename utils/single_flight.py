@@ -0,0 +1,71 @@
+# utils/single_flight.py
+import hashlib
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution.
+    The first caller runs the function; callers arriving while it is in
+    flight block and receive the same result (or the same exception).
+    The state lives at module level, so it is shared by every Streamlit
+    session served from this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        return self.execute(key, func, *args, **kwargs)[0]
+
+    def execute(self, key, func, *args, **kwargs):
+        """Like do(), but returns (result, shared); shared is True for callers that waited on another."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def make_key(*parts) -> str:
+    """Stable key for an LLM request built from backend, model and prompt parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8", errors="ignore"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+llm_flight = SingleFlight()
@@ -0,0 +1,275 @@
+# utils/structured_output.py
+import copy
+import json
+import re
+
+from utils.json_utils import repair_json
+from utils.llm_config import get_llm_config
+from utils.logger import logger
+from utils.model_router import DEFAULT_SYSTEM_PROMPT, model_router
+
+# Schemas use a small JSON Schema subset: type, properties, required, items,
+# minItems and enum.
+CATEGORY_SCHEMA = {
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "required": ["title", "questions"],
+        "properties": {
+            "title": {"type": "string"},
+            "questions": {"type": "array", "minItems": 1, "items": {"type": "string"}},
+        },
+    },
+}
+
+COLUMN_LIST_SCHEMA = {"type": "array", "minItems": 1, "items": {"type": "string"}}
+
+CHAT_SCHEMA = {
+    "type": "object",
+    "required": ["response"],
+    "properties": {
+        "response": {"type": "string"},
+        "chart_type": {"type": "string", "enum": ["bar", "line", "scatter", "pie", "box", "violin", "area"]},
+        "group_by": {"type": "array", "items": {"type": "string"}},
+        "title": {"type": "string"},
+        "expression": {"type": "string"},
+        "sql": {"type": "string"},
+    },
+}
+
+TITLED_LIST_SCHEMA = {
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "required": ["title", "description"],
+        "properties": {"title": {"type": "string"}, "description": {"type": "string"}},
+    },
+}
+
+INSIGHT_BATCH_SCHEMA = {
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "required": ["number", "answer"],
+        "properties": {"number": {"type": "integer"}, "answer": {"type": "string"}},
+    },
+}
+
+QUERY_SPEC_SCHEMA = {
+    "type": "object",
+    "required": ["metrics"],
+    "properties": {
+        "filters": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["column", "op"],
+                "properties": {
+                    "column": {"type": "string"},
+                    "op": {"type": "string", "enum": ["==", "!=", ">", ">=", "<", "<=", "in", "not in",
+                                                      "between", "contains", "is null", "not null"]},
+                    "value": {},
+                },
+            },
+        },
+        "group_by": {"type": "array", "items": {"type": "string"}},
+        "metrics": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["column", "agg"],
+                "properties": {
+                    "column": {"type": "string"},
+                    "agg": {"type": "string", "enum": ["count", "sum", "mean", "median", "min", "max",
+                                                       "nunique", "std"]},
+                    "as": {"type": "string"},
+                },
+            },
+        },
+        "sort": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["by"],
+                "properties": {"by": {"type": "string"}, "descending": {"type": "boolean"}},
+            },
+        },
+        "limit": {"type": "integer"},
+    },
+}
+
+_TYPES = {
+    "string": str,
+    "array": list,
+    "object": dict,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+}
+_PATH_RE = re.compile(r"\[(\d+)\]|\.([^.\[]+)")
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+def validate(value, schema, path="$") -> list:
+    """Return (path, problem) pairs where value does not match schema."""
+    expected = schema.get("type")
+    if expected and not isinstance(value, _TYPES[expected]):
+        return [(path, f"expected {expected}")]
+    if "enum" in schema and value not in schema["enum"]:
+        return [(path, f"expected one of {schema['enum']}")]
+
+    problems = []
+    if expected == "object":
+        props = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in value or value[key] in (None, ""):
+                problems.append((f"{path}.{key}", "missing"))
+        for key, sub in props.items():
+            if key in value and value[key] not in (None, ""):
+                problems.extend(validate(value[key], sub, f"{path}.{key}"))
+    elif expected == "array":
+        if len(value) < schema.get("minItems", 0):
+            problems.append((path, f"expected at least {schema['minItems']} item(s)"))
+        if "items" in schema:
+            for i, item in enumerate(value):
+                problems.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return problems
+
+
+def _schema_at(schema, path):
+    for index, key in _PATH_RE.findall(path):
+        schema = schema.get("items", {}) if index else schema.get("properties", {}).get(key, {})
+    return schema
+
+
+def _set_path(value, path, new):
+    steps = [(int(index) if index else key) for index, key in _PATH_RE.findall(path)]
+    if not steps:
+        return new
+    target = value
+    for step in steps[:-1]:
+        target = target[step]
+    target[steps[-1]] = new
+    return value
+
+
+def _unwrap(value, schema):
+    # JSON mode only allows objects at the top level, so arrays come back
+    # wrapped as {"result": [...]} (or under whatever key the model chose).
+    if schema.get("type") == "array" and isinstance(value, dict):
+        if "result" in value:
+            return value["result"]
+        return next((v for v in value.values() if isinstance(v, list)), value)
+    if schema.get("type") == "object" and isinstance(value, dict) and set(value) == {"result"}:
+        return value["result"]
+    return value
+
+
+def _format_instructions(schema) -> str:
+    return (
+        "\n\nRespond with a single JSON object of the form {\"result\": <value>}, where <value> "
+        f"matches this JSON schema:\n{json.dumps(schema)}\nDo not add any text outside the JSON."
+    )
+
+
+def _prune(value, schema):
+    """Drop array items that are still invalid, when enough valid ones remain."""
+    if schema.get("type") != "array" or not isinstance(value, list):
+        return value
+    kept = [item for item in value if not validate(item, schema.get("items", {}))]
+    return kept if len(kept) >= schema.get("minItems", 0) else value
+
+
+def complete_json(prompt, schema, task="default", model_source="groq", system_prompt=DEFAULT_SYSTEM_PROMPT,
+                  call_site=None, max_reasks=None, fallback=None):
+    """
+    Ask for a JSON value matching schema and return it parsed.
+
+    The request asks for JSON mode where the backend supports it. The answer is
+    repaired tolerantly (fences, prose, truncation); if fields are still
+    missing or malformed, up to max_reasks follow-up calls ask for just those
+    paths and patch them in. fallback(text), when given, turns an answer with
+    no JSON at all into a value instead of re-asking. Raises
+    StructuredOutputError when no valid value can be produced.
+    """
+    settings = get_llm_config()["structured_output"]
+    if max_reasks is None:
+        max_reasks = settings["max_reasks"]
+    json_mode = settings["json_mode"]
+
+    response = model_router.complete(
+        prompt + _format_instructions(schema), task=task, model_source=model_source,
+        system_prompt=system_prompt, call_site=call_site, json_mode=json_mode,
+    )
+    try:
+        value = _unwrap(repair_json(response), schema)
+        problems = validate(value, schema)
+    except (ValueError, SyntaxError) as e:
+        logger.warning(f"[Structured] Unparseable {task} output: {e}")
+        value, problems = None, [("$", "no valid JSON")]
+        if fallback is not None:
+            value = fallback(response)
+            problems = validate(value, schema)
+
+    for _ in range(max_reasks):
+        if not problems:
+            break
+        # An item-level problem is cheaper to fix in isolation than the whole value.
+        if value is not None and not any(path == "$" for path, _ in problems):
+            fixes = _reask_paths(prompt, value, problems, schema, task, model_source, system_prompt, call_site, json_mode)
+            for path, fix in fixes.items():
+                try:
+                    value = _set_path(value, path, fix)
+                except (KeyError, IndexError, TypeError):
+                    continue
+        else:
+            response = model_router.complete(
+                prompt + _format_instructions(schema)
+                + "\nYour previous answer was not valid JSON. Return only the JSON object.",
+                task=task, model_source=model_source, system_prompt=system_prompt,
+                call_site=f"{call_site}.reask" if call_site else None, json_mode=json_mode,
+            )
+            try:
+                value = _unwrap(repair_json(response), schema)
+            except (ValueError, SyntaxError):
+                value = None
+        problems = validate(value, schema) if value is not None else [("$", "no valid JSON")]
+
+    if problems and value is not None:
+        value = _prune(value, schema)
+        problems = validate(value, schema)
+    if problems:
+        raise StructuredOutputError(f"Invalid {task} output: {problems[:5]}")
+    return value
+
+
+def _reask_paths(prompt, value, problems, schema, task, model_source, system_prompt, call_site, json_mode) -> dict:
+    wanted = {path: _schema_at(schema, path) for path, _ in problems}
+    reask = (
+        f"{prompt}\n\nYour previous answer was:\n{json.dumps(value)}\n\n"
+        "It has these problems:\n" + "\n".join(f"- {path}: {problem}" for path, problem in problems)
+        + "\n\nReturn a JSON object mapping each listed path to a corrected value, and nothing else:\n"
+        + json.dumps({path: sub for path, sub in wanted.items()})
+    )
+    logger.info(f"[Structured] Re-asking {task} for {len(wanted)} field(s)")
+    response = model_router.complete(
+        reask, task=task, model_source=model_source, system_prompt=system_prompt,
+        call_site=f"{call_site}.reask" if call_site else None, json_mode=json_mode,
+    )
+    try:
+        fixes = repair_json(response)
+    except (ValueError, SyntaxError):
+        return {}
+    if not isinstance(fixes, dict):
+        return {}
+    return {
+        path: copy.deepcopy(fix) for path, fix in fixes.items()
+        if path in wanted and not validate(fix, wanted[path])
+    }
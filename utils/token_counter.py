@@ -0,0 +1,75 @@
+# utils/token_counter.py
+import math
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to a calibrated estimate
+    tiktoken = None
+
+# Llama 3 uses a tiktoken-style BPE close to cl100k_base, which is a good proxy
+# for the Groq and Ollama models we call.
+ENCODING_NAME = "cl100k_base"
+
+# Context windows in tokens; requests also reserve room for the completion.
+MODEL_CONTEXT_TOKENS = {
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "llama3": 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+# Per-message overhead of the chat format (role markers, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception:
+        return None
+
+
+def count_tokens(text) -> int:
+    if not text:
+        return 0
+    text = str(text)
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    # Without a tokenizer: words cost ~1 token per 4 characters, punctuation 1 each.
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _WORD_RE.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens) -> str:
+    """Longest prefix of text that fits in max_tokens."""
+    text = str(text or "")
+    if max_tokens <= 0:
+        return ""
+    enc = _encoding()
+    if enc is not None:
+        tokens = enc.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else enc.decode(tokens[:max_tokens])
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def estimate_request_tokens(system_prompt, user_prompt) -> int:
+    """Predicted input tokens of a system + user chat request, before it is sent."""
+    return count_tokens(system_prompt) + count_tokens(user_prompt) + 2 * MESSAGE_OVERHEAD_TOKENS
+
+
+def context_tokens(model) -> int:
+    return MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
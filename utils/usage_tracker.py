@@ -1,54 +1,351 @@
 # utils/usage_tracker.py
 
-import os
-import json
+import atexit
 import datetime
+import os
+import sqlite3
+import threading
 
-USAGE_LOG_PATH = "logs/usage_log.json"
+from utils.llm_config import get_llm_config
+from utils.llm_context import get_call_site, get_llm_user
+from utils.logger import logger
 
-def log_usage(user_id: str, model: str, tokens_input: int, tokens_output: int, cost: float):
-    """Log a single API usage entry for a user."""
-    timestamp = datetime.datetime.now().isoformat()
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", "logs/usage.db")
+
+# Entries are buffered in memory and written in one transaction per batch.
+FLUSH_INTERVAL_S = 2.0
+FLUSH_BATCH_SIZE = 200
+# Entries kept for retry while the store cannot be written; older ones are dropped beyond this.
+MAX_PENDING_ENTRIES = 20000
+
+_COLUMNS = (
+    "timestamp", "user_id", "backend", "model", "feature", "cache",
+    "tokens_input", "tokens_output", "total_tokens", "latency_ms", "cost", "ok",
+)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    backend TEXT,
+    model TEXT,
+    feature TEXT,
+    cache TEXT,
+    tokens_input INTEGER NOT NULL DEFAULT 0,
+    tokens_output INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_ms REAL,
+    cost REAL NOT NULL DEFAULT 0,
+    ok INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_usage_timestamp ON usage (timestamp);
+CREATE INDEX IF NOT EXISTS idx_usage_user_timestamp ON usage (user_id, timestamp);
+""" + "".join(f"""
+CREATE TABLE IF NOT EXISTS usage_{granularity} (
+    bucket TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    cache_hits INTEGER NOT NULL DEFAULT 0,
+    tokens_input INTEGER NOT NULL DEFAULT 0,
+    tokens_output INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    latency_ms_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, user_id, model, feature)
+);
+""" for granularity in ("hourly", "daily"))
+
+# Bucket key length in an ISO timestamp: "YYYY-MM-DDTHH" and "YYYY-MM-DD".
+ROLLUP_BUCKETS = {"hourly": 13, "daily": 10}
+_ROLLUP_METRICS = (
+    "requests", "errors", "cache_hits", "tokens_input", "tokens_output",
+    "total_tokens", "cost", "latency_ms_sum",
+)
+
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def connect(path=None):
+    path = path or USAGE_DB_PATH
+    conn = sqlite3.connect(path, timeout=30) if path in _initialized else _initialize(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _initialize(path):
+    # Schema and journal mode persist in the file: set them up once per process.
+    with _init_lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        if path not in _initialized:
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+            except Exception:
+                conn.close()
+                raise
+            _initialized.add(path)
+        return conn
+
+
+class UsageWriter:
+    """
+    Append-only, batched writer. log() only appends to an in-memory buffer; a
+    daemon thread inserts the buffer with executemany every FLUSH_INTERVAL_S or
+    as soon as FLUSH_BATCH_SIZE entries are pending.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="usage-writer", daemon=True)
+            self._thread.start()
+
+    def log(self, entry):
+        with self._lock:
+            self._buffer.append(tuple(entry.get(col) for col in _COLUMNS))
+            pending = len(self._buffer)
+            self._ensure_thread()
+        if pending >= FLUSH_BATCH_SIZE:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        try:
+            conn = connect(self.path)
+            try:
+                # Raw rows and their rollups commit together, so the dashboard
+                # never sees totals that disagree with the log.
+                with conn:
+                    conn.executemany(
+                        f"INSERT INTO usage ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                        batch,
+                    )
+                    _apply_rollups(conn, batch)
+            finally:
+                conn.close()
+        except Exception as e:
+            # Keep the batch for the next flush, ahead of newer entries.
+            with self._lock:
+                self._buffer = batch + self._buffer
+                overflow = len(self._buffer) - MAX_PENDING_ENTRIES
+                if overflow > 0:
+                    del self._buffer[:overflow]
+                    self.dropped += overflow
+            logger.error(f"Failed to write {len(batch)} usage entries, will retry: {e}"
+                         + (f" ({self.dropped} dropped so far)" if self.dropped else ""))
 
+    def _run(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL_S)
+            self._wake.clear()
+            self.flush()
+
+
+def _apply_rollups(conn, batch):
+    """Fold a batch of raw rows into the hourly and daily rollup tables."""
+    idx = {col: i for i, col in enumerate(_COLUMNS)}
+    for granularity, width in ROLLUP_BUCKETS.items():
+        totals = {}
+        for row in batch:
+            key = (row[idx["timestamp"]][:width], row[idx["user_id"]], row[idx["model"]] or "", row[idx["feature"]] or "")
+            agg = totals.setdefault(key, [0] * len(_ROLLUP_METRICS))
+            agg[0] += 1
+            agg[1] += 0 if row[idx["ok"]] else 1
+            shared = row[idx["cache"]] in ("hit", "coalesced")
+            agg[2] += 1 if shared else 0
+            agg[3] += row[idx["tokens_input"]] or 0
+            agg[4] += row[idx["tokens_output"]] or 0
+            agg[5] += row[idx["total_tokens"]] or 0
+            agg[6] += row[idx["cost"]] or 0.0
+            # Only real backend calls feed the average latency.
+            agg[7] += 0.0 if shared else (row[idx["latency_ms"]] or 0.0)
+        updates = ", ".join(f"{m} = {m} + excluded.{m}" for m in _ROLLUP_METRICS)
+        conn.executemany(
+            f"INSERT INTO usage_{granularity} (bucket, user_id, model, feature, {', '.join(_ROLLUP_METRICS)}) "
+            f"VALUES (?, ?, ?, ?, {', '.join('?' * len(_ROLLUP_METRICS))}) "
+            f"ON CONFLICT (bucket, user_id, model, feature) DO UPDATE SET {updates}",
+            [key + tuple(agg) for key, agg in totals.items()],
+        )
+
+
+def rebuild_rollups(path=None):
+    """Recompute both rollup tables from the raw log (e.g. after a manual import)."""
+    conn = connect(path)
+    try:
+        with conn:
+            for granularity, width in ROLLUP_BUCKETS.items():
+                conn.execute(f"DELETE FROM usage_{granularity}")
+                conn.execute(f"""
+                    INSERT INTO usage_{granularity} (bucket, user_id, model, feature, {', '.join(_ROLLUP_METRICS)})
+                    SELECT substr(timestamp, 1, {width}), user_id, COALESCE(model, ''), COALESCE(feature, ''),
+                           COUNT(*), SUM(1 - ok), SUM(cache IN ('hit', 'coalesced')),
+                           SUM(tokens_input), SUM(tokens_output), SUM(total_tokens), SUM(cost),
+                           COALESCE(SUM(CASE WHEN cache IN ('hit', 'coalesced') THEN 0 ELSE latency_ms END), 0)
+                    FROM usage GROUP BY 1, 2, 3, 4
+                """)
+    finally:
+        conn.close()
+
+
+usage_writer = UsageWriter()
+atexit.register(usage_writer.flush)
+
+
+def _cost(model, tokens_input, tokens_output):
+    price = get_llm_config()["pricing"].get(model)
+    if not price:
+        return 0.0
+    return (tokens_input * price["input"] + tokens_output * price["output"]) / 1_000_000
+
+
+def log_usage(user_id: str, model: str, tokens_input: int, tokens_output: int, cost: float, **extra):
+    """Log a single API usage entry for a user."""
     entry = {
+        "timestamp": datetime.datetime.now().isoformat(),
         "user_id": user_id,
         "model": model,
-        "timestamp": timestamp,
         "tokens_input": tokens_input,
         "tokens_output": tokens_output,
         "total_tokens": tokens_input + tokens_output,
-        "cost": round(cost, 4)
+        "cost": round(cost, 6),
+        "ok": 1,
     }
+    entry.update(extra)
+    usage_writer.log(entry)
+
 
-    if os.path.exists(USAGE_LOG_PATH):
-        with open(USAGE_LOG_PATH, "r") as f:
-            data = json.load(f)
-    else:
-        data = []
+def record_llm_call(backend, model, tokens_input=0, tokens_output=0, latency_s=None, cache="miss", ok=True, feature=None):
+    """Meter one LLM call for the current user and call site (see utils/llm_context.py)."""
+    log_usage(
+        user_id=get_llm_user(),
+        model=model,
+        tokens_input=int(tokens_input or 0),
+        tokens_output=int(tokens_output or 0),
+        cost=_cost(model, tokens_input or 0, tokens_output or 0) if cache == "miss" else 0.0,
+        backend=backend,
+        feature=feature or get_call_site() or "unknown",
+        cache=cache,
+        latency_ms=round(latency_s * 1000, 1) if latency_s is not None else None,
+        ok=1 if ok else 0,
+    )
 
-    data.append(entry)
-    os.makedirs(os.path.dirname(USAGE_LOG_PATH), exist_ok=True)
-    with open(USAGE_LOG_PATH, "w") as f:
-        json.dump(data, f, indent=4)
 
 def get_user_summary(user_id: str):
     """Return total cost and tokens used by a user."""
-    if not os.path.exists(USAGE_LOG_PATH):
-        return {"total_tokens": 0, "total_cost": 0.0}
-
-    with open(USAGE_LOG_PATH, "r") as f:
-        data = json.load(f)
-
-    user_entries = [d for d in data if d["user_id"] == user_id]
-    total_tokens = sum(d["total_tokens"] for d in user_entries)
-    total_cost = sum(d["cost"] for d in user_entries)
+    usage_writer.flush()
+    conn = connect()
+    try:
+        row = conn.execute(
+            "SELECT COALESCE(SUM(total_tokens), 0) AS total_tokens, COALESCE(SUM(cost), 0) AS total_cost "
+            "FROM usage_daily WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+        entries = [dict(r) for r in conn.execute(
+            "SELECT * FROM usage WHERE user_id = ? ORDER BY timestamp DESC LIMIT 1000", (user_id,)
+        )]
+    finally:
+        conn.close()
 
     return {
-        "total_tokens": total_tokens,
-        "total_cost": round(total_cost, 4),
-        "entries": user_entries
+        "total_tokens": row["total_tokens"],
+        "total_cost": round(row["total_cost"], 4),
+        "entries": entries
     }
 
 
+def tokens_used_since(user_id, since, backend=None) -> int:
+    """Tokens a user spent on real (non-shared) calls since an ISO timestamp or date."""
+    sql = "SELECT COALESCE(SUM(total_tokens), 0) FROM usage WHERE user_id = ? AND timestamp >= ? AND cache = 'miss'"
+    params = [user_id, since]
+    if backend:
+        sql += " AND backend = ?"
+        params.append(backend)
+    usage_writer.flush()
+    conn = connect()
+    try:
+        return conn.execute(sql, params).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def usage_date_bounds():
+    """(first_day, last_day) with recorded usage as 'YYYY-MM-DD' strings, or (None, None)."""
+    usage_writer.flush()
+    conn = connect()
+    try:
+        row = conn.execute("SELECT MIN(bucket), MAX(bucket) FROM usage_daily").fetchone()
+        return row[0], row[1]
+    finally:
+        conn.close()
+
+
+def query_rollups(granularity, start, end, group_by=("user_id",), user_id=None):
+    """
+    Aggregate a rollup table between two bucket keys (inclusive), grouped by the
+    given dimensions (any of bucket, user_id, model, feature).
+    """
+    if granularity not in ROLLUP_BUCKETS:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    dims = [d for d in group_by if d in ("bucket", "user_id", "model", "feature")]
+    select_dims = ", ".join(dims) + ", " if dims else ""
+    sql = (
+        f"SELECT {select_dims}SUM(requests) AS requests, SUM(errors) AS errors, SUM(cache_hits) AS cache_hits, "
+        f"SUM(tokens_input) AS tokens_input, SUM(tokens_output) AS tokens_output, "
+        f"SUM(total_tokens) AS total_tokens, SUM(cost) AS cost, "
+        f"SUM(latency_ms_sum) / MAX(SUM(requests - cache_hits), 1) AS avg_latency_ms "
+        f"FROM usage_{granularity} WHERE bucket >= ? AND bucket <= ?"
+    )
+    params = [start, end]
+    if user_id:
+        sql += " AND user_id = ?"
+        params.append(user_id)
+    if dims:
+        sql += f" GROUP BY {', '.join(dims)} ORDER BY {', '.join(dims)}"
+    usage_writer.flush()
+    conn = connect()
+    try:
+        return [dict(r) for r in conn.execute(sql, params)]
+    finally:
+        conn.close()
 
 
+def query_usage_page(start, end, user_id=None, before=None, limit=50):
+    """
+    One page of raw entries in [start, end) newest first, using keyset
+    pagination on (timestamp, id) so deep pages cost the same as the first.
+    before is the (timestamp, id) of the last row of the previous page.
+    """
+    sql = "SELECT * FROM usage WHERE timestamp >= ? AND timestamp < ?"
+    params = [start, end]
+    if user_id:
+        sql += " AND user_id = ?"
+        params.append(user_id)
+    if before:
+        sql += " AND (timestamp < ? OR (timestamp = ? AND id < ?))"
+        params.extend([before[0], before[0], before[1]])
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(limit)
+    usage_writer.flush()
+    conn = connect()
+    try:
+        return [dict(r) for r in conn.execute(sql, params)]
+    finally:
+        conn.close()
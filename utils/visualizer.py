@@ -77,15 +77,41 @@ def visualize_comparison_side_by_side(df1, df2, x, y, chart_type):
         return None, None
 
 
-import re
+import hashlib
+import threading
+from collections import OrderedDict
 import pandas as pd
 import plotly.express as px
+from utils.column_matcher import column_matcher
+from utils.dataset_fingerprint import dataset_fingerprint
+
+_FIGURE_CACHE_SIZE = 256
+_figures = OrderedDict()
+_figures_lock = threading.Lock()
+
 
 def guess_and_generate_chart(df: pd.DataFrame, insight_text: str):
     """
     Guess what chart to generate from insight text and plot from dataframe.
     Returns a Plotly figure if a valid chart suggestion is found.
+
+    Figures are cached per (dataset version, insight text), so stored insights
+    are not re-plotted on every rerun.
     """
+    key = (dataset_fingerprint(df), hashlib.sha1(str(insight_text).encode("utf-8", errors="ignore")).hexdigest())
+    with _figures_lock:
+        if key in _figures:
+            _figures.move_to_end(key)
+            return _figures[key]
+    fig = _guess_chart(df, insight_text)
+    with _figures_lock:
+        _figures[key] = fig
+        while len(_figures) > _FIGURE_CACHE_SIZE:
+            _figures.popitem(last=False)
+    return fig
+
+
+def _guess_chart(df, insight_text):
     try:
         chart_type = None
         if "histogram" in insight_text.lower():
@@ -97,7 +123,7 @@ def guess_and_generate_chart(df: pd.DataFrame, insight_text: str):
         elif "scatter" in insight_text.lower():
             chart_type = "scatter"
 
-        possible_cols = [col for col in df.columns if re.search(rf"\b{col}\b", insight_text, re.IGNORECASE)]
+        possible_cols = column_matcher(df).find(insight_text)
         x_col = possible_cols[0] if possible_cols else df.columns[0]
 
         if chart_type == "histogram":